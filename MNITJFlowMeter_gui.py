@@ -1,15 +1,17 @@
 import sys
 import os
 import csv
+import hashlib
+import multiprocessing
+import tempfile
 import time
 import numpy as np
-import psutil
 import pandas as pd
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QFileDialog,
     QLabel, QProgressBar, QTableWidget, QTableWidgetItem, QTabWidget, QHBoxLayout,
     QHeaderView, QMessageBox, QLineEdit, QComboBox, QStatusBar, QStyleFactory,
-    QTextEdit, QSplitter
+    QTextEdit, QSplitter, QSpinBox, QCheckBox
 )
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 from PyQt6.QtCore import QUrl, Qt, QThread, pyqtSignal, QTimer
@@ -25,66 +27,155 @@ from scapy.all import rdpcap
 
 # Import our full-featured flow extractor
 from gui_flow_extractor_full import FullFlowExtractor
+from telemetry import get_memory_usage
+from flow_writer import ParquetFlowWriter, CsvFlowWriter, is_parquet_path, read_flows
+from live_capture import FollowSource, numbered_rotation
+
+# Checkpoints of interrupted analyses, one per capture file
+CHECKPOINT_DIR = os.path.join(tempfile.gettempdir(), 'MNITJFlowMeter', 'checkpoints')
+
+
+def checkpoint_path_for(pcap_file):
+    """Checkpoint file of an analysis of pcap_file"""
+    digest = hashlib.sha1(os.path.abspath(pcap_file).encode()).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"{os.path.basename(pcap_file)}.{digest}.ckpt")
 
 class FlowExtractorThread(QThread):
     """Worker thread for flow extraction to keep the UI responsive"""
-    progress_updated = pyqtSignal(int, int, float, float)  # current, total, elapsed_time, memory_usage
+    progress_updated = pyqtSignal('qint64', 'qint64', 'qint64', float, float)  # bytes_read, bytes_total, packets, elapsed_time, memory_usage
     finished = pyqtSignal(pd.DataFrame)  # DataFrame with results
     error_occurred = pyqtSignal(str)  # error message
     status_update = pyqtSignal(str)  # Status update message
     
-    def __init__(self, pcap_file):
+    def __init__(self, pcap_file, reader='mmap', workers=1, follow=False, resume=False,
+                 rotate=None):
         super().__init__()
         self.pcap_file = pcap_file
-        self.extractor = FullFlowExtractor()
+        # Following a capture that is still being written reads it incrementally in one process;
+        # rotate is a glob of the files it continues into (default: pcap_file1, pcap_file2, ...)
+        self.follow = follow
+        self.rotate = rotate or numbered_rotation(pcap_file)
+        if follow:
+            workers = 1
+        # Single-process file analyses checkpoint their progress so they can be resumed
+        checkpoint_path = None
+        if workers == 1 and not follow:
+            os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+            checkpoint_path = checkpoint_path_for(pcap_file)
+        self.resume = resume
+        self.extractor = FullFlowExtractor(reader=reader, workers=workers,
+                                           checkpoint_path=checkpoint_path)
+        self.source = None
         self._is_running = True
+        self.stopped = False  # the results cover the capture up to a stop only
         
     def stop(self):
-        """Stop the thread gracefully"""
+        """Stop the thread gracefully; the extractor stops at its next packet"""
         self._is_running = False
+        self.extractor.cancel()
+        if self.source is not None:
+            self.source.close()
         self.status_update.emit("Stopping analysis...")
         
+    def _follow_capture(self):
+        """Follow the capture (and the files it rotates into) until stopped; returns the flows.
+        
+        Finished flows are turned into a DataFrame batch on every tick instead of
+        piling up as feature dicts for the whole run.
+        """
+        start_time = time.time()
+        new_flows = []
+        frames = []
+        
+        def collect_new_flows():
+            if new_flows:
+                frames.append(pd.DataFrame(new_flows))
+                new_flows.clear()
+        
+        def live_progress(packets, elapsed_time):
+            collect_new_flows()
+            source = self.source
+            memory_usage = get_memory_usage()
+            self.status_update.emit(
+                f"Following {os.path.basename(source.path)}: {packets:,} packets | "
+                f"{source.offset / (1024 * 1024):,.1f} MB read | Memory: {memory_usage:.1f} MB")
+            self.progress_updated.emit(source.offset, max(source.size, source.offset), packets,
+                                       time.time() - start_time, memory_usage)
+            return self._is_running
+        
+        self.extractor.on_flow = new_flows.append
+        self.source = FollowSource(self.pcap_file, rotate=self.rotate)
+        self.status_update.emit(f"Following {os.path.basename(self.pcap_file)}...")
+        self.extractor.process_live(self.source, live_progress)
+        collect_new_flows()  # the flows still live at the stop
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    
+    def _analyse_with_checkpoints(self, progress_callback):
+        """process_pcap with the finished flows streamed to a CSV beside the checkpoint.
+        
+        The checkpoint then holds only the live flow table; on resume the CSV
+        is cut back to the flows emitted at the checkpoint and appended to.
+        """
+        extractor = self.extractor
+        flows_path = extractor.checkpoint_path + '.flows.csv'
+        keep_rows = None
+        if self.resume and extractor.load_checkpoint(self.pcap_file):
+            keep_rows = extractor.flows_emitted
+        with CsvFlowWriter(flows_path, keep_rows) as writer:
+            extractor.on_flow = writer.write
+            extractor.on_checkpoint = writer.flush
+            extractor.process_pcap(self.pcap_file, progress_callback)
+        df = read_flows(flows_path) if writer.rows else pd.DataFrame()
+        if not os.path.exists(extractor.checkpoint_path):
+            os.remove(flows_path)  # The capture is done; nothing is left to resume
+        return df
+        
+
     def run(self):
         try:
             self._is_running = True
             
             # Create a wrapper function that properly emits progress
-            def progress_callback(current, total, elapsed_time, memory_usage):
+            def progress_callback(bytes_read, bytes_total, packets, elapsed_time, memory_usage):
                 if not self._is_running:
                     return False  # Signal to stop processing
                     
                 # Calculate estimated time remaining
-                if current > 0 and elapsed_time > 0:
-                    remaining_time = (total - current) * (elapsed_time / current)
+                if bytes_read > 0 and elapsed_time > 0:
+                    remaining_time = (bytes_total - bytes_read) * (elapsed_time / bytes_read)
                     eta = f"ETA: {remaining_time/60:.1f} min"
                 else:
                     eta = "Calculating..."
                 
                 # Update status
-                status = f"Processing: {current:,} / {total:,} packets | " \
+                status = f"Processing: {packets:,} packets | " \
+                        f"{bytes_read / (1024 * 1024):,.1f} / {bytes_total / (1024 * 1024):,.1f} MB | " \
                         f"Memory: {memory_usage:.1f} MB | {eta}"
                 self.status_update.emit(status)
                 
                 # Emit progress
-                self.progress_updated.emit(current, total, elapsed_time, memory_usage)
+                self.progress_updated.emit(bytes_read, bytes_total, packets, elapsed_time, memory_usage)
                 return self._is_running
                 
-            # Process the pcap file with full feature extraction
-            self.status_update.emit(f"Starting analysis of {os.path.basename(self.pcap_file)}...")
-            self.extractor.process_pcap(self.pcap_file, progress_callback)
-            
-            if not self._is_running:
-                self.status_update.emit("Analysis stopped by user")
-                return
-                
-            self.status_update.emit("Extracting flow features...")
-            df = self.extractor.get_flow_dataframe()
-            
-            if not self._is_running:
-                self.status_update.emit("Analysis stopped by user")
-                return
-                
-            self.status_update.emit(f"Extracted {len(df):,} flow records")
+            # A stopped analysis still shows the flows gathered up to the stop
+            if self.follow:
+                # Stopping is how a followed capture ends; the flows seen so far are the result
+                df = self._follow_capture()
+            elif self.extractor.checkpoint_path:
+                self.status_update.emit(f"Starting analysis of {os.path.basename(self.pcap_file)}...")
+                df = self._analyse_with_checkpoints(progress_callback)
+            else:
+                # Process the pcap file with full feature extraction
+                self.status_update.emit(f"Starting analysis of {os.path.basename(self.pcap_file)}...")
+                self.extractor.process_pcap(self.pcap_file, progress_callback)
+                self.status_update.emit("Extracting flow features...")
+                df = self.extractor.get_flow_dataframe()
+            
+            self.stopped = not self._is_running and not self.follow
+            if self.stopped:
+                self.status_update.emit(f"Analysis stopped by user - {len(df):,} flow records so far")
+            else:
+                self.status_update.emit(f"Extracted {len(df):,} flow records")
             self.finished.emit(df)
             
         except Exception as e:
@@ -336,6 +427,33 @@ class MNITJFlowMeterGUI(QMainWindow):
         top_layout.addWidget(self.export_button)
         top_layout.addWidget(self.browse_another_btn)
         
+        # Capture reader selection (memory-mapped or buffered reads)
+        self.reader_combo = QComboBox()
+        self.reader_combo.addItems(["mmap", "stream"])
+        self.reader_combo.setToolTip("mmap: zero-copy memory-mapped reads\nstream: buffered file reads")
+        top_layout.addWidget(QLabel("Reader:"))
+        top_layout.addWidget(self.reader_combo)
+        
+        # Worker processes (flows are sharded across them by 5-tuple hash)
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(1)
+        self.workers_spin.setToolTip("Worker processes; flows are sharded across them by 5-tuple hash")
+        top_layout.addWidget(QLabel("Workers:"))
+        top_layout.addWidget(self.workers_spin)
+        
+        # Follow a capture that is still being written
+        self.follow_check = QCheckBox("Follow")
+        self.follow_check.setToolTip("Keep reading the file while tcpdump writes it, including the files "
+                                     "it rotates into; Stop ends the analysis")
+        top_layout.addWidget(self.follow_check)
+        self.rotate_edit = QLineEdit()
+        self.rotate_edit.setPlaceholderText("name1, name2, ...")
+        self.rotate_edit.setToolTip("Glob of the files a followed capture rotates into "
+                                    "(default: the file name followed by a number, as tcpdump -C)")
+        top_layout.addWidget(QLabel("Rotation:"))
+        top_layout.addWidget(self.rotate_edit)
+        
         # Progress bar with details
         self.progress_container = QWidget()
         self.progress_layout = QVBoxLayout(self.progress_container)
@@ -347,7 +465,7 @@ class MNITJFlowMeterGUI(QMainWindow):
         self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(0)
         self.progress_bar.setTextVisible(True)
-        self.progress_bar.setFormat("%p% - %v/%m packets")
+        self.progress_bar.setFormat("%p%")
         self.progress_bar.setStyleSheet("""
             QProgressBar {
                 border: 1px solid #34495e;
@@ -603,7 +721,7 @@ class MNITJFlowMeterGUI(QMainWindow):
             
             # Reset progress and stats
             self.progress_bar.setValue(0)
-            self.progress_bar.setMaximum(100)  # Will be updated with actual packet count
+            self.progress_bar.setMaximum(100)  # Percentage of file bytes consumed
             self.status_label.setText("Initializing analysis...")
             self.stats_label.setText(f"File: {os.path.basename(self.pcap_file)} | Size: {file_size:.1f} MB")
             self.memory_bar.setValue(0)
@@ -611,19 +729,28 @@ class MNITJFlowMeterGUI(QMainWindow):
             # Update memory stats
             self.update_memory_usage()
             
+            # Offer to continue an analysis of this file that was interrupted
+            follow = self.follow_check.isChecked()
+            resume = False
+            if (not follow and self.workers_spin.value() == 1
+                    and os.path.exists(checkpoint_path_for(self.pcap_file))):
+                answer = QMessageBox.question(
+                    self, "Resume Analysis",
+                    "An earlier analysis of this file was interrupted.\n"
+                    "Continue from its last checkpoint instead of starting over?")
+                resume = answer == QMessageBox.StandardButton.Yes
+            
             # Create and start worker thread
-            self.worker_thread = FlowExtractorThread(self.pcap_file)
+            self.worker_thread = FlowExtractorThread(
+                self.pcap_file, reader=self.reader_combo.currentText(),
+                workers=self.workers_spin.value(), follow=follow, resume=resume,
+                rotate=self.rotate_edit.text().strip() or None)
             self.worker_thread.progress_updated.connect(self.update_progress)
             self.worker_thread.finished.connect(self.analysis_finished)
             self.worker_thread.error_occurred.connect(self.analysis_error)
             self.worker_thread.status_update.connect(self.update_status)
             self.worker_thread.start()
             
-            # Start memory monitoring timer
-            self.memory_timer = QTimer(self)
-            self.memory_timer.timeout.connect(self.update_memory_usage)
-            self.memory_timer.start(1000)  # Update every second
-            
             # Update status
             self.status_bar.showMessage("Analysis in progress...")
             
@@ -644,19 +771,23 @@ class MNITJFlowMeterGUI(QMainWindow):
             self.update_plots(df)
             
             # Update status with analysis summary
+            outcome = "stopped" if self.worker_thread.stopped else "completed"
             if df is not None and not df.empty:
                 total_bytes = df['totlen_fwd_pkts'].sum() + df['totlen_bwd_pkts'].sum()
                 total_packets = df['tot_fwd_pkts'].sum() + df['tot_bwd_pkts'].sum()
                 duration = df['flow_duration'].max() - df['flow_duration'].min()
                 
                 summary = (
-                    f"Analysis completed: {len(df):,} flows | "
+                    f"Analysis {outcome}: {len(df):,} flows | "
                     f"{total_packets:,} packets | "
                     f"{total_bytes/1024/1024:,.1f} MB | "
                     f"Duration: {duration:.1f}s"
                 )
                 self.status_bar.showMessage(summary)
-                self.status_label.setText("Analysis completed successfully")
+                if self.worker_thread.stopped:
+                    self.status_label.setText("Analysis stopped - showing the flows found so far")
+                else:
+                    self.status_label.setText("Analysis completed successfully")
                 
                 # Update stats label with summary
                 self.stats_label.setText(
@@ -665,7 +796,7 @@ class MNITJFlowMeterGUI(QMainWindow):
                     f"Duration: {duration:.1f}s"
                 )
             else:
-                self.status_bar.showMessage("Analysis completed - No flows found")
+                self.status_bar.showMessage(f"Analysis {outcome} - No flows found")
                 self.status_label.setText("No network flows detected in the capture")
             
             # Enable export button
@@ -694,36 +825,37 @@ class MNITJFlowMeterGUI(QMainWindow):
         self.browse_another_btn.setEnabled(False)
         self.progress_bar.setValue(0)
 
-    def update_progress(self, current, total, elapsed_time, memory_usage):
+    def update_progress(self, bytes_read, bytes_total, packets, elapsed_time, memory_usage):
         """Update the progress bar with detailed information"""
         try:
             # Update progress bar
-            if total > 0:
-                progress = int((current / total) * 100)
+            if bytes_total > 0:
+                progress = int((bytes_read / bytes_total) * 100)
                 self.progress_bar.setValue(progress)
                 
                 # Calculate packet rate
                 if elapsed_time > 0:
-                    pps = current / elapsed_time if elapsed_time > 0 else 0
+                    pps = packets / elapsed_time if elapsed_time > 0 else 0
                     rate_text = f"{pps:,.1f} pkt/s"
                 else:
                     rate_text = "Calculating..."
                 
                 # Update progress text
-                self.progress_bar.setFormat(f"%p% - {current:,} / {total:,} packets | {rate_text}")
+                self.progress_bar.setFormat(f"%p% - {packets:,} packets | {rate_text}")
                 
-                # Update memory usage
-                self.update_memory_usage()
+                # Memory usage sampled by the extractor's telemetry thread
+                self.update_memory_usage(memory_usage)
                 
                 # Update status with more detailed information
                 if elapsed_time > 0:
                     # Calculate ETA
-                    remaining = (total - current) * (elapsed_time / current) if current > 0 else 0
+                    remaining = (bytes_total - bytes_read) * (elapsed_time / bytes_read) if bytes_read > 0 else 0
                     eta = time.strftime("%H:%M:%S", time.gmtime(remaining))
                     
                     # Update stats
                     self.stats_label.setText(
-                        f"Processed: {current:,} / {total:,} packets | "
+                        f"Processed: {packets:,} packets "
+                        f"({bytes_read / (1024 * 1024):,.1f} / {bytes_total / (1024 * 1024):,.1f} MB) | "
                         f"Speed: {rate_text} | "
                         f"Elapsed: {time.strftime('%H:%M:%S', time.gmtime(elapsed_time))} | "
                         f"ETA: {eta}"
@@ -734,12 +866,11 @@ class MNITJFlowMeterGUI(QMainWindow):
             import traceback
             traceback.print_exc()
             
-    def update_memory_usage(self):
-        """Update the memory usage display"""
+    def update_memory_usage(self, memory_mb=None):
+        """Update the memory usage display (measuring it unless memory_mb is given)"""
         try:
-            process = psutil.Process()
-            memory_info = process.memory_info()
-            memory_mb = memory_info.rss / (1024 * 1024)  # Convert to MB
+            if memory_mb is None:
+                memory_mb = get_memory_usage()
             
             # Update memory progress bar (0-4GB range)
             memory_percent = min(int((memory_mb / 4096) * 100), 100)
@@ -815,34 +946,18 @@ class MNITJFlowMeterGUI(QMainWindow):
                 self.status_label.setText("Stopping analysis...")
                 self.status_bar.showMessage("Stopping analysis, please wait...")
                 
-                # Disable stop button to prevent multiple clicks
+                # Disable stop button to prevent multiple clicks; the thread
+                # finishes on its own with the partial results
                 self.stop_button.setEnabled(False)
                 
-                # Set a timer to force quit if not stopped gracefully
-                QTimer.singleShot(5000, self.force_stop_analysis)
-                
         except Exception as e:
             self.status_bar.showMessage(f"Error stopping analysis: {str(e)}")
             import traceback
             traceback.print_exc()
     
-    def force_stop_analysis(self):
-        """Force stop the analysis if it's not responding"""
-        if hasattr(self, 'worker_thread') and self.worker_thread.isRunning():
-            self.worker_thread.terminate()
-            self.worker_thread.wait()
-            self.cleanup_after_analysis()
-            self.status_bar.showMessage("Analysis stopped forcefully")
-    
     def cleanup_after_analysis(self):
         """Clean up resources after analysis is done or stopped"""
         try:
-            # Stop memory timer if it exists
-            if hasattr(self, 'memory_timer'):
-                self.memory_timer.stop()
-                self.memory_timer.deleteLater()
-                del self.memory_timer
-                
             # Enable/disable UI elements
             self.start_button.setEnabled(True)
             self.browse_btn.setEnabled(True)
@@ -1008,18 +1123,30 @@ class MNITJFlowMeterGUI(QMainWindow):
             print(f"Error updating plots: {e}")
     
     def export_to_csv(self):
-        """Export the flow data to a CSV file"""
+        """Export the flow data to a CSV or Parquet file"""
         if self.flow_data is None or self.flow_data.empty:
             QMessageBox.warning(self, "No Data", "No flow data available to export.")
             return
                 
         try:
             # Get save file path
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, "Save Flow Data", "", "CSV Files (*.csv)")
+            file_path, selected_filter = QFileDialog.getSaveFileName(
+                self, "Save Flow Data", "", "CSV Files (*.csv);;Parquet Files (*.parquet)")
                 
             if not file_path:
                 return  # User cancelled
+            
+            # Parquet is written straight from the flow data in typed row groups
+            if is_parquet_path(file_path) or selected_filter.startswith("Parquet"):
+                if not is_parquet_path(file_path):
+                    file_path += '.parquet'
+                with ParquetFlowWriter(file_path) as writer:
+                    writer.write_frame(self.flow_data)
+                if hasattr(self, 'status_bar') and self.status_bar is not None:
+                    self.status_bar.showMessage(f"Exported {writer.rows} flows to {file_path}")
+                QMessageBox.information(self, "Export Successful",
+                                     f"Successfully exported {writer.rows} flows to {file_path}")
+                return
                     
             # Add .csv extension if not present
             if not file_path.lower().endswith('.csv'):
@@ -1237,4 +1364,6 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # Needed for flow-extraction worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     main()
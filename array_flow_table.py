@@ -0,0 +1,313 @@
+"""
+Structure-of-arrays flow table for FullFlowExtractor (engine='arrays').
+
+Instead of one FlowFeatures object per flow, every per-flow counter lives in
+a preallocated NumPy column indexed by a dense slot id. A dict maps the packed
+flow key (one int) to its slot, and the slots of flows whose features have
+been handed out are recycled through a free list. Packets update the columns
+through memoryviews (plain Python scalars, no NumPy call per field) and the
+running accumulators use the flow_stats.stats_* helpers on one flat float64
+column, so the features match FlowFeatures exactly. Export computes every
+feature column with array operations.
+
+Flows end as in flow_table.FlowTable: idle/active timeout, a TCP RST, or a
+FIN from both sides. Packet retention is not supported.
+"""
+import numpy as np
+import pandas as pd
+
+from pcap_decoder import format_ip, TCP_RST
+from flow_stats import (
+    STATS_WIDTH, FLOW_ACCUMULATORS, FWD_PKT_LEN, BWD_PKT_LEN, PKT_LEN, FWD_IAT, BWD_IAT,
+    FLOW_IAT, PACKET_GAPS, stats_update
+)
+from flow_table import IDLE_TIMEOUT, ACTIVE_TIMEOUT, TERMINATING_FLAGS
+from columnar_features import FLAG_COLUMNS, feature_frame
+
+# Slots allocated up front; the columns double when they fill up
+INITIAL_SLOTS = 4096
+
+FLOW_STATS_WIDTH = FLOW_ACCUMULATORS * STATS_WIDTH
+
+# Per-flow columns: name -> dtype
+COLUMNS = [
+    ('start', np.float64), ('last', np.float64),
+    ('first_fwd', np.float64), ('last_fwd', np.float64),
+    ('first_bwd', np.float64), ('last_bwd', np.float64),
+    ('fwd_packets', np.int64), ('bwd_packets', np.int64),
+    ('fwd_bytes', np.int64), ('bwd_bytes', np.int64),
+] + [(name, np.int64) for name, _ in FLAG_COLUMNS] + [
+    ('init_fwd_win', np.uint16), ('init_bwd_win', np.uint16),
+    ('src_hi', np.uint64), ('src_lo', np.uint64), ('dst_hi', np.uint64), ('dst_lo', np.uint64),
+    ('src_port', np.uint16), ('dst_port', np.uint16), ('protocol', np.uint8),
+    ('ip_version', np.uint8),
+    ('a_is_src', np.uint8),  # 1 if the flow's source is the first endpoint of its key
+    ('fin_dirs', np.uint8),  # FIN seen: 1 forward, 2 backward
+]
+
+# Accumulators passed to feature_frame
+STATS_NAMES = [
+    ('fwd_pkt_len', FWD_PKT_LEN), ('bwd_pkt_len', BWD_PKT_LEN), ('pkt_len', PKT_LEN),
+    ('fwd_iat', FWD_IAT), ('bwd_iat', BWD_IAT), ('flow_iat', FLOW_IAT), ('gaps', PACKET_GAPS)
+]
+
+_LOW64 = (1 << 64) - 1
+
+
+def pack_key(key):
+    """Pack a flow_key tuple (two addresses, two ports, protocol) into one int"""
+    addr_a, addr_b, port_a, port_b, proto = key
+    return (((((addr_a << 128) | addr_b) << 16 | port_a) << 16 | port_b) << 8) | proto
+
+
+class ArrayFlowTable:
+    """Live and ended flows as NumPy columns indexed by slot.
+
+    index maps packed flow keys of live flows to slots in last-seen order;
+    finished lists the slots of ended flows whose features have not been
+    taken yet.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT,
+                 capacity=INITIAL_SLOTS):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.index = {}
+        self.finished = []
+        self.free = []
+        self.size = 0  # Slots handed out so far (free slots included)
+        self.capacity = 0
+        self.columns = {}
+        self.stats = np.zeros(0)
+        self._resize(capacity)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getstate__(self):
+        """Pickle the used slots only; the memoryviews are rebuilt on load"""
+        state = {name: value for name, value in self.__dict__.items() if not name.startswith('_')}
+        state['columns'] = {name: column[:self.size] for name, column in self.columns.items()}
+        state['stats'] = self.stats[:self.size * FLOW_STATS_WIDTH]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._resize(self.capacity)
+
+    def _resize(self, capacity):
+        """Grow every column to `capacity` slots and refresh the memoryviews"""
+        for name, dtype in COLUMNS:
+            column = np.zeros(capacity, dtype=dtype)
+            if name in self.columns:
+                column[:self.size] = self.columns[name][:self.size]
+            self.columns[name] = column
+        stats = np.zeros(capacity * FLOW_STATS_WIDTH)
+        stats[:self.size * FLOW_STATS_WIDTH] = self.stats[:self.size * FLOW_STATS_WIDTH]
+        self.stats = stats
+        self.capacity = capacity
+        self._views = {name: memoryview(column) for name, column in self.columns.items()}
+        self._stats_view = memoryview(stats)
+        self._flag_views = [(self._views[name], bit) for name, bit in FLAG_COLUMNS]
+
+    def _new_slot(self):
+        if self.free:
+            return self.free.pop()
+        if self.size == self.capacity:
+            self._resize(self.capacity * 2)
+        slot = self.size
+        self.size += 1
+        return slot
+
+    def _start_flow(self, key, packet, timestamp):
+        """Fill a fresh slot from a flow's first packet (always forward)"""
+        slot = self._new_slot()
+        views = self._views
+        length = len(packet)
+        views['start'][slot] = views['last'][slot] = timestamp
+        views['first_fwd'][slot] = views['last_fwd'][slot] = timestamp
+        views['first_bwd'][slot] = views['last_bwd'][slot] = 0.0
+        views['fwd_packets'][slot] = 1
+        views['bwd_packets'][slot] = 0
+        views['fwd_bytes'][slot] = length
+        views['bwd_bytes'][slot] = 0
+        flags = packet.tcp_flags
+        for view, bit in self._flag_views:
+            view[slot] = 1 if flags & bit else 0
+        views['init_fwd_win'][slot] = packet.window
+        views['init_bwd_win'][slot] = 0
+        src, dst = packet.src, packet.dst
+        views['src_hi'][slot] = src >> 64
+        views['src_lo'][slot] = src & _LOW64
+        views['dst_hi'][slot] = dst >> 64
+        views['dst_lo'][slot] = dst & _LOW64
+        views['src_port'][slot] = packet.src_port
+        views['dst_port'][slot] = packet.dst_port
+        views['protocol'][slot] = packet.proto
+        views['ip_version'][slot] = packet.ip_version
+        views['a_is_src'][slot] = 1 if src == key[0] and packet.src_port == key[2] else 0
+        views['fin_dirs'][slot] = 0
+
+        base = slot * FLOW_STATS_WIDTH
+        self.stats[base:base + FLOW_STATS_WIDTH] = 0.0
+        stats = self._stats_view
+        stats_update(stats, base + PKT_LEN, length)
+        stats_update(stats, base + FWD_PKT_LEN, length)
+        return slot
+
+    def add_packet(self, key, packet):
+        """Add a packet to the flow of `key` (a flow_key tuple), ending flows as FlowTable does"""
+        views = self._views
+        index = self.index
+        packed = pack_key(key)
+        now = float(packet.time)
+        slot = index.pop(packed, None)  # Re-inserted below: index stays in last-seen order
+        if slot is not None and self._expired(slot, now):
+            self.finished.append(slot)
+            slot = None
+
+        if slot is None:
+            slot = self._start_flow(key, packet, now)
+            forward = True
+        else:
+            forward = ((packet.src == key[0] and packet.src_port == key[2])
+                       == bool(views['a_is_src'][slot]))
+            length = len(packet)
+            stats = self._stats_view
+            base = slot * FLOW_STATS_WIDTH
+
+            # Gap since the previous packet in either direction
+            stats_update(stats, base + PACKET_GAPS, now - views['last'][slot])
+            views['last'][slot] = now
+
+            if forward:
+                packets = views['fwd_packets'][slot] + 1
+                views['fwd_packets'][slot] = packets
+                views['fwd_bytes'][slot] += length
+                stats_update(stats, base + FWD_PKT_LEN, length)
+                if packets > 1:
+                    iat = now - views['last_fwd'][slot]
+                    stats_update(stats, base + FWD_IAT, iat)
+                    stats_update(stats, base + FLOW_IAT, iat)
+                else:
+                    views['first_fwd'][slot] = now
+                views['last_fwd'][slot] = now
+            else:
+                packets = views['bwd_packets'][slot] + 1
+                views['bwd_packets'][slot] = packets
+                views['bwd_bytes'][slot] += length
+                stats_update(stats, base + BWD_PKT_LEN, length)
+                if packets > 1:
+                    iat = now - views['last_bwd'][slot]
+                    stats_update(stats, base + BWD_IAT, iat)
+                    stats_update(stats, base + FLOW_IAT, iat)
+                else:
+                    views['first_bwd'][slot] = now
+                views['last_bwd'][slot] = now
+            stats_update(stats, base + PKT_LEN, length)
+
+            flags = packet.tcp_flags
+            if flags:
+                for view, bit in self._flag_views:
+                    if flags & bit:
+                        view[slot] += 1
+            if not forward and views['init_bwd_win'][slot] == 0:
+                views['init_bwd_win'][slot] = packet.window
+
+        # RST, or FIN from both sides, terminates the flow
+        flags = packet.tcp_flags
+        if flags & TERMINATING_FLAGS:
+            if flags & TCP_RST:
+                self.finished.append(slot)
+                return
+            fin_dirs = views['fin_dirs'][slot] | (1 if forward else 2)
+            views['fin_dirs'][slot] = fin_dirs
+            if fin_dirs == 3:
+                self.finished.append(slot)
+                return
+        index[packed] = slot
+
+    def _expired(self, slot, now):
+        """True if the flow in `slot` must end before a packet at time `now` can join it"""
+        views = self._views
+        if self.idle_timeout and now - views['last'][slot] > self.idle_timeout:
+            return True
+        if self.active_timeout and now - views['start'][slot] > self.active_timeout:
+            return True
+        return False
+
+    def expire(self, now):
+        """End every flow idle for longer than idle_timeout at capture time `now`"""
+        if not self.idle_timeout:
+            return
+        deadline = now - self.idle_timeout
+        last = self._views['last']
+        expired = []
+        for packed, slot in self.index.items():
+            if last[slot] >= deadline:
+                break
+            expired.append(packed)
+        for packed in expired:
+            self.finished.append(self.index.pop(packed))
+
+    def flush(self):
+        """End every live flow"""
+        self.finished.extend(self.index.values())
+        self.index.clear()
+
+    def take_finished(self):
+        """Features of the ended flows as a DataFrame; their slots are recycled"""
+        slots = np.array(self.finished, dtype=np.int64)
+        self.finished = []
+        frame = self.frame(slots)
+        self.free.extend(slots.tolist())
+        return frame
+
+    def frame(self, slots=None):
+        """Features of the flows in `slots` (default: every flow not yet taken) as a DataFrame.
+
+        Without free slots the whole table is in use, and its columns are
+        sliced instead of gathered slot by slot.
+        """
+        if slots is None:
+            if self.free:
+                slots = np.sort(np.array(list(self.index.values()) + self.finished, dtype=np.int64))
+            else:
+                slots = slice(0, self.size)
+        columns = {name: column[slots] for name, column in self.columns.items()}
+        if not len(columns['start']):
+            return pd.DataFrame()
+        stats = self.stats.reshape(-1, FLOW_STATS_WIDTH)[slots]
+
+        start = columns['start']
+        versions = columns['ip_version'].tolist()
+        src_ip = [format_ip((hi << 64) | lo, version) for hi, lo, version in
+                  zip(columns['src_hi'].tolist(), columns['src_lo'].tolist(), versions)]
+        dst_ip = [format_ip((hi << 64) | lo, version) for hi, lo, version in
+                  zip(columns['dst_hi'].tolist(), columns['dst_lo'].tolist(), versions)]
+        src_port = columns['src_port']
+        dst_port = columns['dst_port']
+        flow_id = [f"{src}_{sport}_{dst}_{dport}_{int(ts)}" for src, sport, dst, dport, ts in
+                   zip(src_ip, src_port.tolist(), dst_ip, dst_port.tolist(), start.tolist())]
+
+        summaries = {}
+        for name, offset in STATS_NAMES:
+            count = stats[:, offset]
+            m2 = stats[:, offset + 5]
+            var = np.where(count > 1, np.maximum(m2 / np.maximum(count, 1), 0.0), 0.0)
+            # Python's ** like stats_summary (np.sqrt can differ in the last bit)
+            std = np.array([value ** 0.5 for value in var.tolist()])
+            summaries[name] = {'max': stats[:, offset + 3], 'min': stats[:, offset + 2],
+                               'mean': stats[:, offset + 4], 'std': std,
+                               'var': var, 'sum': stats[:, offset + 1]}
+
+        return feature_frame(
+            flow_id, src_ip, src_port, dst_ip, dst_port, columns['protocol'], start,
+            columns['last'] - start, columns['fwd_packets'], columns['bwd_packets'],
+            columns['fwd_bytes'], columns['bwd_bytes'],
+            {name: columns[name] for name, _ in FLAG_COLUMNS},
+            columns['init_fwd_win'], columns['init_bwd_win'], summaries)
+
+    def nbytes(self):
+        """Bytes held by the columns"""
+        return sum(column.nbytes for column in self.columns.values()) + self.stats.nbytes
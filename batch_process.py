@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Batch flow extraction for a directory or glob of capture files.
+
+Files are processed concurrently in a process pool. Each result is written
+as soon as its file finishes, either to its own CSV (<name>_flows.csv in the
+output directory) or appended to one combined CSV, and a per-file throughput
+summary is printed at the end.
+
+Usage:
+    python batch_process.py captures/ --output-dir flows/ --jobs 4
+    python batch_process.py "captures/*.pcap" --combined all_flows.csv
+"""
+import os
+import csv
+import glob
+import time
+import argparse
+import shutil
+import tempfile
+from multiprocessing import Pool, cpu_count
+
+from flow_writer import open_flow_writer
+
+CAPTURE_PATTERNS = ('*.pcap', '*.pcapng', '*.cap')
+
+EXTRACTORS = {
+    'full': ('gui_flow_extractor_full', 'FullFlowExtractor'),
+    'enhanced': ('enhanced_flow_extractor', 'EnhancedFlowExtractor'),
+    'optimized': ('optimized_flow_extractor', 'OptimizedFlowExtractor'),
+}
+
+
+def find_captures(inputs):
+    """Expand directories and glob patterns into a sorted list of capture files"""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in CAPTURE_PATTERNS:
+                files.update(glob.glob(os.path.join(item, pattern)))
+        else:
+            files.update(path for path in glob.glob(item) if os.path.isfile(path))
+    return sorted(files)
+
+
+def _output_paths(files, output_dir):
+    """<name>_flows.csv per capture, keeping the extension or adding a counter on name clashes"""
+    paths = []
+    used = set()
+    for pcap_file in files:
+        base = os.path.basename(pcap_file)
+        name = os.path.splitext(base)[0]
+        if name in used:
+            name = base.replace('.', '_')
+        candidate, counter = name, 1
+        while candidate in used:
+            counter += 1
+            candidate = f"{name}_{counter}"
+        used.add(candidate)
+        paths.append(os.path.join(output_dir, f"{candidate}_flows.csv"))
+    return paths
+
+
+def _extractor_class(extractor_name):
+    module_name, class_name = EXTRACTORS[extractor_name]
+    return getattr(__import__(module_name), class_name)
+
+
+def process_capture(task):
+    """Pool worker: stream one capture's flows to its CSV and return its statistics"""
+    pcap_file, output_file, extractor_name, extractor_kwargs = task
+    extractor_cls = _extractor_class(extractor_name)
+
+    stats = {'file': pcap_file, 'output': output_file, 'bytes': os.path.getsize(pcap_file),
+             'packets': 0, 'flows': 0, 'seconds': 0.0, 'error': None}
+
+    def progress_callback(bytes_read, bytes_total, packets, *_):
+        stats['packets'] = packets
+        return True
+
+    start_time = time.time()
+    try:
+        # Flows are written as they finish instead of collected into one DataFrame
+        with open_flow_writer(output_file) as writer:
+            extractor = extractor_cls(on_flow=writer.write, **extractor_kwargs)
+            extractor.process_pcap(pcap_file, progress_callback)
+            stats['flows'] = writer.rows
+    except Exception as e:
+        stats['error'] = str(e)
+    stats['seconds'] = time.time() - start_time
+    return stats
+
+
+def _append_csv(source, writer, pcap_file):
+    """Append the rows of one per-file CSV to the combined CSV, tagged with their capture.
+
+    Rows are matched to the combined header by column name, so a per-file CSV
+    whose columns come in another order still lines up.
+    """
+    with open(source, newline='') as src:
+        name = os.path.basename(pcap_file)
+        for row in csv.DictReader(src):
+            row['pcap_file'] = name
+            writer.writerow(row)
+
+
+def print_summary(results, wall_time):
+    """Print per-file and total throughput"""
+    print(f"\n{'File':<40} {'MB':>9} {'Packets':>11} {'Flows':>9} {'Seconds':>9} {'MB/s':>8} {'pkt/s':>11}")
+    for r in results:
+        name = os.path.basename(r['file'])[:40]
+        if r['error']:
+            print(f"{name:<40} ERROR: {r['error']}")
+            continue
+        mb = r['bytes'] / (1024 * 1024)
+        seconds = max(r['seconds'], 1e-9)
+        print(f"{name:<40} {mb:>9.1f} {r['packets']:>11,} {r['flows']:>9,} "
+              f"{r['seconds']:>9.2f} {mb / seconds:>8.1f} {r['packets'] / seconds:>11,.0f}")
+
+    total_mb = sum(r['bytes'] for r in results) / (1024 * 1024)
+    total_packets = sum(r['packets'] for r in results)
+    total_flows = sum(r['flows'] for r in results)
+    wall_time = max(wall_time, 1e-9)
+    print(f"\nTotal: {len(results)} files, {total_mb:.1f} MB, {total_packets:,} packets, "
+          f"{total_flows:,} flows in {wall_time:.2f} s "
+          f"({total_mb / wall_time:.1f} MB/s, {total_packets / wall_time:,.0f} pkt/s)")
+
+
+def process_batch(inputs, output_dir='.', combined_file=None, jobs=None,
+                  extractor='full', extractor_kwargs=None):
+    """Process every capture matched by inputs and return the per-file statistics"""
+    files = find_captures(inputs)
+    if not files:
+        print("No capture files found")
+        return []
+
+    # With a combined output the per-file CSVs are only staging files
+    staging_dir = tempfile.mkdtemp(prefix='mntj_batch_') if combined_file else None
+    output_dir = staging_dir or output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = jobs or min(cpu_count(), len(files))
+    tasks = [(f, out, extractor, extractor_kwargs or {})
+             for f, out in zip(files, _output_paths(files, output_dir))]
+    print(f"Processing {len(files)} files with {jobs} processes...")
+
+    results = []
+    start_time = time.time()
+    combined = open(combined_file, 'w', newline='') if combined_file else None
+    if combined:
+        # The header comes from the extractor, not from whichever file finishes first
+        columns = _extractor_class(extractor)(**(extractor_kwargs or {})).flow_columns()
+        writer = csv.DictWriter(combined, fieldnames=['pcap_file'] + columns,
+                                restval='', extrasaction='ignore')
+        writer.writeheader()
+    try:
+        with Pool(jobs) as pool:
+            for stats in pool.imap_unordered(process_capture, tasks):
+                results.append(stats)
+                if stats['error']:
+                    print(f"[!] {stats['file']}: {stats['error']}")
+                    continue
+                print(f"[+] {stats['file']}: {stats['flows']:,} flows in {stats['seconds']:.2f} s")
+                if combined:
+                    if stats['flows']:
+                        _append_csv(stats['output'], writer, stats['file'])
+                        combined.flush()
+                    os.remove(stats['output'])
+                    stats['output'] = combined_file
+    finally:
+        if combined:
+            combined.close()
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    results.sort(key=lambda r: r['file'])
+    print_summary(results, time.time() - start_time)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract flows from a directory or glob of pcap files in parallel')
+    parser.add_argument('inputs', nargs='+', help='Capture directories, files or glob patterns')
+    parser.add_argument('--output-dir', default='.', help='Directory for per-file <name>_flows.csv outputs')
+    parser.add_argument('--combined', help='Write all flows to this single CSV instead (adds a pcap_file column)')
+    parser.add_argument('--jobs', type=int, default=None, help=f'Parallel processes (default: up to {cpu_count()})')
+    parser.add_argument('--extractor', choices=sorted(EXTRACTORS), default='full', help='Flow extractor to use')
+    parser.add_argument('--reader', choices=['mmap', 'stream'], default='mmap', help='Capture file reader')
+    args = parser.parse_args()
+
+    process_batch(args.inputs, args.output_dir, args.combined, args.jobs,
+                  args.extractor, {'reader': args.reader})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Cooperative cancellation for the flow extractors.
+
+A CancelToken is shared between the thread running an extraction and the
+thread that wants it stopped (a GUI stop button, a signal handler). The
+extractors read ``token.cancelled`` between packets, a plain attribute
+load, so a cancel() takes effect within a packet and the extraction
+returns normally with the flows gathered so far, instead of being killed
+mid-update.
+"""
+
+
+class CancelToken:
+    """Flag that asks an extraction to stop at the next packet"""
+
+    __slots__ = ('cancelled',)
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def reset(self):
+        """Make the token usable for another run"""
+        self.cancelled = False
@@ -0,0 +1,360 @@
+"""
+Vectorized (columnar) flow feature engine for offline analysis.
+
+Instead of updating a FlowFeatures object per packet, the capture is decoded
+in chunks into NumPy columns (timestamp, flow index, direction side, length,
+TCP flags, window) and every flow feature is computed with grouped array
+operations: a stable sort by flow, reduceat/bincount reductions and diff-based
+inter-arrival times.
+
+Flows are cut exactly like FullFlowExtractor's flow table does it: a new flow
+starts after an idle gap > idle_timeout, once a flow has lasted longer than
+active_timeout, and after a TCP RST or a FIN from both sides. The resulting
+DataFrame has the same columns as FlowFeatures.calculate_features.
+"""
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from pcap_decoder import (
+    PacketSource, flow_key, format_ip,
+    TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK, TCP_URG, TCP_ECE, TCP_CWR
+)
+from flow_table import IDLE_TIMEOUT, ACTIVE_TIMEOUT
+
+# Packets decoded into columns per chunk
+CHUNK_SIZE = 100000
+
+FLAG_COLUMNS = [
+    ('fin_flag_cnt', TCP_FIN), ('syn_flag_cnt', TCP_SYN), ('rst_flag_cnt', TCP_RST),
+    ('psh_flag_cnt', TCP_PSH), ('ack_flag_cnt', TCP_ACK), ('urg_flag_cnt', TCP_URG),
+    ('cwr_flag_count', TCP_CWR), ('ece_flag_count', TCP_ECE)
+]
+
+
+class PacketColumns:
+    """Capture decoded into per-packet NumPy columns plus the flow key of every flow index"""
+
+    def __init__(self):
+        self.flow_ids = {}   # canonical flow key -> flow index
+        self.keys = []       # flow index -> canonical flow key
+        self.versions = []   # flow index -> IP version
+        self._chunks = []
+        self.packets = 0
+
+    def add_records(self, records):
+        """Decode a chunk of PacketRecords into columns"""
+        flow_ids, keys, versions = self.flow_ids, self.keys, self.versions
+        fids = []
+        append = fids.append
+        for record in records:
+            key = flow_key(record)
+            fid = flow_ids.get(key)
+            if fid is None:
+                fid = flow_ids[key] = len(keys)
+                keys.append(key)
+                versions.append(record.ip_version)
+            append(fid)
+        n = len(fids)
+        self._chunks.append({
+            'ts': np.fromiter((float(r.time) for r in records), np.float64, n),
+            'flow': np.array(fids, dtype=np.int64),
+            # True when the packet travels from the key's first endpoint
+            'side': np.fromiter(((r.src, r.src_port) <= (r.dst, r.dst_port) for r in records), np.bool_, n),
+            'length': np.fromiter((r.length for r in records), np.int64, n),
+            'flags': np.fromiter((r.tcp_flags for r in records), np.int64, n),
+            'window': np.fromiter((r.window for r in records), np.int64, n),
+        })
+        self.packets += n
+
+    def columns(self):
+        """Concatenate the decoded chunks into one array per column"""
+        if not self._chunks:
+            return {name: np.empty(0, dtype) for name, dtype in
+                    [('ts', np.float64), ('flow', np.int64), ('side', np.bool_),
+                     ('length', np.int64), ('flags', np.int64), ('window', np.int64)]}
+        if len(self._chunks) > 1:
+            self._chunks = [{name: np.concatenate([c[name] for c in self._chunks])
+                             for name in self._chunks[0]}]
+        return self._chunks[0]
+
+
+def _first_per_segment(mask, segment, n_segments, fill=-1):
+    """Index of the first True entry of mask in each segment (fill where there is none)"""
+    first = np.full(n_segments, fill, dtype=np.int64)
+    idx = np.flatnonzero(mask)
+    if idx.size:
+        seg, pos = np.unique(segment[idx], return_index=True)
+        first[seg] = idx[pos]
+    return first
+
+
+def _split_flows(flow, ts, side, flags, idle_timeout, active_timeout):
+    """Boolean array marking the packets (in flow order) that start a new flow"""
+    n = len(flow)
+    starts = np.ones(n, dtype=bool)
+    if n == 0:
+        return starts
+    same = flow[1:] == flow[:-1]
+    starts[1:] = ~same
+    if idle_timeout:
+        starts[1:] |= same & (np.diff(ts) > idle_timeout)
+    starts[1:] |= (flags[:-1] & TCP_RST) != 0
+
+    # A FIN from both sides ends the flow after that packet, and the active timeout
+    # starts a new flow at the first packet past it. Each pass applies the earliest
+    # such cut of every flow; repeat until no flow needs another cut.
+    fin = (flags & TCP_FIN) != 0
+    while True:
+        segment = np.cumsum(starts) - 1
+        n_segments = segment[-1] + 1
+        seg_first = np.flatnonzero(starts)
+        cut = np.full(n_segments, n, dtype=np.int64)
+
+        if fin.any():
+            fin_a = np.cumsum(fin & side)
+            fin_b = np.cumsum(fin & ~side)
+            before_a = np.where(seg_first > 0, fin_a[seg_first - 1], 0)[segment]
+            before_b = np.where(seg_first > 0, fin_b[seg_first - 1], 0)[segment]
+            both = (fin_a > before_a) & (fin_b > before_b)
+            last = _first_per_segment(both, segment, n_segments, fill=n)
+            cut = np.minimum(cut, last + 1)
+        if active_timeout:
+            over = ts - ts[seg_first][segment] > active_timeout
+            cut = np.minimum(cut, _first_per_segment(over, segment, n_segments, fill=n))
+
+        seg_end = np.append(seg_first[1:], n)
+        cut = cut[cut < seg_end]
+        if not cut.size:
+            return starts
+        starts[cut] = True
+
+
+def _group_stats(values, group, n_groups):
+    """count/sum/min/max/mean/var (population) of values per group, 0 for empty groups"""
+    count = np.bincount(group, minlength=n_groups)
+    # (bincount of no values returns ints; keep the float dtype of the object engine)
+    total = np.bincount(group, weights=values, minlength=n_groups).astype(np.float64)
+    safe_count = np.maximum(count, 1)
+    mean = total / safe_count
+    dev = values - mean[group]
+    m2 = np.bincount(group, weights=dev * dev, minlength=n_groups)
+    var = np.where(count > 1, np.maximum(m2 / safe_count, 0.0), 0.0)
+
+    minimum = np.zeros(n_groups)
+    maximum = np.zeros(n_groups)
+    if values.size:
+        # values are contiguous per group, so reduceat over the non-empty groups' starts
+        present = count > 0
+        offsets = np.concatenate(([0], np.cumsum(count)[:-1]))[present]
+        minimum[present] = np.minimum.reduceat(values, offsets)
+        maximum[present] = np.maximum.reduceat(values, offsets)
+    return {'max': maximum, 'min': minimum, 'mean': mean, 'std': np.sqrt(var),
+            'var': var, 'sum': total}
+
+
+def feature_frame(flow_id, src_ip, src_port, dst_ip, dst_port, protocol, start_time, duration,
+                  fwd_packets, bwd_packets, fwd_bytes, bwd_bytes, flag_counts, init_fwd_win,
+                  init_bwd_win, stats):
+    """DataFrame with the FlowFeatures.calculate_features columns from per-flow arrays.
+
+    flag_counts maps each flag count column to its array; stats maps 'fwd_pkt_len',
+    'bwd_pkt_len', 'flow_iat', 'fwd_iat', 'bwd_iat', 'pkt_len' and 'gaps' to
+    max/min/mean/std/var/sum arrays.
+    """
+    total_packets = fwd_packets + bwd_packets
+    total_bytes = fwd_bytes + bwd_bytes
+
+    features = {
+        'flow_id': flow_id,
+        'src_ip': src_ip,
+        'src_port': src_port,
+        'dst_ip': dst_ip,
+        'dst_port': dst_port,
+        'protocol': protocol,
+        'timestamp': start_time,
+        'flow_duration': duration,
+        'tot_fwd_pkts': fwd_packets,
+        'tot_bwd_pkts': bwd_packets,
+        'totlen_fwd_pkts': fwd_bytes,
+        'totlen_bwd_pkts': bwd_bytes,
+    }
+    features.update(flag_counts)
+    features['init_fwd_win_byts'] = init_fwd_win
+    features['init_bwd_win_byts'] = init_bwd_win
+
+    safe_duration = np.maximum(duration, 1e-10)
+    zeros = np.zeros(len(start_time))
+    features.update({
+        'flow_byts_s': total_bytes / safe_duration,
+        'flow_pkts_s': total_packets / safe_duration,
+        'fwd_pkts_s': fwd_packets / safe_duration,
+        'bwd_pkts_s': bwd_packets / safe_duration,
+        'fwd_avg_bytes_per_bulk': zeros,
+        'fwd_avg_packets_per_bulk': zeros,
+        'fwd_avg_bulk_rate': zeros,
+        'bwd_avg_bytes_per_bulk': zeros,
+        'bwd_avg_packets_per_bulk': zeros,
+        'bwd_avg_bulk_rate': zeros,
+        'fwd_avg_bytes_per_sec': fwd_bytes / safe_duration,
+        'bwd_avg_bytes_per_sec': bwd_bytes / safe_duration,
+        'flow_avg_bytes_per_sec': total_bytes / safe_duration,
+    })
+
+    fwd_stats, bwd_stats = stats['fwd_pkt_len'], stats['bwd_pkt_len']
+    flow_iat_stats, fwd_iat_stats, bwd_iat_stats = stats['flow_iat'], stats['fwd_iat'], stats['bwd_iat']
+    pkt_stats, gap_stats = stats['pkt_len'], stats['gaps']
+
+    for prefix, summary in (('fwd_pkt_len', fwd_stats), ('bwd_pkt_len', bwd_stats)):
+        for stat in ('max', 'min', 'mean', 'std', 'var'):
+            features[f'{prefix}_{stat}'] = summary[stat]
+        features[f'{prefix}_total'] = summary['sum']
+    for stat in ('mean', 'max', 'min', 'std', 'var'):
+        features[f'flow_iat_{stat}'] = flow_iat_stats[stat]
+    features['flow_iat_total'] = flow_iat_stats['sum']
+    for prefix, summary in (('fwd_iat', fwd_iat_stats), ('bwd_iat', bwd_iat_stats)):
+        features[f'{prefix}_tot'] = summary['sum']
+        for stat in ('max', 'min', 'mean', 'std', 'var'):
+            features[f'{prefix}_{stat}'] = summary[stat]
+    for stat in ('max', 'min', 'mean', 'std', 'var'):
+        features[f'pkt_len_{stat}'] = pkt_stats[stat]
+    features['pkt_len_total'] = pkt_stats['sum']
+
+    features['down_up_ratio'] = np.where(bwd_packets > 0, fwd_packets / np.maximum(bwd_packets, 1), 0.0)
+    features['pkt_size_avg'] = np.where(total_packets > 0, total_bytes / np.maximum(total_packets, 1), 0.0)
+
+    # Active and idle columns both describe the gaps between consecutive packets
+    for prefix in ('active', 'idle'):
+        for stat in ('max', 'min', 'mean', 'std', 'var'):
+            features[f'{prefix}_{stat}'] = gap_stats[stat]
+        features[f'{prefix}_total'] = gap_stats['sum']
+
+    features.update({
+        'subflow_fwd_pkts': fwd_packets,
+        'subflow_bwd_pkts': bwd_packets,
+        'subflow_fwd_byts': fwd_bytes,
+        'subflow_bwd_byts': bwd_bytes,
+    })
+
+    return pd.DataFrame(features)
+
+
+def compute_flow_features(packets, idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT):
+    """Compute the FlowFeatures.calculate_features columns for every flow in a PacketColumns"""
+    if not packets.packets:
+        return pd.DataFrame()
+    cols = packets.columns()
+    # Stable sort keeps arrival order within a flow, as the flow table sees it
+    order = np.argsort(cols['flow'], kind='stable')
+    flow = cols['flow'][order]
+    ts = cols['ts'][order]
+    side = cols['side'][order]
+    length = cols['length'][order].astype(np.float64)
+    flags = cols['flags'][order]
+    window = cols['window'][order]
+
+    starts = _split_flows(flow, ts, side, flags, idle_timeout, active_timeout)
+    segment = np.cumsum(starts) - 1
+    n = segment[-1] + 1
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:], len(flow)) - 1
+
+    # Forward is the direction of each flow's first packet
+    fwd = side == side[first][segment]
+    bwd = ~fwd
+
+    start_time = ts[first]
+    duration = ts[last] - start_time
+    fwd_packets = np.bincount(segment, weights=fwd, minlength=n).astype(np.int64)
+    bwd_packets = np.bincount(segment, weights=bwd, minlength=n).astype(np.int64)
+    fwd_bytes = np.bincount(segment, weights=length * fwd, minlength=n).astype(np.int64)
+    bwd_bytes = np.bincount(segment, weights=length * bwd, minlength=n).astype(np.int64)
+
+    # Inter-arrival times: consecutive gaps of the flow, and per direction
+    gap_mask = ~starts
+    gaps = np.diff(ts, prepend=0.0)[gap_mask]
+    gap_segment = segment[gap_mask]
+
+    def direction_iat(mask):
+        idx = np.flatnonzero(mask)
+        seg = segment[idx]
+        follow = seg[1:] == seg[:-1]
+        return np.diff(ts[idx])[follow], seg[1:][follow]
+
+    fwd_iat, fwd_iat_segment = direction_iat(fwd)
+    bwd_iat, bwd_iat_segment = direction_iat(bwd)
+    flow_iat_order = np.argsort(np.concatenate([fwd_iat_segment, bwd_iat_segment]), kind='stable')
+    flow_iat = np.concatenate([fwd_iat, bwd_iat])[flow_iat_order]
+    flow_iat_segment = np.concatenate([fwd_iat_segment, bwd_iat_segment])[flow_iat_order]
+
+    # Endpoints come from each flow's first packet
+    fids = flow[first]
+    first_side = side[first]
+    keys = packets.keys
+    versions = packets.versions
+    src_ip, dst_ip, src_port, dst_port, protocol, flow_id = [], [], [], [], [], []
+    for fid, a_to_b, start in zip(fids.tolist(), first_side.tolist(), start_time.tolist()):
+        addr_a, addr_b, port_a, port_b, proto = keys[fid]
+        if not a_to_b:
+            addr_a, addr_b, port_a, port_b = addr_b, addr_a, port_b, port_a
+        version = versions[fid]
+        src = format_ip(addr_a, version)
+        dst = format_ip(addr_b, version)
+        src_ip.append(src)
+        dst_ip.append(dst)
+        src_port.append(port_a)
+        dst_port.append(port_b)
+        protocol.append(proto)
+        flow_id.append(f"{src}_{port_a}_{dst}_{port_b}_{int(start)}")
+
+    flag_counts = {name: np.bincount(segment, weights=(flags & bit) != 0, minlength=n).astype(np.int64)
+                   for name, bit in FLAG_COLUMNS}
+    # First non-zero window of a backward packet, as FlowFeatures.add_packet records it
+    first_bwd_win = _first_per_segment(bwd & (window != 0), segment, n)
+    init_bwd_win = np.where(first_bwd_win >= 0, window[first_bwd_win], 0)
+
+    stats = {
+        'fwd_pkt_len': _group_stats(length[fwd], segment[fwd], n),
+        'bwd_pkt_len': _group_stats(length[bwd], segment[bwd], n),
+        'flow_iat': _group_stats(flow_iat, flow_iat_segment, n),
+        'fwd_iat': _group_stats(fwd_iat, fwd_iat_segment, n),
+        'bwd_iat': _group_stats(bwd_iat, bwd_iat_segment, n),
+        'pkt_len': _group_stats(length, segment, n),
+        'gaps': _group_stats(gaps, gap_segment, n),
+    }
+    frame = feature_frame(
+        flow_id, src_ip, src_port, dst_ip, dst_port, protocol, start_time, duration,
+        fwd_packets, bwd_packets, fwd_bytes, bwd_bytes, flag_counts, window[first],
+        init_bwd_win, stats)
+
+    # Flows in order of their first packet, as the flow table would start them
+    return frame.iloc[np.argsort(order[first], kind='stable')].reset_index(drop=True)
+
+
+def extract_flows_columnar(pcap_file, decoder='raw', scapy_fallback=False, reader='mmap',
+                           idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT,
+                           chunk_size=CHUNK_SIZE, progress_callback=None, cancel_token=None):
+    """Decode pcap_file into columns chunk by chunk and return its flow feature DataFrame.
+
+    progress_callback(bytes_read, bytes_total, packets, elapsed_time) is called after every
+    chunk and may return False to stop early; so does cancelling cancel_token. The flows of
+    the packets decoded up to that point are still returned.
+    """
+    start_time = time.time()
+    packets = PacketColumns()
+    with PacketSource(pcap_file, decoder, scapy_fallback, reader,
+                      cancel_token=cancel_token) as source:
+        total_bytes = source.size
+        records = iter(source)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            packets.add_records(chunk)
+            if progress_callback:
+                if progress_callback(source.offset, total_bytes, packets.packets,
+                                     time.time() - start_time) is False:
+                    break
+    return compute_flow_features(packets, idle_timeout, active_timeout)
@@ -0,0 +1,206 @@
+"""
+Shared pytest fixtures: small synthetic captures written with struct, and
+the object-engine reference flows the other engines are compared with.
+
+The traffic mixes TCP conversations closed by FIN or RST, UDP request/reply
+pairs, IPv6 UDP, VLAN-tagged ICMP and a conversation that resumes after a
+gap longer than the idle timeout used in the tests, so flow expiry and
+termination paths are all exercised. Run the suite with
+``python -m pytest test_pcap_decoder.py test_pcap_readers.py test_packet_retention.py
+test_flow_merge.py test_flow_sharding.py test_flow_table.py test_expiry_index.py
+test_columnar_features.py test_array_flow_table.py test_flow_spill.py test_memory_budget.py
+test_spill_merge.py test_follow.py test_checkpoint.py test_cancellation.py test_batch_process.py
+test_enhanced_flow_extractor.py test_process_pcap.py``.
+"""
+import contextlib
+import io
+import random
+import struct
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from gui_flow_extractor_full import FullFlowExtractor
+from optimized_flow_extractor import OptimizedFlowFeatures
+from pcap_decoder import PacketSource, flow_key
+
+IDLE_GAP = 30.0  # seconds of silence inside the capture
+IDLE_TIMEOUT = 10  # shorter than IDLE_GAP, so that conversation is split
+
+ETH_HEADER = b'\xaa\xbb\xcc\xdd\xee\x01' + b'\x00\x11\x22\x33\x44\x02'
+TCP_FLAGS = {'S': 0x02, 'SA': 0x12, 'A': 0x10, 'PA': 0x18, 'FA': 0x11, 'R': 0x04, 'RA': 0x14}
+
+
+def ipv4_packet(src, dst, proto, payload):
+    return struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(payload), 0, 0x4000, 64, proto, 0,
+                       bytes(src), bytes(dst)) + payload
+
+
+def ipv6_packet(src, dst, proto, payload):
+    return struct.pack('!IHBB16s16s', 0x60000000, len(payload), proto, 64,
+                       bytes(src), bytes(dst)) + payload
+
+
+def tcp_segment(sport, dport, flags, data, window):
+    return struct.pack('!HHIIBBHHH', sport, dport, 1, 1, 5 << 4, TCP_FLAGS[flags], window,
+                       0, 0) + data
+
+
+def udp_datagram(sport, dport, data):
+    return struct.pack('!HHHH', sport, dport, 8 + len(data), 0) + data
+
+
+def synthetic_frames(seed=1):
+    """(timestamp in microseconds, Ethernet frame) pairs of the synthetic traffic, in time order"""
+    rng = random.Random(seed)
+    frames = []
+    t = 1700000000.0
+
+    def add(payload, ethertype=0x0800, vlan=None):
+        nonlocal t
+        t += rng.random() * 0.05
+        header = ETH_HEADER
+        if vlan is not None:
+            header += struct.pack('!HH', 0x8100, vlan)
+        frames.append((int(t * 1e6), header + struct.pack('!H', ethertype) + payload))
+
+    for conversation in range(25):
+        client = (192, 168, 1, rng.randint(2, 60))
+        server = (10, 0, 0, rng.randint(1, 9))
+        sport, dport = rng.randint(1024, 65000), rng.choice((80, 443, 22))
+        win = rng.randint(1000, 65535)
+
+        def fwd(flags, data=b''):
+            add(ipv4_packet(client, server, 6, tcp_segment(sport, dport, flags, data, win)))
+
+        def bwd(flags, data=b''):
+            add(ipv4_packet(server, client, 6, tcp_segment(dport, sport, flags, data, win // 2)))
+
+        fwd('S')
+        bwd('SA')
+        fwd('A')
+        for _ in range(rng.randint(1, 8)):
+            fwd('PA', b'x' * rng.randint(1, 900))
+            bwd('A', b'y' * rng.randint(0, 1400))
+        if conversation % 5 == 4:
+            fwd('R')
+        else:
+            fwd('FA')
+            bwd('FA')
+            fwd('A')
+
+    for _ in range(20):
+        host = (172, 16, 0, rng.randint(1, 5))
+        sport = rng.randint(2000, 2004)
+        query = udp_datagram(sport, 53, b'q' * rng.randint(20, 60))
+        add(ipv4_packet(host, (8, 8, 8, 8), 17, query))
+        answer = udp_datagram(53, sport, b'r' * rng.randint(40, 300))
+        add(ipv4_packet((8, 8, 8, 8), host, 17, answer))
+
+    v6_client = bytes([0x20, 0x01, 0x0d, 0xb8] + [0] * 11 + [1])
+    v6_server = bytes([0x20, 0x01, 0x0d, 0xb8] + [0] * 11 + [2])
+    for _ in range(6):
+        add(ipv6_packet(v6_client, v6_server, 17, udp_datagram(5000, 6000, b'v6' * 20)),
+            ethertype=0x86DD)
+        add(ipv6_packet(v6_server, v6_client, 17, udp_datagram(6000, 5000, b'6v' * 30)),
+            ethertype=0x86DD)
+
+    for seq in range(4):
+        icmp = struct.pack('!BBHHH', 8, 0, 0, 1, seq) + b'ping' * 8
+        add(ipv4_packet((10, 1, 1, 1), (10, 1, 1, 2), 1, icmp), vlan=10)
+
+    # The same UDP conversation before and after an idle gap: two flows
+    for _ in range(3):
+        add(ipv4_packet((10, 9, 9, 9), (10, 9, 9, 1), 17, udp_datagram(7000, 7001, b'a' * 100)))
+    t += IDLE_GAP
+    for _ in range(3):
+        add(ipv4_packet((10, 9, 9, 9), (10, 9, 9, 1), 17, udp_datagram(7000, 7001, b'b' * 100)))
+    return frames
+
+
+def write_pcap(path, frames):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for stamp, frame in frames:
+            sec, usec = divmod(stamp, 1000000)
+            f.write(struct.pack('<IIII', sec, usec, len(frame), len(frame)) + frame)
+
+
+def _pcapng_block(block_type, body):
+    body += b'\x00' * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+
+def write_pcapng(path, frames):
+    with open(path, 'wb') as f:
+        f.write(_pcapng_block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1)))
+        f.write(_pcapng_block(1, struct.pack('<HHI', 1, 0, 65535)))
+        for stamp, frame in frames:
+            f.write(_pcapng_block(6, struct.pack('<IIIII', 0, stamp >> 32, stamp & 0xFFFFFFFF,
+                                                 len(frame), len(frame)) + frame))
+
+
+@pytest.fixture(scope='session')
+def frames():
+    return synthetic_frames()
+
+
+@pytest.fixture(scope='session')
+def pcap_file(tmp_path_factory, frames):
+    path = tmp_path_factory.mktemp('captures') / 'synthetic.pcap'
+    write_pcap(path, frames)
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def pcapng_file(tmp_path_factory, frames):
+    path = tmp_path_factory.mktemp('captures') / 'synthetic.pcapng'
+    write_pcapng(path, frames)
+    return str(path)
+
+
+def extract_flows(pcap_file, **kwargs):
+    """FullFlowExtractor flows of pcap_file with the tests' idle timeout"""
+    extractor = FullFlowExtractor(idle_timeout=IDLE_TIMEOUT, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor.process_pcap(pcap_file)
+    return extractor.get_flow_dataframe()
+
+
+def sort_flows(frame):
+    """Flows in a fixed order; workers and engines emit them in different orders"""
+    return frame.sort_values(['flow_id', 'timestamp']).reset_index(drop=True)
+
+
+@pytest.fixture(scope='session')
+def reference_flows(pcap_file):
+    """Flows of the synthetic capture from the default object engine"""
+    return sort_flows(extract_flows(pcap_file))
+
+
+def optimized_flow_parts(pcap_file, pieces):
+    """OptimizedFlowFeatures of every flow, each split into up to `pieces` parts"""
+    packets = defaultdict(list)
+    with PacketSource(pcap_file) as source:
+        for record in source:
+            packets[flow_key(record)].append(record)
+    parts = []
+    for flow_id, records in enumerate(packets.values()):
+        first = records[0]
+        for chunk in np.array_split(np.arange(len(records)), min(pieces, len(records))):
+            flow = None
+            for i in chunk:
+                record = records[i]
+                direction = ('forward' if (record.src, record.src_port) == (first.src, first.src_port)
+                             else 'backward')
+                if flow is None:
+                    flow = OptimizedFlowFeatures(record, direction)
+                    flow.src, flow.src_port = first.src, first.src_port
+                    flow.dst, flow.dst_port = first.dst, first.dst_port
+                    flow.flow_id = flow_id
+                else:
+                    flow.update(record, direction)
+            parts.append(flow)
+    return parts
@@ -11,43 +11,54 @@ import socket
 import struct
 import ipaddress
 from typing import Dict, List, Tuple, Optional, Any
+from pcap_decoder import (
+    PacketRecord, PacketSource, to_record, flow_key, format_ip, IPPROTO_ICMP, IPPROTO_ICMPV6,
+    IPPROTO_TCP, IPPROTO_UDP, TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK, TCP_URG,
+    TCP_ECE, TCP_CWR
+)
+from flow_stats import retain_packet, STATS_WIDTH, stats_array, stats_update, stats_summary
+from flow_table import FlowTable, IDLE_TIMEOUT, ACTIVE_TIMEOUT, EXPIRY_CHECK_PACKETS
+from live_capture import iter_live, TICK_INTERVAL
+from cancellation import CancelToken
 
 class PacketDirection(Enum):
     FORWARD = auto()
     REVERSE = auto()
 
+# Offsets of the packet length and inter-arrival time accumulators in
+# EnhancedFlowFeatures.stats
+FWD_PKT_LEN, BWD_PKT_LEN, PKT_LEN, FLOW_IAT = (i * STATS_WIDTH for i in range(4))
+PKT_LEN_BY_DIRECTION = {PacketDirection.FORWARD: FWD_PKT_LEN, PacketDirection.REVERSE: BWD_PKT_LEN}
+
 class EnhancedFlowFeatures:
     """Enhanced flow feature extraction based on CICFlowMeter implementation"""
     
-    def __init__(self, packet, direction):
-        self.packets = [(packet, direction)]
-        self.flow_interarrival_time = []
+    def __init__(self, packet, direction, retain_packets=0):
+        packet = to_record(packet)
+        self.retain_packets = retain_packets  # PacketSummary tuples kept for the first N packets
+        self.packets = []
+        # Packet length and inter-arrival time statistics (constant memory per flow)
+        self.stats = stats_array(4)
         self.active = []
         self.idle = []
         self.start_timestamp = packet.time
         self.latest_timestamp = packet.time
-        self.protocol = packet[IP].proto if IP in packet else 0
-        
-        # Initialize flow key
-        self.src_ip = packet[IP].src if IP in packet else '0.0.0.0'
-        self.dst_ip = packet[IP].dst if IP in packet else '0.0.0.0'
-        self.src_port = 0
-        self.dst_port = 0
+        self.protocol = packet.proto
         
-        # Initialize TCP/UDP ports
-        if TCP in packet:
-            self.src_port = packet[TCP].sport
-            self.dst_port = packet[TCP].dport
-        elif UDP in packet:
-            self.src_port = packet[UDP].sport
-            self.dst_port = packet[UDP].dport
+        # Initialize flow endpoints (addresses as ints, rendered at export; ports are 0
+        # for non-TCP/UDP packets)
+        self.src = packet.src
+        self.dst = packet.dst
+        self.ip_version = packet.ip_version
+        self.src_port = packet.src_port
+        self.dst_port = packet.dst_port
             
         # Initialize bulk transfer tracking
         self._init_bulk_tracking()
         
         # Initialize window sizes
         self.init_window_size = {
-            PacketDirection.FORWARD: packet[TCP].window if TCP in packet else 0,
+            PacketDirection.FORWARD: packet.window,
             PacketDirection.REVERSE: 0
         }
         
@@ -57,11 +68,6 @@ class EnhancedFlowFeatures:
             PacketDirection.REVERSE: 0
         }
         
-        self.packet_lengths = {
-            PacketDirection.FORWARD: [],
-            PacketDirection.REVERSE: []
-        }
-        
         # Initialize flag counts
         self.flag_counts = {
             'FIN': 0, 'SYN': 0, 'RST': 0, 'PSH': 0,
@@ -95,12 +101,13 @@ class EnhancedFlowFeatures:
     
     def add_packet(self, packet, direction):
         """Add a packet to the flow"""
-        self.packets.append((packet, direction))
+        packet = to_record(packet)
+        retain_packet(self.packets, self.retain_packets, packet, direction)
         
         # Update timestamps
         current_time = packet.time
         if self.latest_timestamp != 0:
-            self.flow_interarrival_time.append(1e6 * (current_time - self.latest_timestamp))
+            stats_update(self.stats, FLOW_IAT, 1e6 * (current_time - self.latest_timestamp))
         self.latest_timestamp = max([current_time, self.latest_timestamp])
         
         # Update packet counts
@@ -108,32 +115,33 @@ class EnhancedFlowFeatures:
         
         # Update packet lengths
         packet_size = len(packet)
-        self.packet_lengths[direction].append(packet_size)
+        stats_update(self.stats, PKT_LEN_BY_DIRECTION[direction], packet_size)
+        stats_update(self.stats, PKT_LEN, packet_size)
         
         # Update TCP flags if present
-        if TCP in packet:
-            tcp = packet[TCP]
-            if tcp.flags.F: self.flag_counts['FIN'] += 1
-            if tcp.flags.S: self.flag_counts['SYN'] += 1
-            if tcp.flags.R: self.flag_counts['RST'] += 1
-            if tcp.flags.P: self.flag_counts['PSH'] += 1
-            if tcp.flags.A: self.flag_counts['ACK'] += 1
-            if tcp.flags.U: self.flag_counts['URG'] += 1
-            if tcp.flags.E: self.flag_counts['ECE'] += 1
-            if tcp.flags.C: self.flag_counts['CWR'] += 1
+        if packet.proto == IPPROTO_TCP:
+            flags = packet.tcp_flags
+            if flags & TCP_FIN: self.flag_counts['FIN'] += 1
+            if flags & TCP_SYN: self.flag_counts['SYN'] += 1
+            if flags & TCP_RST: self.flag_counts['RST'] += 1
+            if flags & TCP_PSH: self.flag_counts['PSH'] += 1
+            if flags & TCP_ACK: self.flag_counts['ACK'] += 1
+            if flags & TCP_URG: self.flag_counts['URG'] += 1
+            if flags & TCP_ECE: self.flag_counts['ECE'] += 1
+            if flags & TCP_CWR: self.flag_counts['CWR'] += 1
             
             # Update window size
             if direction == PacketDirection.FORWARD and self.init_window_size[direction] == 0:
-                self.init_window_size[direction] = tcp.window
+                self.init_window_size[direction] = packet.window
             elif direction == PacketDirection.REVERSE:
-                self.init_window_size[direction] = tcp.window
+                self.init_window_size[direction] = packet.window
         
         # Update bulk transfer stats
         self._update_flow_bulk(packet, direction)
     
     def _update_flow_bulk(self, packet, direction):
         """Update bulk transfer statistics"""
-        payload_size = len(packet[Raw].load) if Raw in packet else 0
+        payload_size = packet.payload_len
         if payload_size == 0:
             return
             
@@ -202,44 +210,32 @@ class EnhancedFlowFeatures:
                     
                     self.backward_bulk_last_timestamp = packet.time
     
+    @property
+    def src_ip(self):
+        return format_ip(self.src, self.ip_version)
+    
+    @property
+    def dst_ip(self):
+        return format_ip(self.dst, self.ip_version)
+    
+    def total_bytes(self, direction):
+        """Bytes of the packets sent in one direction"""
+        return int(stats_summary(self.stats, PKT_LEN_BY_DIRECTION[direction])['sum'])
+    
     def get_flow_features(self):
         """Extract all flow features"""
-        if not self.packets:
+        if not any(self.packet_counts.values()):
             return {}
             
         # Calculate basic statistics
         flow_duration = self.latest_timestamp - self.start_timestamp
         total_packets = sum(self.packet_counts.values())
         
-        # Calculate packet length statistics
-        def get_stats(values):
-            if not values:
-                return {'total': 0, 'mean': 0, 'std': 0, 'min': 0, 'max': 0}
-            return {
-                'total': sum(values),
-                'mean': np.mean(values),
-                'std': np.std(values) if len(values) > 1 else 0,
-                'min': min(values),
-                'max': max(values)
-            }
-        
-        fwd_stats = get_stats(self.packet_lengths[PacketDirection.FORWARD])
-        bwd_stats = get_stats(self.packet_lengths[PacketDirection.REVERSE])
-        all_stats = get_stats(
-            self.packet_lengths[PacketDirection.FORWARD] + 
-            self.packet_lengths[PacketDirection.REVERSE]
-        )
-        
-        # Calculate IAT statistics
-        if len(self.flow_interarrival_time) > 0:
-            iat_stats = {
-                'mean': np.mean(self.flow_interarrival_time),
-                'std': np.std(self.flow_interarrival_time),
-                'min': min(self.flow_interarrival_time),
-                'max': max(self.flow_interarrival_time)
-            }
-        else:
-            iat_stats = {'mean': 0, 'std': 0, 'min': 0, 'max': 0}
+        # Packet length and IAT statistics (all zero when there were no values)
+        fwd_stats = stats_summary(self.stats, FWD_PKT_LEN)
+        bwd_stats = stats_summary(self.stats, BWD_PKT_LEN)
+        all_stats = stats_summary(self.stats, PKT_LEN)
+        iat_stats = stats_summary(self.stats, FLOW_IAT)
         
         # Build feature dictionary
         features = {
@@ -258,8 +254,8 @@ class EnhancedFlowFeatures:
             'tot_pkts': total_packets,
             
             # Packet length statistics
-            'totlen_fwd_pkts': fwd_stats['total'],
-            'totlen_bwd_pkts': bwd_stats['total'],
+            'totlen_fwd_pkts': self.total_bytes(PacketDirection.FORWARD),
+            'totlen_bwd_pkts': self.total_bytes(PacketDirection.REVERSE),
             'fwd_pkt_len_max': float(fwd_stats['max']),
             'fwd_pkt_len_min': float(fwd_stats['min']),
             'fwd_pkt_len_mean': float(fwd_stats['mean']),
@@ -306,7 +302,7 @@ class EnhancedFlowFeatures:
         if flow_duration > 0:
             features.update({
                 'flow_pkts_s': total_packets / flow_duration,
-                'flow_byts_s': all_stats['total'] / flow_duration,
+                'flow_byts_s': all_stats['sum'] / flow_duration,
                 'fwd_pkts_s': self.packet_counts[PacketDirection.FORWARD] / flow_duration,
                 'bwd_pkts_s': self.packet_counts[PacketDirection.REVERSE] / flow_duration,
             })
@@ -386,87 +382,248 @@ class PacketFeatures:
             features['payload_len'] = len(packet[Raw].load)
             
         return features
+    
+    @staticmethod
+    def extract_record_features(record: PacketRecord) -> Dict[str, Any]:
+        """Extract features from a raw-decoded PacketRecord.
+        
+        Link-layer addresses, IP flags and TCP sequence numbers are not
+        decoded by pcap_decoder and are left at their defaults.
+        """
+        proto = record.proto
+        is_tcp = proto == IPPROTO_TCP
+        is_udp = proto == IPPROTO_UDP
+        if is_tcp:
+            protocol = 'TCP'
+        elif is_udp:
+            protocol = 'UDP'
+        elif proto == IPPROTO_ICMP or proto == IPPROTO_ICMPV6:
+            protocol = 'ICMP'
+        else:
+            protocol = ''
+        return {
+            'frame_number': 0,
+            'timestamp': record.time,
+            'frame_len': record.length,
+            'eth_src': '',
+            'eth_dst': '',
+            'ip_src': record.src_ip,
+            'ip_dst': record.dst_ip,
+            'ip_version': record.ip_version,
+            'ip_ttl': record.ttl,
+            'ip_len': record.ip_payload_len,
+            'ip_flags': 0,
+            'ip_proto': proto,
+            'tcp_sport': record.src_port if is_tcp else 0,
+            'tcp_dport': record.dst_port if is_tcp else 0,
+            'tcp_flags': record.tcp_flags,
+            'tcp_flags_str': '',
+            'tcp_window': record.window,
+            'tcp_seq': 0,
+            'tcp_ack': 0,
+            'tcp_header_len': 0,
+            'udp_sport': record.src_port if is_udp else 0,
+            'udp_dport': record.dst_port if is_udp else 0,
+            'udp_len': record.ip_payload_len if is_udp else 0,
+            'protocol': protocol,
+            'payload_len': record.payload_len,
+            'is_malformed': 0
+        }
+
+
+# Flow assembly modes: 'bidirectional' groups both directions of a 5-tuple into
+# one flow (forward = direction of its first packet); 'packet' makes every packet
+# its own flow
+FLOW_MODES = ('bidirectional', 'packet')
 
 
 class EnhancedFlowExtractor:
-    """Extracts network flows with enhanced feature extraction"""
+    """Extracts network flows with enhanced feature extraction
+    
+    keep_packets also keeps every packet's feature row for get_packet_dataframe;
+    it is off by default, since those rows grow with the capture.
+    """
     
-    def __init__(self):
-        self.flows = {}
+    def __init__(self, decoder: str = 'raw', scapy_fallback: bool = False,
+                 reader: str = 'mmap', retain_packets: int = 0,
+                 idle_timeout: float = IDLE_TIMEOUT, active_timeout: float = ACTIVE_TIMEOUT,
+                 on_flow=None, flow_mode: str = 'bidirectional', keep_packets: bool = False,
+                 cancel_token: Optional[CancelToken] = None):
+        if flow_mode not in FLOW_MODES:
+            raise ValueError(f"Unknown flow mode {flow_mode!r} (expected one of {FLOW_MODES})")
+        self.flow_mode = flow_mode
+        # Live flows; they end on idle/active timeout, TCP RST or FIN (from both sides
+        # in bidirectional mode)
+        self.flows = FlowTable(idle_timeout, active_timeout, start_attr='start_timestamp',
+                               last_seen_attr='latest_timestamp',
+                               bidirectional=flow_mode == 'bidirectional')
+        self.completed_flows = []  # Rows of flows that have ended
+        self.on_flow = on_flow  # Called with each finished flow's row instead of keeping it
+        self.keep_packets = keep_packets  # per-packet rows for get_packet_dataframe
         self.packets = []
         self.current_packet_number = 0
+        self.decoder = decoder  # 'raw' (pcap_decoder) or 'scapy'
+        self.scapy_fallback = scapy_fallback
+        self.reader = reader  # 'mmap' (zero-copy) or 'stream' (buffered reads)
+        self.retain_packets = retain_packets  # packet summaries kept per flow (0 = none)
+        # Checked between packets; cancel() stops a run and keeps the flows so far
+        self.cancel_token = cancel_token if cancel_token is not None else CancelToken()
     
-    def get_flow_key(self, packet: Packet, direction: PacketDirection) -> Optional[str]:
-        """Generate a flow key based on 5-tuple, direction, and timestamp"""
-        if IP not in packet:
+    def cancel(self) -> None:
+        """Ask a running process_pcap/process_live to stop at the next packet"""
+        self.cancel_token.cancel()
+    
+    def get_flow_key(self, packet: PacketRecord) -> Optional[tuple]:
+        """Generate a flow key from the integer bidirectional 5-tuple (and timestamp in packet mode)"""
+        if packet is None:
             return None
-            
-        src = packet[IP].src
-        dst = packet[IP].dst
-        proto = packet[IP].proto
-        
-        # For TCP/UDP, use ports; for others, use 0
-        sport, dport = 0, 0
-        if TCP in packet:
-            sport, dport = packet[TCP].sport, packet[TCP].dport
-        elif UDP in packet:
-            sport, dport = packet[UDP].sport, packet[UDP].dport
+        if self.flow_mode == 'bidirectional':
+            return flow_key(packet)
         
         # Include timestamp in the key to ensure each packet is a separate flow
         timestamp = int(packet.time * 1000000)  # Convert to microseconds for better precision
-            
-        # Create a unique key for each packet
-        if direction == PacketDirection.FORWARD:
-            return f"{src}_{sport}_{dst}_{dport}_{proto}_{timestamp}"
-        return f"{dst}_{dport}_{src}_{sport}_{proto}_{timestamp}"
+        return flow_key(packet) + (timestamp,)
     
-    def process_packet(self, packet: Packet, direction: PacketDirection) -> None:
-        """Process a single packet and update flow information"""
-        if IP not in packet:
+    def flow_columns(self) -> List[str]:
+        """Columns of the flow rows, in order"""
+        probe = PacketRecord(0.0, 60, 4, 1, 2, IPPROTO_TCP, 1, 2)
+        return list(self._flow_row(None, EnhancedFlowFeatures(probe, PacketDirection.FORWARD)))
+    
+    @staticmethod
+    def flow_id(flow) -> str:
+        """Export-time string id of a flow: src_sport_dst_dport_proto_timestamp(us)"""
+        return (f"{flow.src_ip}_{flow.src_port}_{flow.dst_ip}_{flow.dst_port}_"
+                f"{flow.protocol}_{int(flow.start_timestamp * 1000000)}")
+    
+    def process_packet(self, packet, direction: Optional[PacketDirection] = None) -> None:
+        """Process a single packet (PacketRecord or Scapy packet) and update flow information.
+        
+        Without an explicit direction, a packet is FORWARD if it travels like the
+        first packet of its flow and REVERSE otherwise.
+        """
+        record = to_record(packet)
+        if record is None:
             return
             
         # Extract packet features
         self.current_packet_number += 1
-        packet_features = PacketFeatures.extract_packet_features(packet)
-        packet_features['packet_number'] = self.current_packet_number
-        packet_features['direction'] = 'forward' if direction == PacketDirection.FORWARD else 'backward'
+        if self.keep_packets:
+            if record is packet:
+                packet_features = PacketFeatures.extract_record_features(record)
+            else:
+                packet_features = PacketFeatures.extract_packet_features(packet)
+            packet_features['packet_number'] = self.current_packet_number
+        packet = record
         
-        # Add to packet list
-        self.packets.append(packet_features)
+        # Find the flow; a flow past its idle or active timeout ends before this packet
+        flow_key = self.get_flow_key(packet)
+        now = float(packet.time)
+        flow = self.flows.get(flow_key)
+        if flow is not None and self.flows.is_expired(flow, now):
+            self._emit_flow(flow_key, self.flows.pop(flow_key))
+            flow = None
         
-        # Update flow information
-        flow_key = self.get_flow_key(packet, direction)
-        if not flow_key:
-            return
+        if direction is None:
+            if flow is None or (packet.src == flow.src and packet.src_port == flow.src_port):
+                direction = PacketDirection.FORWARD
+            else:
+                direction = PacketDirection.REVERSE
+        
+        # Add to packet list
+        if self.keep_packets:
+            packet_features['direction'] = 'forward' if direction == PacketDirection.FORWARD else 'backward'
+            self.packets.append(packet_features)
             
-        if flow_key not in self.flows:
-            self.flows[flow_key] = EnhancedFlowFeatures(packet, direction)
+        if flow is None:
+            self.flows[flow_key] = EnhancedFlowFeatures(packet, direction, self.retain_packets)
         else:
-            self.flows[flow_key].add_packet(packet, direction)
+            flow.add_packet(packet, direction)
+            self.flows.touch(flow_key)
+        
+        # FIN or RST terminates the flow
+        if self.flows.ends_flow(flow_key, packet.tcp_flags, direction):
+            self._emit_flow(flow_key, self.flows.pop(flow_key))
+        
+        if self.current_packet_number % EXPIRY_CHECK_PACKETS == 0:
+            self.expire_flows(now)
+    
+    def expire_flows(self, now: float) -> None:
+        """Emit every flow idle for longer than the idle timeout at capture time `now`"""
+        for flow_key, flow in self.flows.pop_expired(now):
+            self._emit_flow(flow_key, flow)
+    
+    def flush_flows(self) -> None:
+        """Emit every live flow (end of capture)"""
+        for flow_key, flow in self.flows.pop_all():
+            self._emit_flow(flow_key, flow)
+    
+    def _emit_flow(self, flow_key, flow) -> None:
+        """Finalize a finished flow and pass its row to on_flow (or keep it)"""
+        row = self._flow_row(flow_key, flow)
+        if self.on_flow is not None:
+            self.on_flow(row)
+        else:
+            self.completed_flows.append(row)
     
     def process_pcap(self, pcap_file: str, progress_callback=None) -> None:
-        """Process a pcap file and extract packet and flow information"""
+        """Process a pcap file and extract packet and flow information.
+        
+        progress_callback(bytes_read, bytes_total, packets) may return False to stop,
+        as does cancel(); the flows gathered so far are kept (and flushed to on_flow).
+        """
+        cancel_token = self.cancel_token
         try:
-            packets = rdpcap(pcap_file)
-            total_packets = len(packets)
-            
-            for i, packet in enumerate(packets):
-                if IP not in packet:
-                    continue
+            with PacketSource(pcap_file, self.decoder, self.scapy_fallback,
+                              self.reader, cancel_token=cancel_token) as source:
+                total_bytes = source.size
+                packets = 0
+                for packet in source:
+                    # Direction follows the first packet of each flow
+                    self.process_packet(packet)
+                    packets += 1
                     
-                # Process all IP packets in the forward direction
-                # The flow key will include the timestamp to ensure each packet is unique
-                self.process_packet(packet, PacketDirection.FORWARD)
+                    # Update progress if callback provided
+                    if progress_callback and packets % 100 == 0:
+                        if not progress_callback(source.offset, total_bytes, packets):
+                            cancel_token.cancel()
+                            break
                 
-                # Update progress if callback provided
-                if progress_callback and (i % 100 == 0 or i == total_packets - 1):
-                    if not progress_callback(i + 1, total_packets):
-                        break
+                if progress_callback and not cancel_token.cancelled:
+                    progress_callback(total_bytes, total_bytes, packets)
+            
+            # With a flow callback, the flows still live at the end of the capture end too
+            if self.on_flow is not None:
+                self.flush_flows()
                         
         except Exception as e:
             print(f"Error processing pcap file: {e}")
             raise
     
+    def process_live(self, source, progress_callback=None, tick_interval: float = TICK_INTERVAL) -> None:
+        """Extract flows from a live source (see live_capture) until it ends.
+        
+        Every tick_interval seconds the flows idle past the idle timeout are
+        emitted, so on_flow receives a flow at most about idle_timeout +
+        tick_interval seconds after its last packet. progress_callback(packets)
+        is called on every tick and may return False to stop, as does cancel();
+        the flows still live then are flushed to on_flow.
+        """
+        packets = 0
+        cancel_token = self.cancel_token
+        for record, now in iter_live(source, tick_interval):
+            if cancel_token.cancelled:
+                break
+            if record is not None:
+                self.process_packet(record)
+                packets += 1
+            else:
+                if now is not None:
+                    self.expire_flows(now)
+                if progress_callback and not progress_callback(packets):
+                    break
+        if self.on_flow is not None:
+            self.flush_flows()
+    
     def get_packet_dataframe(self) -> pd.DataFrame:
         """Convert packets to a pandas DataFrame"""
         if not self.packets:
@@ -482,11 +639,16 @@ class EnhancedFlowExtractor:
     
     def get_flow_dataframe(self) -> pd.DataFrame:
         """Convert flows to a pandas DataFrame"""
-        flow_data = []
-        
+        flow_data = list(self.completed_flows)
         for flow_key, flow in self.flows.items():
-            flow_info = {
-                'flow_id': flow_key,
+            flow_data.append(self._flow_row(flow_key, flow))
+        
+        return pd.DataFrame(flow_data)
+    
+    def _flow_row(self, flow_key, flow) -> Dict[str, Any]:
+        """Summary row of one flow for the flow DataFrame"""
+        return {
+                'flow_id': self.flow_id(flow),
                 'src_ip': flow.src_ip,
                 'src_port': flow.src_port,
                 'dst_ip': flow.dst_ip,
@@ -497,12 +659,12 @@ class EnhancedFlowExtractor:
                 'duration': flow.latest_timestamp - flow.start_timestamp,
                 'fwd_pkts_tot': flow.packet_counts[PacketDirection.FORWARD],
                 'bwd_pkts_tot': flow.packet_counts[PacketDirection.REVERSE],
-                'fwd_byts_tot': sum(flow.packet_lengths[PacketDirection.FORWARD]),
-                'bwd_byts_tot': sum(flow.packet_lengths[PacketDirection.REVERSE]),
+                'fwd_byts_tot': flow.total_bytes(PacketDirection.FORWARD),
+                'bwd_byts_tot': flow.total_bytes(PacketDirection.REVERSE),
                 'flow_pkts_s': (flow.packet_counts[PacketDirection.FORWARD] + flow.packet_counts[PacketDirection.REVERSE]) / 
                               max(1, (flow.latest_timestamp - flow.start_timestamp)),
-                'flow_byts_s': (sum(flow.packet_lengths[PacketDirection.FORWARD]) + 
-                              sum(flow.packet_lengths[PacketDirection.REVERSE])) / 
+                'flow_byts_s': (flow.total_bytes(PacketDirection.FORWARD) +
+                              flow.total_bytes(PacketDirection.REVERSE)) / 
                              max(1, (flow.latest_timestamp - flow.start_timestamp)),
                 'fwd_pkts_s': flow.packet_counts[PacketDirection.FORWARD] / 
                              max(1, (flow.latest_timestamp - flow.start_timestamp)),
@@ -513,37 +675,63 @@ class EnhancedFlowExtractor:
                 'active_mean': np.mean(flow.active) if hasattr(flow, 'active') and flow.active else 0,
                 'idle_mean': np.mean(flow.idle) if hasattr(flow, 'idle') and flow.idle else 0,
             }
-            flow_data.append(flow_info)
-        
-        return pd.DataFrame(flow_data)
 
 # Example usage
 if __name__ == "__main__":
-    import sys
+    import argparse
+    import psutil
+    from flow_writer import open_flow_writer, is_parquet_path
+    from live_capture import open_live_source
     
-    if len(sys.argv) != 2:
-        print("Usage: python enhanced_flow_extractor.py <pcap_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Extract enhanced flow features from a pcap file')
+    parser.add_argument('pcap_file', help='Input pcap/pcapng file (a network interface with --live)')
+    parser.add_argument('--flow-mode', choices=FLOW_MODES, default='bidirectional',
+                        help="'bidirectional' 5-tuple flows, or 'packet' for one flow per packet")
+    parser.add_argument('--output', help='Output file (default <pcap>_flows.csv); '
+                                         'a .parquet/.pq extension writes Parquet')
+    live = parser.add_mutually_exclusive_group()
+    live.add_argument('--live', action='store_true',
+                      help='Capture from the network interface named by pcap_file until Ctrl+C')
+    live.add_argument('--follow', action='store_true',
+                      help='Keep reading pcap_file while another process appends to it, until Ctrl+C')
+    parser.add_argument('--rotate', metavar='PATTERN',
+                        help='With --follow, continue with newer files matching this glob '
+                             '(rotating tcpdump -C/-G captures)')
+    args = parser.parse_args()
+    pcap_file = args.pcap_file
+    output_file = args.output or os.path.splitext(pcap_file)[0] + "_flows.csv"
     
-    pcap_file = sys.argv[1]
-    
-    def progress_callback(current, total):
-        print(f"Processing: {current}/{total} packets", end='\r')
+    def progress_callback(bytes_read, bytes_total, packets):
+        print(f"Processing: {packets} packets ({bytes_read}/{bytes_total} bytes)", end='\r')
         return True
     
-    print(f"Processing {pcap_file}...")
-    extractor = EnhancedFlowExtractor()
-    extractor.process_pcap(pcap_file, progress_callback)
+    print(f"Processing {pcap_file} ({args.flow_mode} flows)...")
+    process = psutil.Process()
+    start_rss = process.memory_info().rss
+    start_time = time.time()
     
-    print("\nExtracting features...")
-    df = extractor.get_flow_dataframe()
+    # Flows are written as they end instead of being collected into a DataFrame
+    with open_flow_writer(output_file) as writer:
+        if args.live or args.follow:
+            def live_progress(packets):
+                if not is_parquet_path(output_file):
+                    writer.flush()  # Parquet row groups are only readable once the file is closed
+                print(f"Captured {packets} packets, {writer.rows} flows written", end='\r')
+                return True
+            
+            extractor = EnhancedFlowExtractor(flow_mode=args.flow_mode, on_flow=writer.write)
+            with open_live_source(pcap_file, follow=args.follow, rotate=args.rotate) as source:
+                try:
+                    extractor.process_live(source, live_progress)
+                except KeyboardInterrupt:
+                    extractor.flush_flows()
+        else:
+            extractor = EnhancedFlowExtractor(flow_mode=args.flow_mode, on_flow=writer.write)
+            extractor.process_pcap(pcap_file, progress_callback)
+    elapsed = time.time() - start_time
     
     print("\nExtracted features:")
-    print(f"Total flows: {len(df)}")
-    print("\nFirst few flows:")
-    print(df.head())
-    
-    # Save to CSV
-    output_file = os.path.splitext(pcap_file)[0] + "_flows.csv"
-    df.to_csv(output_file, index=False)
+    print(f"Total flows: {writer.rows}")
+    print(f"Time: {elapsed:.2f} s ({extractor.current_packet_number / max(elapsed, 1e-9):,.0f} packets/s)")
+    print(f"Memory: {(process.memory_info().rss - start_rss) / (1024 * 1024):.1f} MB RSS growth")
     print(f"\nSaved flow data to {output_file}")
@@ -0,0 +1,125 @@
+"""
+Multi-core flow extraction by flow-hash sharding.
+
+The calling process reads and decodes the capture once and dispatches every
+PacketRecord to one of N worker processes, chosen by a symmetric hash of the
+bidirectional 5-tuple. Both directions of a conversation land on the same
+worker, so each worker owns its flows completely and the per-worker results
+can simply be concatenated.
+"""
+import multiprocessing
+import traceback
+
+import pandas as pd
+
+from pcap_decoder import PacketSource, flow_key
+from telemetry import ingest_gc
+
+# Records per batch sent to a worker, and batches a worker may have queued
+# before the reader blocks (bounds reader memory when a worker falls behind)
+BATCH_SIZE = 4096
+QUEUE_DEPTH = 16
+
+# Report progress every this many packets
+PROGRESS_INTERVAL = 50000
+
+
+def flow_shard(record, workers):
+    """Worker index for a record; identical for both directions of a flow"""
+    return hash(flow_key(record)) % workers
+
+
+def _shard_worker(extractor_cls, extractor_kwargs, inbox, results):
+    """Worker process: feed record batches to a private extractor, return its DataFrame"""
+    try:
+        extractor = extractor_cls(**extractor_kwargs)
+        with ingest_gc():
+            while True:
+                batch = inbox.get()
+                if batch is None:
+                    break
+                extractor.process_records(batch)
+        results.put((True, extractor.get_flow_dataframe()))
+    except Exception:
+        results.put((False, traceback.format_exc()))
+        # Keep draining so the reader never blocks on a full queue
+        while inbox.get() is not None:
+            pass
+
+
+def process_pcap_sharded(extractor_cls, pcap_file, workers, extractor_kwargs=None,
+                         decoder='raw', scapy_fallback=False, reader='mmap',
+                         progress_callback=None, batch_size=BATCH_SIZE, cancel_token=None):
+    """Extract flows from pcap_file with `workers` processes and return one DataFrame.
+
+    extractor_cls(**extractor_kwargs) is built in every worker and must provide
+    process_records(records) and get_flow_dataframe().
+    progress_callback(bytes_read, bytes_total, packets) may return False to stop early,
+    as does cancelling cancel_token (checked for every packet dispatched);
+    the flows seen up to that point are still returned.
+    """
+    ctx = multiprocessing.get_context()
+    inboxes = [ctx.Queue(maxsize=QUEUE_DEPTH) for _ in range(workers)]
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=_shard_worker,
+                    args=(extractor_cls, extractor_kwargs or {}, inbox, results),
+                    daemon=True)
+        for inbox in inboxes
+    ]
+    for process in processes:
+        process.start()
+
+    batches = [[] for _ in range(workers)]
+    packets = 0
+    total_bytes = bytes_read = 0
+    try:
+        with PacketSource(pcap_file, decoder, scapy_fallback, reader,
+                          cancel_token=cancel_token) as source:
+            total_bytes = source.size
+            for record in source:
+                shard = flow_shard(record, workers)
+                batch = batches[shard]
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    inboxes[shard].put(batch)
+                    batches[shard] = []
+
+                packets += 1
+                if progress_callback and packets % PROGRESS_INTERVAL == 0:
+                    if progress_callback(source.offset, total_bytes, packets) is False:
+                        break
+            bytes_read = source.offset
+
+        for inbox, batch in zip(inboxes, batches):
+            if batch:
+                inbox.put(batch)
+    except BaseException:
+        for process in processes:
+            process.terminate()
+        raise
+    for inbox in inboxes:
+        inbox.put(None)
+
+    # Collect before joining: a worker cannot exit while its result is unread
+    frames = []
+    errors = []
+    for _ in processes:
+        ok, payload = results.get()
+        if ok:
+            frames.append(payload)
+        else:
+            errors.append(payload)
+    for process in processes:
+        process.join()
+
+    if errors:
+        raise RuntimeError("Flow extraction worker failed:\n" + "\n".join(errors))
+
+    if progress_callback:
+        progress_callback(bytes_read, total_bytes, packets)
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,176 @@
+"""
+Binary spill segments for OptimizedFlowExtractor.
+
+Finished flows are packed into a NumPy structured array (one fixed-width
+record per flow) and written with np.save as an append-only series of
+segment files. Segments are opened with np.load(mmap_mode='r'), so reading
+them back touches one segment at a time and never unpickles Python objects;
+address strings are only rendered when a segment is turned into a DataFrame.
+
+A flow spilled while still live is continued by a later flow object with the
+same flow_id. Every segment is sorted by flow_id, so merge_segments can
+reunite the partial records with a block-wise k-way merge that holds at most
+block_rows records per segment in memory.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from pcap_decoder import format_ip
+
+# One spilled flow. Addresses are split into high/low 64-bit halves so IPv6 fits.
+SPILL_DTYPE = np.dtype([
+    ('flow_id', '<u8'),
+    ('src_hi', '<u8'), ('src_lo', '<u8'), ('dst_hi', '<u8'), ('dst_lo', '<u8'),
+    ('ip_version', 'u1'), ('protocol', 'u1'), ('src_port', '<u2'), ('dst_port', '<u2'),
+    ('start', '<f8'), ('last', '<f8'),
+    ('fwd_packets', '<u8'), ('bwd_packets', '<u8'),
+    ('fwd_bytes', '<u8'), ('bwd_bytes', '<u8'),
+    ('fwd_header_bytes', '<u8'), ('bwd_header_bytes', '<u8'),
+    ('fwd_iat_total', '<f8'), ('bwd_iat_total', '<f8'),
+    ('fwd_iat_count', '<u8'), ('bwd_iat_count', '<u8'),
+    ('fwd_psh_flags', '<u4'), ('bwd_psh_flags', '<u4'),
+    ('fwd_urg_flags', '<u4'), ('bwd_urg_flags', '<u4'),
+    ('fwd_urgent_packets', '<u4'), ('bwd_urgent_packets', '<u4'),
+])
+
+# Counter fields copied straight from the flow object; partial records add up
+_COUNTERS = [
+    'fwd_packets', 'bwd_packets', 'fwd_bytes', 'bwd_bytes', 'fwd_header_bytes',
+    'bwd_header_bytes', 'fwd_iat_total', 'bwd_iat_total', 'fwd_iat_count', 'bwd_iat_count',
+    'fwd_psh_flags', 'bwd_psh_flags', 'fwd_urg_flags', 'bwd_urg_flags',
+    'fwd_urgent_packets', 'bwd_urgent_packets'
+]
+
+_LOW64 = (1 << 64) - 1
+
+# Records read from each segment per merge step
+MERGE_BLOCK_ROWS = 65536
+
+
+def flows_to_array(flows):
+    """Pack an iterable of OptimizedFlowFeatures into a SPILL_DTYPE array sorted by flow_id"""
+    flows = list(flows)
+    flows.sort(key=lambda flow: flow.flow_id)
+    records = np.zeros(len(flows), dtype=SPILL_DTYPE)
+    if not flows:
+        return records
+    records['flow_id'] = [flow.flow_id for flow in flows]
+    records['src_hi'] = [flow.src >> 64 for flow in flows]
+    records['src_lo'] = [flow.src & _LOW64 for flow in flows]
+    records['dst_hi'] = [flow.dst >> 64 for flow in flows]
+    records['dst_lo'] = [flow.dst & _LOW64 for flow in flows]
+    for name in ('ip_version', 'protocol', 'src_port', 'dst_port'):
+        records[name] = [getattr(flow, name) for flow in flows]
+    records['start'] = [flow.flow_start_time for flow in flows]
+    records['last'] = [flow.flow_last_seen for flow in flows]
+    for name in _COUNTERS:
+        records[name] = [getattr(flow, name) for flow in flows]
+    return records
+
+
+def write_segment(directory, index, records):
+    """Write one spill segment and return its path"""
+    path = os.path.join(directory, f"flows_{index:06d}.npy")
+    np.save(path, records, allow_pickle=False)
+    return path
+
+
+def read_segment(path):
+    """Memory-map a spill segment (records are paged in as they are read)"""
+    return np.load(path, mmap_mode='r', allow_pickle=False)
+
+
+def merge_partials(records):
+    """Combine records sharing a flow_id (records must be sorted by flow_id)"""
+    if len(records) == 0:
+        return records
+    flow_ids = records['flow_id']
+    starts = np.flatnonzero(np.r_[True, flow_ids[1:] != flow_ids[:-1]])
+    if len(starts) == len(records):
+        return records
+    merged = records[starts].copy()
+    merged['start'] = np.minimum.reduceat(records['start'], starts)
+    merged['last'] = np.maximum.reduceat(records['last'], starts)
+    for name in _COUNTERS:
+        merged[name] = np.add.reduceat(records[name], starts)
+    return merged
+
+
+def merge_segments(paths, block_rows=MERGE_BLOCK_ROWS):
+    """Yield merged record arrays in flow_id order from segments sorted by flow_id.
+
+    A flow_id appears at most once per segment. Each step reads one block per
+    segment and emits every flow_id up to the smallest last flow_id among the
+    blocks of segments that have more rows, so no flow is split across steps.
+    """
+    segments = [read_segment(path) for path in paths]
+    positions = [0] * len(segments)
+    while True:
+        blocks = []
+        bound = None
+        for i, segment in enumerate(segments):
+            position = positions[i]
+            if position >= len(segment):
+                continue
+            block = segment[position:position + block_rows]
+            if position + block_rows < len(segment):
+                last = block['flow_id'][-1]
+                bound = last if bound is None else min(bound, last)
+            blocks.append((i, block))
+        if not blocks:
+            return
+        
+        parts = []
+        for i, block in blocks:
+            count = len(block) if bound is None else int(
+                np.searchsorted(block['flow_id'], bound, side='right'))
+            if count:
+                parts.append(np.array(block[:count]))
+                positions[i] += count
+        records = np.concatenate(parts)
+        records = records[np.argsort(records['flow_id'], kind='stable')]
+        yield merge_partials(records)
+
+
+def _addresses(hi, lo, versions):
+    return [format_ip((int(h) << 64) | int(l), int(v)) for h, l, v in zip(hi, lo, versions)]
+
+
+def records_to_frame(records):
+    """DataFrame with the OptimizedFlowFeatures.to_dict columns for an array of spilled flows"""
+    if len(records) == 0:
+        return pd.DataFrame()
+    fwd_packets = records['fwd_packets'].astype(np.int64)
+    bwd_packets = records['bwd_packets'].astype(np.int64)
+    fwd_bytes = records['fwd_bytes'].astype(np.int64)
+    bwd_bytes = records['bwd_bytes'].astype(np.int64)
+    fwd_iats = records['fwd_iat_count'].astype(np.int64)
+    bwd_iats = records['bwd_iat_count'].astype(np.int64)
+    return pd.DataFrame({
+        'src_ip': _addresses(records['src_hi'], records['src_lo'], records['ip_version']),
+        'dst_ip': _addresses(records['dst_hi'], records['dst_lo'], records['ip_version']),
+        'src_port': records['src_port'].astype(np.int64),
+        'dst_port': records['dst_port'].astype(np.int64),
+        'protocol': records['protocol'].astype(np.int64),
+        'flow_duration': records['last'] - records['start'],
+        'fwd_packets': fwd_packets,
+        'bwd_packets': bwd_packets,
+        'fwd_bytes': fwd_bytes,
+        'bwd_bytes': bwd_bytes,
+        'fwd_header_bytes': records['fwd_header_bytes'].astype(np.int64),
+        'bwd_header_bytes': records['bwd_header_bytes'].astype(np.int64),
+        'fwd_avg_packet_size': np.where(fwd_packets > 0, fwd_bytes / np.maximum(fwd_packets, 1), 0.0),
+        'bwd_avg_packet_size': np.where(bwd_packets > 0, bwd_bytes / np.maximum(bwd_packets, 1), 0.0),
+        'fwd_avg_iat': np.where(fwd_iats > 0, records['fwd_iat_total'] / np.maximum(fwd_iats, 1), 0.0),
+        'bwd_avg_iat': np.where(bwd_iats > 0, records['bwd_iat_total'] / np.maximum(bwd_iats, 1), 0.0),
+        'fwd_psh_flags': records['fwd_psh_flags'].astype(np.int64),
+        'bwd_psh_flags': records['bwd_psh_flags'].astype(np.int64),
+        'fwd_urg_flags': records['fwd_urg_flags'].astype(np.int64),
+        'bwd_urg_flags': records['bwd_urg_flags'].astype(np.int64),
+        'fwd_urgent_packets': records['fwd_urgent_packets'].astype(np.int64),
+        'bwd_urgent_packets': records['bwd_urgent_packets'].astype(np.int64),
+        'total_packets': fwd_packets + bwd_packets,
+        'total_bytes': fwd_bytes + bwd_bytes,
+    })
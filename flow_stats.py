@@ -0,0 +1,90 @@
+"""
+Online statistics accumulators for flow features.
+
+An accumulator keeps count, sum, min, max, mean and M2 (Welford) so a
+flow's per-packet statistics cost constant memory however long the flow
+runs. The stats_* functions run it over a slice of a flat array('d')
+(STATS_WIDTH doubles: count, sum, min, max, mean, M2), so an object holding
+several accumulators stores them unboxed in one array.
+
+PacketSummary is the compact per-packet record flows keep when packet
+retention is switched on.
+"""
+from array import array
+from collections import namedtuple
+
+PacketSummary = namedtuple('PacketSummary', ['time', 'length', 'direction'])
+
+
+def retain_packet(packets, limit, packet, direction):
+    """Append a PacketSummary to packets while fewer than limit are kept (limit 0 keeps none)"""
+    if len(packets) < limit:
+        packets.append(PacketSummary(float(packet.time), len(packet), direction))
+
+
+# Accumulator layout inside a stats array
+STATS_WIDTH = 6
+_COUNT, _TOTAL, _MIN, _MAX, _MEAN, _M2 = range(STATS_WIDTH)
+
+# Offsets of a flow's accumulators (packet lengths, inter-arrival times, gaps
+# between consecutive packets) in its stats array
+FWD_PKT_LEN, BWD_PKT_LEN, PKT_LEN, FWD_IAT, BWD_IAT, FLOW_IAT, PACKET_GAPS = (
+    i * STATS_WIDTH for i in range(7))
+FLOW_ACCUMULATORS = 7
+
+
+def stats_array(accumulators):
+    """Zeroed array holding `accumulators` accumulators"""
+    return array('d', bytes(8 * STATS_WIDTH * accumulators))
+
+
+def stats_update(values, base, value):
+    """Add one value to the accumulator at values[base] (Welford's update)"""
+    value = float(value)
+    count = values[base] + 1
+    values[base] = count
+    values[base + _TOTAL] += value
+    if count == 1:
+        values[base + _MIN] = values[base + _MAX] = value
+    elif value < values[base + _MIN]:
+        values[base + _MIN] = value
+    elif value > values[base + _MAX]:
+        values[base + _MAX] = value
+    mean = values[base + _MEAN]
+    delta = value - mean
+    mean += delta / count
+    values[base + _MEAN] = mean
+    values[base + _M2] += delta * (value - mean)
+
+
+def stats_merge(values, base, other, other_base):
+    """Fold the accumulator at other[other_base] into values[base] (Chan et al. parallel update)"""
+    other_count = other[other_base]
+    if other_count == 0:
+        return
+    self_count = values[base]
+    if self_count == 0:
+        values[base:base + STATS_WIDTH] = other[other_base:other_base + STATS_WIDTH]
+        return
+    count = self_count + other_count
+    delta = other[other_base + _MEAN] - values[base + _MEAN]
+    values[base + _MEAN] += delta * other_count / count
+    values[base + _M2] += other[other_base + _M2] + delta * delta * self_count * other_count / count
+    values[base] = count
+    values[base + _TOTAL] += other[other_base + _TOTAL]
+    values[base + _MIN] = min(values[base + _MIN], other[other_base + _MIN])
+    values[base + _MAX] = max(values[base + _MAX], other[other_base + _MAX])
+
+
+def stats_summary(values, base):
+    """max/min/mean/std/var/sum of the accumulator at values[base] (the feature exporters' layout)"""
+    count = values[base]
+    var = max(values[base + _M2] / count, 0.0) if count > 1 else 0.0
+    return {
+        'max': values[base + _MAX],
+        'min': values[base + _MIN],
+        'mean': values[base + _MEAN],
+        'std': var ** 0.5,
+        'var': var,
+        'sum': values[base + _TOTAL]
+    }
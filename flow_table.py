@@ -0,0 +1,113 @@
+"""
+Live flow table with CICFlowMeter-style flow expiration.
+
+A flow ends when
+  - no packet has been seen for idle_timeout seconds (idle timeout),
+  - it has lasted active_timeout seconds (active timeout; the next packet
+    of the same 5-tuple starts a new flow), or
+  - a TCP RST packet is added to it, or a FIN once both directions have
+    sent one (any FIN for tables holding one direction per flow).
+Times are capture timestamps, not wall-clock time.
+
+The table keeps flows in last-seen order (touch() moves a flow to the end),
+so idle flows are always at the front and finding them costs O(expired)
+rather than a scan of every live flow.
+"""
+from collections import OrderedDict
+
+from pcap_decoder import TCP_FIN, TCP_RST
+
+IDLE_TIMEOUT = 40.0     # seconds without packets before a flow is expired
+ACTIVE_TIMEOUT = 120.0  # maximum flow duration before it is split
+TERMINATING_FLAGS = TCP_FIN | TCP_RST  # packets that may end a flow
+
+# Look for idle flows every this many packets
+EXPIRY_CHECK_PACKETS = 1000
+
+
+class FlowTable(OrderedDict):
+    """Live flows keyed by flow key in last-seen order, with idle/active timeout checks.
+
+    start_attr and last_seen_attr name the flow attributes holding the first
+    and latest packet timestamps, so any flow class can be stored. A timeout
+    of 0 or None disables that check. bidirectional says whether a flow holds
+    both directions of a conversation (FIN then ends it only once both sides
+    have sent one).
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT,
+                 start_attr='flow_start_time', last_seen_attr='flow_last_seen',
+                 bidirectional=True):
+        super().__init__()
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.start_attr = start_attr
+        self.last_seen_attr = last_seen_attr
+        self.bidirectional = bidirectional
+        self._fin_directions = {}  # key -> directions that have sent a FIN
+
+    def pop(self, key, *default):
+        self._fin_directions.pop(key, None)
+        return super().pop(key, *default)
+
+    def __delitem__(self, key):
+        self._fin_directions.pop(key, None)
+        super().__delitem__(key)
+
+    def clear(self):
+        self._fin_directions.clear()
+        super().clear()
+
+    def touch(self, key):
+        """Mark flow `key` as just seen (new flows are inserted at the end already)"""
+        self.move_to_end(key)
+
+    def ends_flow(self, key, tcp_flags, direction):
+        """True if a packet with these TCP flags, just added to flow `key`, terminates it"""
+        if not tcp_flags & TERMINATING_FLAGS:
+            return False
+        if tcp_flags & TCP_RST or not self.bidirectional:
+            return True
+        directions = self._fin_directions.setdefault(key, set())
+        directions.add(direction)
+        return len(directions) == 2
+
+    def fin_state(self, key):
+        """Directions of flow `key` that have sent a FIN"""
+        return frozenset(self._fin_directions.get(key, ()))
+
+    def restore_fin_state(self, key, directions):
+        """Carry FIN state over to a flow resumed under `key`"""
+        if directions:
+            self._fin_directions[key] = set(directions)
+
+    def is_expired(self, flow, now):
+        """True if flow must end before a packet at time `now` can join it"""
+        if self.idle_timeout and now - getattr(flow, self.last_seen_attr) > self.idle_timeout:
+            return True
+        if self.active_timeout and now - getattr(flow, self.start_attr) > self.active_timeout:
+            return True
+        return False
+
+    def pop_expired(self, now):
+        """Remove and return (key, flow) pairs that have been idle longer than idle_timeout.
+
+        Walks from the least recently seen flow and stops at the first live one.
+        A flow touched out of timestamp order may be expired at a later check.
+        """
+        if not self.idle_timeout:
+            return []
+        deadline = now - self.idle_timeout
+        last_seen_attr = self.last_seen_attr
+        expired = []
+        for key, flow in self.items():
+            if getattr(flow, last_seen_attr) >= deadline:
+                break
+            expired.append(key)
+        return [(key, self.pop(key)) for key in expired]
+
+    def pop_all(self):
+        """Remove and return every live flow as (key, flow) pairs"""
+        flows = list(self.items())
+        self.clear()
+        return flows
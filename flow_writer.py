@@ -0,0 +1,178 @@
+"""
+Streaming flow export.
+
+Flow feature rows are written as flows are finalized instead of being
+collected into one DataFrame first. ParquetFlowWriter buffers rows and writes
+a typed row group every row_group_size flows, so memory stays bounded however
+many flows a capture produces; CsvFlowWriter writes the same rows as CSV.
+open_flow_writer picks the format from the file extension and read_flows
+loads either format back into a DataFrame.
+
+Parquet support needs pyarrow (pip install pyarrow); CSV has no extra
+dependencies.
+"""
+import os
+import csv
+
+import pandas as pd
+
+# Flows per Parquet row group
+ROW_GROUP_SIZE = 65536
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def _import_pyarrow():
+    """Return (pyarrow, pyarrow.parquet), with an install hint when pyarrow is missing"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+
+def is_parquet_path(path):
+    return os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS
+
+
+class ParquetFlowWriter:
+    """Write flow feature rows to a Parquet file in typed row groups.
+
+    The schema is taken from the first row group; later rows must keep the
+    same columns and types.
+    """
+
+    def __init__(self, path, row_group_size=ROW_GROUP_SIZE, compression='snappy'):
+        self.pa, self.pq = _import_pyarrow()
+        self.path = path
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.rows = 0
+        self._columns = None  # column name -> buffered values
+        self._buffered = 0
+        self._writer = None
+
+    def write(self, features):
+        """Buffer one flow's feature dict, writing a row group when the buffer is full"""
+        if self._columns is None:
+            self._columns = {name: [] for name in features}
+        for name, values in self._columns.items():
+            values.append(features[name])
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def write_frame(self, frame):
+        """Write the rows of a DataFrame of flows"""
+        if frame is None or frame.empty:
+            return
+        self.flush()
+        for start in range(0, len(frame), self.row_group_size):
+            chunk = frame.iloc[start:start + self.row_group_size]
+            self._write_table(self.pa.Table.from_pandas(chunk, preserve_index=False))
+
+    def flush(self):
+        """Write the buffered rows as one row group"""
+        if not self._buffered:
+            return
+        table = self.pa.Table.from_pydict(self._columns)
+        self._columns = {name: [] for name in self._columns}
+        self._buffered = 0
+        self._write_table(table)
+
+    def _write_table(self, table):
+        if self._writer is None:
+            self._writer = self.pq.ParquetWriter(self.path, table.schema,
+                                                 compression=self.compression)
+        elif table.schema != self._writer.schema:
+            table = table.select(self._writer.schema.names).cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvFlowWriter:
+    """Write flow feature rows to a CSV file as they arrive.
+
+    keep_rows continues a file left by an interrupted run: its header and
+    first keep_rows rows are kept, anything after them is cut off, and new
+    rows are appended.
+    """
+
+    def __init__(self, path, keep_rows=None):
+        self.path = path
+        self.rows = 0
+        self._writer = None
+        if not keep_rows or not os.path.exists(path):
+            self._file = open(path, 'w', newline='')
+            return
+        with open(path, 'rb') as f:
+            header = f.readline()
+            for _ in range(keep_rows):
+                f.readline()
+            end = f.tell()
+        os.truncate(path, end)
+        self._file = open(path, 'a', newline='')
+        fieldnames = next(csv.reader([header.decode()]))
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        self.rows = keep_rows
+
+    def write(self, features):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=list(features))
+            self._writer.writeheader()
+        self._writer.writerow(features)
+        self.rows += 1
+
+    def write_frame(self, frame):
+        """Write the rows of a DataFrame of flows"""
+        if frame is None or frame.empty:
+            return
+        for features in frame.to_dict('records'):
+            self.write(features)
+
+    def flush(self):
+        """Push the rows written so far to the file"""
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_flow_writer(path, keep_rows=None, **kwargs):
+    """ParquetFlowWriter for .parquet/.pq paths, CsvFlowWriter otherwise.
+
+    keep_rows resumes an interrupted CSV file (see CsvFlowWriter); Parquet
+    files cannot be continued.
+    """
+    if is_parquet_path(path):
+        if keep_rows is not None:
+            raise ValueError("An interrupted Parquet file cannot be resumed; write CSV to resume")
+        return ParquetFlowWriter(path, **kwargs)
+    return CsvFlowWriter(path, keep_rows)
+
+
+def read_flows(path):
+    """Load a flow file written by either writer into a DataFrame"""
+    if is_parquet_path(path):
+        _import_pyarrow()
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
@@ -3,12 +3,18 @@ import time
 import pandas as pd
 from scapy.all import rdpcap, IP, TCP, UDP
 from collections import defaultdict
+from cancellation import CancelToken
 
 class SimpleFlowExtractor:
-    def __init__(self, output_file):
+    def __init__(self, output_file, cancel_token=None):
         """Initialize the flow extractor."""
         self.output_file = output_file
         self.flows = {}
+        self.cancel_token = cancel_token if cancel_token is not None else CancelToken()
+    
+    def cancel(self):
+        """Stop a running process_pcap_gui at the next packet, keeping the flows so far"""
+        self.cancel_token.cancel()
         
     def process_pcap_gui(self, pcap_file, progress_callback=None):
         """Process a pcap file and extract flow statistics with progress updates.
@@ -26,7 +32,10 @@ class SimpleFlowExtractor:
             total_packets = len(packets)
             
             # Process each packet
+            cancel_token = self.cancel_token
             for i, packet in enumerate(packets):
+                if cancel_token.cancelled:
+                    return
                 try:
                     # Skip non-IP packets
                     if IP not in packet:
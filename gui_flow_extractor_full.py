@@ -2,206 +2,190 @@ import os
 import time
 import pandas as pd
 import numpy as np
-import psutil
-import gc
-from scapy.all import PcapReader, IP, TCP, UDP, ICMP
-from scapy.packet import Packet
+import pickle
+from array import array
+from contextlib import contextmanager, nullcontext
+from itertools import islice
 from collections import defaultdict, namedtuple
 from datetime import datetime
 from multiprocessing import Pool, cpu_count
 from functools import partial
 import warnings
+from pcap_decoder import (
+    PacketRecord, PacketSource, to_record, flow_key, format_ip, IPPROTO_TCP,
+    TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK, TCP_URG, TCP_ECE, TCP_CWR
+)
+from flow_stats import (
+    STATS_WIDTH, FLOW_ACCUMULATORS, FWD_PKT_LEN, BWD_PKT_LEN, PKT_LEN, FWD_IAT, BWD_IAT,
+    FLOW_IAT, PACKET_GAPS, stats_array, stats_update, stats_merge, stats_summary, retain_packet
+)
+from flow_sharding import process_pcap_sharded
+from columnar_features import extract_flows_columnar
+from array_flow_table import ArrayFlowTable
+from live_capture import iter_live, TICK_INTERVAL
+from cancellation import CancelToken
+from telemetry import TelemetrySampler, ingest_gc, TELEMETRY_INTERVAL
+from flow_table import (
+    FlowTable, IDLE_TIMEOUT, ACTIVE_TIMEOUT, EXPIRY_CHECK_PACKETS
+)
+
+# Flow engines: per-packet flow objects, whole-capture vectorized columns,
+# or per-packet updates to a NumPy structure-of-arrays flow table
+ENGINES = ('object', 'columnar', 'arrays')
+
+# engine='arrays' hands ended flows to on_flow in batches of this many
+ARRAYS_EMIT_FLOWS = 4096
+
+# Seconds between checkpoints of process_pcap, and the checkpoint format version
+CHECKPOINT_INTERVAL = 60.0
+CHECKPOINT_VERSION = 2
 
 # Suppress Scapy warnings
 warnings.filterwarnings("ignore", category=UserWarning, module='scapy')
 
-# Memory management
-def get_memory_usage():
-    """Get current process memory usage in MB"""
-    process = psutil.Process()
-    return process.memory_info().rss / (1024 * 1024)  # Convert to MB
-
 class FlowFeatures:
-    """Class to calculate and store flow features"""
+    """Class to calculate and store flow features
+    
+    Fixed slotted layout: scalar counters, a TCP flag bitmask and one array of
+    running accumulators (packet lengths, inter-arrival times, packet gaps).
+    """
+    
+    __slots__ = [
+        'retain_packets', 'packets', 'tcp_flags',
+        'src', 'dst', 'ip_version', 'protocol', 'src_port', 'dst_port',
+        'flow_start_time', 'flow_last_seen', 'flow_duration',
+        'first_fwd_time', 'last_fwd_time', 'first_bwd_time', 'last_bwd_time',
+        'fwd_packets', 'bwd_packets', 'fwd_bytes', 'bwd_bytes', 'stats',
+        'fin_flag_count', 'syn_flag_count', 'rst_flag_count', 'psh_flag_count',
+        'ack_flag_count', 'urg_flag_count', 'cwr_flag_count', 'ece_flag_count',
+        'init_fwd_win_size', 'init_bwd_win_size'
+    ]
     
-    def __init__(self, packet, direction):
-        """Initialize flow with first packet"""
-        self.packets = [(packet, direction)]
-        self.timestamps = [packet.time]
-        self.directions = [direction]
-        self.packet_sizes = [len(packet)]
-        self.tcp_flags = set()
+    def __init__(self, packet, direction, retain_packets=0):
+        """Initialize flow with first packet (a PacketRecord or a Scapy packet).
+        
+        retain_packets keeps PacketSummary tuples of the first N packets in
+        self.packets; the default 0 keeps none, so memory does not grow with packets.
+        """
+        packet = to_record(packet)
+        self.retain_packets = retain_packets
+        self.packets = []
+        retain_packet(self.packets, retain_packets, packet, direction)
         
         # Initialize all features
         self._init_features(packet, direction)
     
     def _init_features(self, packet, direction):
         """Initialize all flow features"""
-        # Basic flow information
-        self.src_ip = packet[IP].src if IP in packet else '0.0.0.0'
-        self.dst_ip = packet[IP].dst if IP in packet else '0.0.0.0'
-        self.protocol = packet[IP].proto if IP in packet else 0
-        self.src_port = 0
-        self.dst_port = 0
+        # Basic flow information (addresses as ints, rendered at export); the
+        # source is the forward endpoint, even when the first packet is backward
+        if direction == 'forward':
+            self.src, self.src_port = packet.src, packet.src_port
+            self.dst, self.dst_port = packet.dst, packet.dst_port
+        else:
+            self.src, self.src_port = packet.dst, packet.dst_port
+            self.dst, self.dst_port = packet.src, packet.src_port
+        self.ip_version = packet.ip_version
+        self.protocol = packet.proto
+        
+        # Flow timing
+        timestamp = float(packet.time)
+        self.flow_start_time = timestamp
+        self.flow_last_seen = timestamp
+        self.flow_duration = 0.0
         
         # Initialize last packet times
-        self.last_fwd_time = float(packet.time) if direction == 'forward' else 0.0
-        self.last_bwd_time = float(packet.time) if direction == 'backward' else 0.0
-        
-        # Ports based on protocol
-        if TCP in packet:
-            self.src_port = packet[TCP].sport
-            self.dst_port = packet[TCP].dport
-            self._extract_tcp_flags(packet[TCP])
-        elif UDP in packet:
-            self.src_port = packet[UDP].sport
-            self.dst_port = packet[UDP].dport
-        
-        # Initialize flow attributes with explicit float conversion
-        self.flow_start_time = float(packet.time)
-        self.flow_last_seen = float(packet.time)
-        self.flow_duration = 0.0
-        self.flow_id = f"{self.src_ip}_{self.src_port}_{self.dst_ip}_{self.dst_port}_{int(packet.time)}"
+        self.last_fwd_time = timestamp if direction == 'forward' else 0.0
+        self.last_bwd_time = timestamp if direction == 'backward' else 0.0
+        self.first_fwd_time = self.last_fwd_time
+        self.first_bwd_time = self.last_bwd_time
         
         # Initialize packet and byte counters
+        pkt_len = len(packet)
         self.fwd_packets = 1 if direction == 'forward' else 0
         self.bwd_packets = 1 if direction == 'backward' else 0
-        self.fwd_bytes = int(len(packet)) if direction == 'forward' else 0
-        self.bwd_bytes = int(len(packet)) if direction == 'backward' else 0
-        
-        # Initialize TCP flags
-        self.tcp_flags = set()
-        
-        # Initialize lists for statistical calculations
-        pkt_len = int(len(packet))
-        self.fwd_packet_sizes = [pkt_len] if direction == 'forward' else []
-        self.bwd_packet_sizes = [pkt_len] if direction == 'backward' else []
-        self.fwd_iat = []  # Forward inter-arrival times
-        self.bwd_iat = []  # Backward inter-arrival times
-        self.flow_iat = []  # All inter-arrival times
-        self.packet_sizes = [pkt_len]  # All packet sizes
-        self.timestamps = [self.flow_start_time]  # All packet timestamps
-        
-        # TCP specific
-        self.fin_flag_count = 1 if TCP in packet and packet[TCP].flags.F else 0
-        self.syn_flag_count = 1 if TCP in packet and packet[TCP].flags.S else 0
-        self.rst_flag_count = 1 if TCP in packet and packet[TCP].flags.R else 0
-        self.psh_flag_count = 1 if TCP in packet and packet[TCP].flags.P else 0
-        self.ack_flag_count = 1 if TCP in packet and packet[TCP].flags.A else 0
-        self.urg_flag_count = 1 if TCP in packet and packet[TCP].flags.U else 0
-        self.cwr_flag_count = 1 if TCP in packet and packet[TCP].flags.C else 0
-        self.ece_flag_count = 1 if TCP in packet and packet[TCP].flags.E else 0
+        self.fwd_bytes = pkt_len if direction == 'forward' else 0
+        self.bwd_bytes = pkt_len if direction == 'backward' else 0
+        
+        # Running accumulators for statistical calculations (constant memory per flow)
+        self.stats = stats_array(FLOW_ACCUMULATORS)
+        stats_update(self.stats, PKT_LEN, pkt_len)
+        stats_update(self.stats, FWD_PKT_LEN if direction == 'forward' else BWD_PKT_LEN, pkt_len)
+        
+        # TCP specific (flags and window are 0 for non-TCP packets)
+        flags = packet.tcp_flags
+        self.tcp_flags = flags  # Every TCP flag seen in the flow
+        self.fin_flag_count = 1 if flags & TCP_FIN else 0
+        self.syn_flag_count = 1 if flags & TCP_SYN else 0
+        self.rst_flag_count = 1 if flags & TCP_RST else 0
+        self.psh_flag_count = 1 if flags & TCP_PSH else 0
+        self.ack_flag_count = 1 if flags & TCP_ACK else 0
+        self.urg_flag_count = 1 if flags & TCP_URG else 0
+        self.cwr_flag_count = 1 if flags & TCP_CWR else 0
+        self.ece_flag_count = 1 if flags & TCP_ECE else 0
         
         # Window sizes
-        self.init_fwd_win_size = packet[TCP].window if TCP in packet else 0
+        self.init_fwd_win_size = packet.window
         self.init_bwd_win_size = 0  # Will be updated with backward packet
         
-        # Initialize other features
-        self.flow_byts_s = 0
-        self.flow_pkts_s = 0
-        self.fwd_pkts_s = 0
-        self.bwd_pkts_s = 0
-        
-    def _extract_tcp_flags(self, tcp_layer):
-        """Extract TCP flags"""
-        if tcp_layer.flags.F: self.tcp_flags.add('FIN')
-        if tcp_layer.flags.S: self.tcp_flags.add('SYN')
-        if tcp_layer.flags.R: self.tcp_flags.add('RST')
-        if tcp_layer.flags.P: self.tcp_flags.add('PSH')
-        if tcp_layer.flags.A: self.tcp_flags.add('ACK')
-        if tcp_layer.flags.U: self.tcp_flags.add('URG')
-        if tcp_layer.flags.E: self.tcp_flags.add('ECE')
-        if tcp_layer.flags.C: self.tcp_flags.add('CWR')
+    @property
+    def src_ip(self):
+        return format_ip(self.src, self.ip_version)
+    
+    @property
+    def dst_ip(self):
+        return format_ip(self.dst, self.ip_version)
+    
+    @property
+    def flow_id(self):
+        return f"{self.src_ip}_{self.src_port}_{self.dst_ip}_{self.dst_port}_{int(self.flow_start_time)}"
     
     def add_packet(self, packet, direction):
         """Add a packet to the flow with optimized memory usage"""
+        packet = to_record(packet)
+        stats = self.stats
         try:
             # Get current timestamp and packet size with proper type conversion
             current_time = float(packet.time)
-            packet_size = int(len(packet))
+            packet_size = len(packet)
             
-            # Initialize flow times if not set
-            if not hasattr(self, 'flow_start_time'):
-                self.flow_start_time = current_time
-            if not hasattr(self, 'flow_last_seen'):
-                self.flow_last_seen = current_time
+            # Gap since the previous packet in either direction
+            stats_update(stats, PACKET_GAPS, current_time - self.flow_last_seen)
             
             # Update timestamps
             self.flow_last_seen = current_time
             self.flow_duration = current_time - self.flow_start_time
             
-            # Initialize packet lists if not exists (using more memory-efficient structures)
-            if not hasattr(self, 'timestamps'):
-                self.timestamps = []
-            if not hasattr(self, 'fwd_packet_sizes'):
-                self.fwd_packet_sizes = []
-            if not hasattr(self, 'bwd_packet_sizes'):
-                self.bwd_packet_sizes = []
-            if not hasattr(self, 'fwd_iat'):
-                self.fwd_iat = []
-            if not hasattr(self, 'bwd_iat'):
-                self.bwd_iat = []
-            if not hasattr(self, 'flow_iat'):
-                self.flow_iat = []
-            
-            # Store packet timestamp (with reduced precision to save memory)
-            self.timestamps.append(round(current_time, 6))
-            
-            # Initialize counters if not exists
-            if not hasattr(self, 'fwd_packets'):
-                self.fwd_packets = 0
-            if not hasattr(self, 'bwd_packets'):
-                self.bwd_packets = 0
-            if not hasattr(self, 'fwd_bytes'):
-                self.fwd_bytes = 0
-            if not hasattr(self, 'bwd_bytes'):
-                self.bwd_bytes = 0
-            
             # Update packet and byte counts based on direction
             if direction == 'forward':
                 self.fwd_packets += 1
                 self.fwd_bytes += packet_size
-                self.fwd_packet_sizes.append(packet_size)
-                
-                # Initialize last_fwd_time if not exists
-                if not hasattr(self, 'last_fwd_time'):
-                    self.last_fwd_time = current_time
+                stats_update(stats, FWD_PKT_LEN, packet_size)
                 
                 # Calculate IAT for forward packets
-                if self.fwd_packets > 1 and hasattr(self, 'last_fwd_time'):
+                if self.fwd_packets > 1:
                     iat = current_time - self.last_fwd_time
-                    self.fwd_iat.append(round(iat, 6))  # Reduced precision to save memory
-                    self.flow_iat.append(round(iat, 6))
+                    stats_update(stats, FWD_IAT, iat)
+                    stats_update(stats, FLOW_IAT, iat)
+                else:
+                    self.first_fwd_time = current_time
                 self.last_fwd_time = current_time
                 
             else:  # backward
                 self.bwd_packets += 1
                 self.bwd_bytes += packet_size
-                self.bwd_packet_sizes.append(packet_size)
-                
-                # Initialize last_bwd_time if not exists
-                if not hasattr(self, 'last_bwd_time'):
-                    self.last_bwd_time = current_time
+                stats_update(stats, BWD_PKT_LEN, packet_size)
                 
                 # Calculate IAT for backward packets
-                if self.bwd_packets > 1 and hasattr(self, 'last_bwd_time'):
+                if self.bwd_packets > 1:
                     iat = current_time - self.last_bwd_time
-                    self.bwd_iat.append(round(iat, 6))  # Reduced precision to save memory
-                    self.flow_iat.append(round(iat, 6))
+                    stats_update(stats, BWD_IAT, iat)
+                    stats_update(stats, FLOW_IAT, iat)
+                else:
+                    self.first_bwd_time = current_time
                 self.last_bwd_time = current_time
                 
-            # Add to packet sizes list (with reduced precision if needed)
-            self.packet_sizes.append(packet_size)
-            
-            # Periodically clean up large lists to save memory
-            if len(self.timestamps) > 1000 and len(self.timestamps) % 500 == 0:
-                # Keep only the last 1000 timestamps
-                self.timestamps = self.timestamps[-1000:]
-                self.packet_sizes = self.packet_sizes[-1000:]
-                if hasattr(self, 'fwd_packet_sizes') and len(self.fwd_packet_sizes) > 1000:
-                    self.fwd_packet_sizes = self.fwd_packet_sizes[-1000:]
-                if hasattr(self, 'bwd_packet_sizes') and len(self.bwd_packet_sizes) > 1000:
-                    self.bwd_packet_sizes = self.bwd_packet_sizes[-1000:]
+            stats_update(stats, PKT_LEN, packet_size)
                     
         except Exception as e:
             print(f"Error adding packet to flow: {e}")
@@ -210,132 +194,161 @@ class FlowFeatures:
             raise
         
         # Update TCP flags
-        if TCP in packet:
-            tcp = packet[TCP]
-            self.fin_flag_count += 1 if tcp.flags.F else 0
-            self.syn_flag_count += 1 if tcp.flags.S else 0
-            self.rst_flag_count += 1 if tcp.flags.R else 0
-            self.psh_flag_count += 1 if tcp.flags.P else 0
-            self.ack_flag_count += 1 if tcp.flags.A else 0
-            self.urg_flag_count += 1 if tcp.flags.U else 0
-            self.cwr_flag_count += 1 if tcp.flags.C else 0
-            self.ece_flag_count += 1 if tcp.flags.E else 0
+        if packet.proto == IPPROTO_TCP:
+            flags = packet.tcp_flags
+            self.tcp_flags |= flags
+            self.fin_flag_count += 1 if flags & TCP_FIN else 0
+            self.syn_flag_count += 1 if flags & TCP_SYN else 0
+            self.rst_flag_count += 1 if flags & TCP_RST else 0
+            self.psh_flag_count += 1 if flags & TCP_PSH else 0
+            self.ack_flag_count += 1 if flags & TCP_ACK else 0
+            self.urg_flag_count += 1 if flags & TCP_URG else 0
+            self.cwr_flag_count += 1 if flags & TCP_CWR else 0
+            self.ece_flag_count += 1 if flags & TCP_ECE else 0
             
             # Update window sizes
             if direction == 'backward' and self.init_bwd_win_size == 0:
-                self.init_bwd_win_size = tcp.window
+                self.init_bwd_win_size = packet.window
         
-        # Store packet info
-        self.packets.append((packet, direction))
-        self.timestamps.append(packet.time)
-        self.directions.append(direction)
-        self.packet_sizes.append(packet_size)
+        # Store packet summary if retention is enabled
+        retain_packet(self.packets, self.retain_packets, packet, direction)
     
-    def _safe_statistics(self, values, default=0.0):
-        """Safely calculate statistics for a list of values, handling empty lists and NaN values"""
-        if not values or len(values) == 0:
-            return {
-                'max': default,
-                'min': default,
-                'mean': default,
-                'std': default,
-                'var': default,
-                'sum': default
-            }
-            
-        try:
-            # Convert all values to float and filter out any potential None or NaN values
-            clean_values = [float(v) for v in values if v is not None and not np.isnan(float(v))]
-            if not clean_values:
-                return {
-                    'max': default,
-                    'min': default,
-                    'mean': default,
-                    'std': default,
-                    'var': default,
-                    'sum': default
-                }
-                
-            return {
-                'max': float(np.nanmax(clean_values)),
-                'min': float(np.nanmin(clean_values)),
-                'mean': float(np.nanmean(clean_values)),
-                'std': float(np.nanstd(clean_values)) if len(clean_values) > 1 else default,
-                'var': float(np.nanvar(clean_values)) if len(clean_values) > 1 else default,
-                'sum': float(np.nansum(clean_values))
-            }
-        except (ValueError, TypeError, RuntimeWarning):
-            return {
-                'max': default,
-                'min': default,
-                'mean': default,
-                'std': default,
-                'var': default,
-                'sum': default
-            }
+    def _reversed(self):
+        """Copy of this partial flow seen from its other endpoint (forward and backward swapped)"""
+        flow = object.__new__(FlowFeatures)
+        for name in self.__slots__:
+            setattr(flow, name, getattr(self, name))
+        flow.src, flow.dst = self.dst, self.src
+        flow.src_port, flow.dst_port = self.dst_port, self.src_port
+        flow.first_fwd_time, flow.first_bwd_time = self.first_bwd_time, self.first_fwd_time
+        flow.last_fwd_time, flow.last_bwd_time = self.last_bwd_time, self.last_fwd_time
+        flow.fwd_packets, flow.bwd_packets = self.bwd_packets, self.fwd_packets
+        flow.fwd_bytes, flow.bwd_bytes = self.bwd_bytes, self.fwd_bytes
+        flow.init_fwd_win_size, flow.init_bwd_win_size = self.init_bwd_win_size, self.init_fwd_win_size
+        flow.stats = array('d', self.stats)
+        for fwd, bwd in ((FWD_PKT_LEN, BWD_PKT_LEN), (FWD_IAT, BWD_IAT)):
+            flow.stats[fwd:fwd + STATS_WIDTH] = self.stats[bwd:bwd + STATS_WIDTH]
+            flow.stats[bwd:bwd + STATS_WIDTH] = self.stats[fwd:fwd + STATS_WIDTH]
+        flow.packets = [summary._replace(direction='backward' if summary.direction == 'forward'
+                                         else 'forward') for summary in self.packets]
+        return flow
+    
+    def merge(self, other):
+        """Fold another partial FlowFeatures of the same flow into this one and return self.
+        
+        The partials must cover adjacent, non-overlapping stretches of the flow (e.g.
+        consecutive chunks of a capture); merging is associative and commutative, so
+        A.merge(B) and B.merge(A) give the same result. Directions follow the earlier
+        partial: a later one that began with a packet from the other endpoint (so its
+        forward is the flow's backward) is swapped around before merging.
+        """
+        first, second = (self, other) if self.flow_start_time <= other.flow_start_time else (other, self)
+        if (second.src, second.src_port) != (first.src, first.src_port):
+            second = second._reversed()
+        
+        # Gaps that straddle the boundary between the two partials
+        boundary_gap = second.flow_start_time - first.flow_last_seen
+        boundary_fwd_iat = (second.first_fwd_time - first.last_fwd_time
+                            if first.fwd_packets and second.fwd_packets else None)
+        boundary_bwd_iat = (second.first_bwd_time - first.last_bwd_time
+                            if first.bwd_packets and second.bwd_packets else None)
+        
+        # Identity, first/last times and initial windows
+        self.src, self.dst, self.ip_version = first.src, first.dst, first.ip_version
+        self.src_port, self.dst_port = first.src_port, first.dst_port
+        self.protocol = first.protocol
+        self.init_fwd_win_size = first.init_fwd_win_size
+        self.init_bwd_win_size = first.init_bwd_win_size or second.init_bwd_win_size
+        self.first_fwd_time = first.first_fwd_time if first.fwd_packets else second.first_fwd_time
+        self.first_bwd_time = first.first_bwd_time if first.bwd_packets else second.first_bwd_time
+        self.last_fwd_time = second.last_fwd_time if second.fwd_packets else first.last_fwd_time
+        self.last_bwd_time = second.last_bwd_time if second.bwd_packets else first.last_bwd_time
+        self.flow_start_time = first.flow_start_time
+        self.flow_last_seen = max(first.flow_last_seen, second.flow_last_seen)
+        self.flow_duration = self.flow_last_seen - self.flow_start_time
+        
+        # Counters and flags
+        self.fwd_packets = first.fwd_packets + second.fwd_packets
+        self.bwd_packets = first.bwd_packets + second.bwd_packets
+        self.fwd_bytes = first.fwd_bytes + second.fwd_bytes
+        self.bwd_bytes = first.bwd_bytes + second.bwd_bytes
+        self.fin_flag_count += other.fin_flag_count
+        self.syn_flag_count += other.syn_flag_count
+        self.rst_flag_count += other.rst_flag_count
+        self.psh_flag_count += other.psh_flag_count
+        self.ack_flag_count += other.ack_flag_count
+        self.urg_flag_count += other.urg_flag_count
+        self.cwr_flag_count += other.cwr_flag_count
+        self.ece_flag_count += other.ece_flag_count
+        self.tcp_flags |= other.tcp_flags
+        
+        # Running statistics
+        stats = array('d', first.stats)
+        for base in range(0, FLOW_ACCUMULATORS * STATS_WIDTH, STATS_WIDTH):
+            stats_merge(stats, base, second.stats, base)
+        self.stats = stats
+        stats_update(stats, PACKET_GAPS, boundary_gap)
+        if boundary_fwd_iat is not None:
+            stats_update(stats, FWD_IAT, boundary_fwd_iat)
+            stats_update(stats, FLOW_IAT, boundary_fwd_iat)
+        if boundary_bwd_iat is not None:
+            stats_update(stats, BWD_IAT, boundary_bwd_iat)
+            stats_update(stats, FLOW_IAT, boundary_bwd_iat)
+        
+        # Retained packet summaries, oldest first
+        self.retain_packets = max(self.retain_packets, other.retain_packets)
+        self.packets = (first.packets + second.packets)[:self.retain_packets]
+        return self
     
     def calculate_features(self):
         """Calculate all flow features with NaN handling"""
-        # Initialize with default values to avoid KeyError
-        total_packets = getattr(self, 'fwd_packets', 0) + getattr(self, 'bwd_packets', 0)
-        total_bytes = getattr(self, 'fwd_bytes', 0) + getattr(self, 'bwd_bytes', 0)
-        
-        # Initialize TCP flags with default values if not set
-        tcp_flags = {
-            'fin': getattr(self, 'fin_flag_count', 0),
-            'syn': getattr(self, 'syn_flag_count', 0),
-            'rst': getattr(self, 'rst_flag_count', 0),
-            'psh': getattr(self, 'psh_flag_count', 0),
-            'ack': getattr(self, 'ack_flag_count', 0),
-            'urg': getattr(self, 'urg_flag_count', 0),
-            'cwr': getattr(self, 'cwr_flag_count', 0),
-            'ece': getattr(self, 'ece_flag_count', 0)
-        }
+        total_packets = self.fwd_packets + self.bwd_packets
+        total_bytes = self.fwd_bytes + self.bwd_bytes
         
-        # Basic flow features with safe attribute access
+        # Basic flow features
         features = {
-            'flow_id': getattr(self, 'flow_id', ''),
-            'src_ip': getattr(self, 'src_ip', '0.0.0.0'),
-            'src_port': getattr(self, 'src_port', 0),
-            'dst_ip': getattr(self, 'dst_ip', '0.0.0.0'),
-            'dst_port': getattr(self, 'dst_port', 0),
-            'protocol': getattr(self, 'protocol', 0),
-            'timestamp': float(getattr(self, 'flow_start_time', 0.0)),
-            'flow_duration': float(getattr(self, 'flow_duration', 0.0)),
-            'tot_fwd_pkts': getattr(self, 'fwd_packets', 0),
-            'tot_bwd_pkts': getattr(self, 'bwd_packets', 0),
-            'totlen_fwd_pkts': getattr(self, 'fwd_bytes', 0),
-            'totlen_bwd_pkts': getattr(self, 'bwd_bytes', 0),
-            'fin_flag_cnt': tcp_flags['fin'],
-            'syn_flag_cnt': tcp_flags['syn'],
-            'rst_flag_cnt': tcp_flags['rst'],
-            'psh_flag_cnt': tcp_flags['psh'],
-            'ack_flag_cnt': tcp_flags['ack'],
-            'urg_flag_cnt': tcp_flags['urg'],
-            'cwr_flag_count': tcp_flags['cwr'],
-            'ece_flag_count': tcp_flags['ece'],
-            'init_fwd_win_byts': getattr(self, 'init_fwd_win_size', 0),
-            'init_bwd_win_byts': getattr(self, 'init_bwd_win_size', 0)
+            'flow_id': self.flow_id,
+            'src_ip': self.src_ip,
+            'src_port': self.src_port,
+            'dst_ip': self.dst_ip,
+            'dst_port': self.dst_port,
+            'protocol': self.protocol,
+            'timestamp': float(self.flow_start_time),
+            'flow_duration': float(self.flow_duration),
+            'tot_fwd_pkts': self.fwd_packets,
+            'tot_bwd_pkts': self.bwd_packets,
+            'totlen_fwd_pkts': self.fwd_bytes,
+            'totlen_bwd_pkts': self.bwd_bytes,
+            'fin_flag_cnt': self.fin_flag_count,
+            'syn_flag_cnt': self.syn_flag_count,
+            'rst_flag_cnt': self.rst_flag_count,
+            'psh_flag_cnt': self.psh_flag_count,
+            'ack_flag_cnt': self.ack_flag_count,
+            'urg_flag_cnt': self.urg_flag_count,
+            'cwr_flag_count': self.cwr_flag_count,
+            'ece_flag_count': self.ece_flag_count,
+            'init_fwd_win_byts': self.init_fwd_win_size,
+            'init_bwd_win_byts': self.init_bwd_win_size
         }
         
         # Calculate rates with safe division
-        flow_dur = float(getattr(self, 'flow_duration', 0.0))
+        flow_dur = float(self.flow_duration)
         safe_flow_dur = max(flow_dur, 1e-10)  # Avoid division by zero
         
         # Calculate rates with safe division and NaN handling
         rates = {
             'flow_byts_s': float(total_bytes) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
             'flow_pkts_s': float(total_packets) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
-            'fwd_pkts_s': float(getattr(self, 'fwd_packets', 0)) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
-            'bwd_pkts_s': float(getattr(self, 'bwd_packets', 0)) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
+            'fwd_pkts_s': float(self.fwd_packets) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
+            'bwd_pkts_s': float(self.bwd_packets) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
             'fwd_avg_bytes_per_bulk': 0.0,  # Placeholder for future implementation
             'fwd_avg_packets_per_bulk': 0.0,  # Placeholder for future implementation
             'fwd_avg_bulk_rate': 0.0,  # Placeholder for future implementation
             'bwd_avg_bytes_per_bulk': 0.0,  # Placeholder for future implementation
             'bwd_avg_packets_per_bulk': 0.0,  # Placeholder for future implementation
             'bwd_avg_bulk_rate': 0.0,  # Placeholder for future implementation
-            'fwd_avg_bytes_per_sec': float(getattr(self, 'fwd_bytes', 0)) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
-            'bwd_avg_bytes_per_sec': float(getattr(self, 'bwd_bytes', 0)) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
+            'fwd_avg_bytes_per_sec': float(self.fwd_bytes) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
+            'bwd_avg_bytes_per_sec': float(self.bwd_bytes) / safe_flow_dur if safe_flow_dur > 0 else 0.0,
             'flow_avg_bytes_per_sec': float(total_bytes) / safe_flow_dur if safe_flow_dur > 0 else 0.0
         }
         
@@ -343,8 +356,8 @@ class FlowFeatures:
         for k, v in rates.items():
             features[k] = 0.0 if v != v or abs(v) == float('inf') else float(v)
         
-        # Calculate packet length statistics using safe_statistics
-        fwd_stats = self._safe_statistics(getattr(self, 'fwd_packet_sizes', []))
+        # Packet length statistics
+        fwd_stats = stats_summary(self.stats, FWD_PKT_LEN)
         features.update({
             'fwd_pkt_len_max': fwd_stats['max'],
             'fwd_pkt_len_min': fwd_stats['min'],
@@ -354,7 +367,7 @@ class FlowFeatures:
             'fwd_pkt_len_total': fwd_stats['sum']
         })
         
-        bwd_stats = self._safe_statistics(getattr(self, 'bwd_packet_sizes', []))
+        bwd_stats = stats_summary(self.stats, BWD_PKT_LEN)
         features.update({
             'bwd_pkt_len_max': bwd_stats['max'],
             'bwd_pkt_len_min': bwd_stats['min'],
@@ -364,8 +377,8 @@ class FlowFeatures:
             'bwd_pkt_len_total': bwd_stats['sum']
         })
         
-        # Calculate IAT statistics using safe_statistics
-        flow_iat_stats = self._safe_statistics(getattr(self, 'flow_iat', []))
+        # IAT statistics
+        flow_iat_stats = stats_summary(self.stats, FLOW_IAT)
         features.update({
             'flow_iat_mean': flow_iat_stats['mean'],
             'flow_iat_max': flow_iat_stats['max'],
@@ -375,7 +388,7 @@ class FlowFeatures:
             'flow_iat_total': flow_iat_stats['sum']
         })
         
-        fwd_iat_stats = self._safe_statistics(getattr(self, 'fwd_iat', []))
+        fwd_iat_stats = stats_summary(self.stats, FWD_IAT)
         features.update({
             'fwd_iat_tot': fwd_iat_stats['sum'],
             'fwd_iat_max': fwd_iat_stats['max'],
@@ -385,7 +398,7 @@ class FlowFeatures:
             'fwd_iat_var': fwd_iat_stats['var']
         })
         
-        bwd_iat_stats = self._safe_statistics(getattr(self, 'bwd_iat', []))
+        bwd_iat_stats = stats_summary(self.stats, BWD_IAT)
         features.update({
             'bwd_iat_tot': bwd_iat_stats['sum'],
             'bwd_iat_max': bwd_iat_stats['max'],
@@ -395,8 +408,8 @@ class FlowFeatures:
             'bwd_iat_var': bwd_iat_stats['var']
         })
         
-        # Calculate packet size statistics using safe_statistics
-        pkt_stats = self._safe_statistics(getattr(self, 'packet_sizes', []))
+        # Packet size statistics
+        pkt_stats = stats_summary(self.stats, PKT_LEN)
         features.update({
             'pkt_len_max': pkt_stats['max'],
             'pkt_len_min': pkt_stats['min'],
@@ -407,8 +420,8 @@ class FlowFeatures:
         })
         
         # Calculate down/up ratio with safe division
-        bwd_pkts = getattr(self, 'bwd_packets', 0)
-        fwd_pkts = getattr(self, 'fwd_packets', 0)
+        bwd_pkts = self.bwd_packets
+        fwd_pkts = self.fwd_packets
         features['down_up_ratio'] = (
             float(fwd_pkts) / float(bwd_pkts) 
             if bwd_pkts > 0 else 0.0
@@ -420,44 +433,29 @@ class FlowFeatures:
             if total_packets > 0 else 0.0
         )
         
-        # Calculate active/idle stats using timestamps
-        timestamps = getattr(self, 'timestamps', [])
-        if timestamps and len(timestamps) > 1:
-            try:
-                # Convert timestamps to float and sort to ensure increasing order
-                times = sorted([float(t) for t in timestamps if t is not None])
-                if len(times) > 1:
-                    iats = np.diff(times)
-                    iat_stats = self._safe_statistics(iats)
-                    
-                    # Active stats (same as IAT stats for now)
-                    features.update({
-                        'active_max': iat_stats['max'],
-                        'active_min': iat_stats['min'],
-                        'active_mean': iat_stats['mean'],
-                        'active_std': iat_stats['std'],
-                        'active_var': iat_stats['var'],
-                        'active_total': iat_stats['sum']
-                    })
-                    
-                    # For idle stats, we could implement more sophisticated logic
-                    # For now, using the same as active
-                    features.update({
-                        'idle_max': iat_stats['max'],
-                        'idle_min': iat_stats['min'],
-                        'idle_mean': iat_stats['mean'],
-                        'idle_std': iat_stats['std'],
-                        'idle_var': iat_stats['var'],
-                        'idle_total': iat_stats['sum']
-                    })
-            except (ValueError, TypeError) as e:
-                # If there's any error in timestamp processing, set defaults
-                features.update({
-                    'active_max': 0.0, 'active_min': 0.0, 'active_mean': 0.0,
-                    'active_std': 0.0, 'active_var': 0.0, 'active_total': 0.0,
-                    'idle_max': 0.0, 'idle_min': 0.0, 'idle_mean': 0.0,
-                    'idle_std': 0.0, 'idle_var': 0.0, 'idle_total': 0.0
-                })
+        # Calculate active/idle stats from the gaps between consecutive packets
+        iat_stats = stats_summary(self.stats, PACKET_GAPS)
+        
+        # Active stats (same as IAT stats for now)
+        features.update({
+            'active_max': iat_stats['max'],
+            'active_min': iat_stats['min'],
+            'active_mean': iat_stats['mean'],
+            'active_std': iat_stats['std'],
+            'active_var': iat_stats['var'],
+            'active_total': iat_stats['sum']
+        })
+        
+        # For idle stats, we could implement more sophisticated logic
+        # For now, using the same as active
+        features.update({
+            'idle_max': iat_stats['max'],
+            'idle_min': iat_stats['min'],
+            'idle_mean': iat_stats['mean'],
+            'idle_std': iat_stats['std'],
+            'idle_var': iat_stats['var'],
+            'idle_total': iat_stats['sum']
+        })
         
         # Add subflow information (simplified)
         features.update({
@@ -470,142 +468,402 @@ class FlowFeatures:
         return features
 
 class FullFlowExtractor:
-    """Extracts network flows with full feature set"""
+    """Extracts network flows with full feature set
+
+    decoder='raw' parses packet headers straight from the capture bytes
+    (see pcap_decoder); decoder='scapy' dissects every packet with Scapy.
+    scapy_fallback lets the raw decoder hand unknown encapsulations to Scapy.
+    reader='mmap' walks the file through a zero-copy memory map,
+    reader='stream' uses buffered reads.
+    retain_packets keeps summaries of the first N packets of every flow (0 = none).
+    chunk_size is the number of packets decoded per batch.
+    workers > 1 shards flows by 5-tuple hash across that many processes.
+    engine='columnar' computes the same features with vectorized NumPy
+    operations over the whole capture (see columnar_features) instead of
+    per-packet flow objects; it runs in a single process. engine='arrays'
+    keeps the flow table in preallocated NumPy columns (see array_flow_table)
+    for captures with millions of concurrent flows; it does not retain packets.
+    Flows end on idle_timeout / active_timeout (seconds of capture time) or a
+    TCP FIN/RST. Finished flows' features are passed to on_flow(features) as
+    they end, or collected in completed_flows when no callback is given.
+    process_live reads an interface or a growing capture instead of a file.
+    checkpoint_path makes process_pcap save its progress there every
+    checkpoint_interval seconds so an interrupted run can be resumed; it
+    needs a single worker, the 'object' or 'arrays' engine and an on_flow
+    sink, since only the live flow table is checkpointed.
+    cancel() (or cancel_token.cancel() from another thread) stops processing
+    at the next packet; the flows gathered so far are kept, and with on_flow
+    the live ones are flushed to it. During process_pcap the memory usage
+    passed to progress_callback is sampled every telemetry_interval seconds
+    on a background thread (see telemetry), and gc_tuning freezes the objects
+    alive beforehand and raises the GC thresholds while the capture is read.
+    """
+    
+    def __init__(self, decoder='raw', scapy_fallback=False, reader='mmap', retain_packets=0,
+                 chunk_size=100000, workers=1, idle_timeout=IDLE_TIMEOUT,
+                 active_timeout=ACTIVE_TIMEOUT, on_flow=None, engine='object',
+                 checkpoint_path=None, checkpoint_interval=CHECKPOINT_INTERVAL, on_checkpoint=None,
+                 cancel_token=None, telemetry_interval=TELEMETRY_INTERVAL, gc_tuning=True):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r} (expected one of {', '.join(ENGINES)})")
+        if checkpoint_path and (engine == 'columnar' or workers > 1):
+            raise ValueError("Checkpoints need a single worker and the 'object' or 'arrays' engine")
+        # Flows hold both directions of a conversation; forward is the first packet's direction
+        if engine == 'arrays':
+            self.flows = ArrayFlowTable(idle_timeout, active_timeout)
+        else:
+            self.flows = FlowTable(idle_timeout, active_timeout)
+        self.completed_flows = []  # Features of flows that have ended
+        self.on_flow = on_flow
+        self.flows_emitted = 0  # Flows handed to on_flow or completed_flows
+        self.packets_seen = 0
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.flow_frame = None  # Flows computed as a DataFrame (worker processes or columnar engine)
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.decoder = decoder
+        self.scapy_fallback = scapy_fallback
+        self.reader = reader
+        self.retain_packets = retain_packets
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.on_checkpoint = on_checkpoint  # Called before each checkpoint, e.g. to flush the on_flow sink
+        self.resume_point = None  # (file offset, packets) restored by load_checkpoint
+        self.cancel_token = cancel_token if cancel_token is not None else CancelToken()
+        self.telemetry_interval = telemetry_interval
+        self.gc_tuning = gc_tuning
     
-    def __init__(self):
-        self.flows = {}
+    def cancel(self):
+        """Ask a running process_pcap/process_live to stop at the next packet"""
+        self.cancel_token.cancel()
     
-    def get_flow_key(self, packet, direction):
-        """Generate a flow key based on 5-tuple and direction"""
-        if IP not in packet:
+    def get_flow_key(self, packet):
+        """Bidirectional integer 5-tuple key (same flow in both directions)"""
+        if packet is None:
             return None
-            
-        src_ip = packet[IP].src
-        dst_ip = packet[IP].dst
-        
-        # Determine source and destination ports based on protocol
-        src_port = 0
-        dst_port = 0
-        
-        if TCP in packet:
-            src_port = packet[TCP].sport
-            dst_port = packet[TCP].dport
-            protocol = 'TCP'
-        elif UDP in packet:
-            src_port = packet[UDP].sport
-            dst_port = packet[UDP].dport
-            protocol = 'UDP'
-        elif ICMP in packet:
-            protocol = 'ICMP'
-        else:
-            protocol = packet[IP].proto
-        
-        # Create a bidirectional flow key (same flow in both directions)
-        if direction == 'forward':
-            return (src_ip, dst_ip, src_port, dst_port, protocol)
-        else:
-            return (dst_ip, src_ip, dst_port, src_port, protocol)
+        return flow_key(packet)
     
-    def _process_packet_batch(self, packets_batch):
-        """Process a batch of packets and return flow updates"""
-        batch_flows = {}
-        for packet in packets_batch:
-            if IP not in packet:
-                continue
-                
-            # Determine direction (simplified - in reality, you'd need to know your network)
-            direction = 'forward'  # Default
+    @staticmethod
+    def flow_columns():
+        """Columns of the flow rows, in order (the same for every engine)"""
+        probe = PacketRecord(0.0, 60, 4, 1, 2, IPPROTO_TCP, 1, 2)
+        return list(FlowFeatures(probe, 'forward').calculate_features())
+    
+    def process_records(self, records):
+        """Add a batch of PacketRecords to the flow table, emitting flows as they end.
+        
+        Returns the number of records consumed, fewer than given after cancel().
+        """
+        if self.engine == 'arrays':
+            return self._process_records_arrays(records)
+        flows = self.flows
+        cancel_token = self.cancel_token
+        consumed = 0
+        for packet in records:
+            if cancel_token.cancelled:
+                break
+            consumed += 1
             
             # Get flow key
-            flow_key = self.get_flow_key(packet, direction)
-            if not flow_key:
+            key = self.get_flow_key(packet)
+            if not key:
                 continue
             
-            # Add packet to flow in batch
-            if flow_key in batch_flows:
-                batch_flows[flow_key].add_packet(packet, direction)
+            # A flow past its idle or active timeout ends before this packet
+            now = float(packet.time)
+            flow = flows.get(key)
+            if flow is not None and flows.is_expired(flow, now):
+                self._emit_flow(flows.pop(key))
+                flow = None
+            
+            if flow is None:
+                direction = 'forward'
+                flows[key] = FlowFeatures(packet, direction, self.retain_packets)
             else:
-                # New flow in this batch
-                batch_flows[flow_key] = FlowFeatures(packet, direction)
+                # Forward is the direction of the flow's first packet
+                if packet.src == flow.src and packet.src_port == flow.src_port:
+                    direction = 'forward'
+                else:
+                    direction = 'backward'
+                flow.add_packet(packet, direction)
+                flows.touch(key)
+            
+            # RST, or FIN from both sides, terminates the flow
+            if flows.ends_flow(key, packet.tcp_flags, direction):
+                self._emit_flow(flows.pop(key))
+            
+            self.packets_seen += 1
+            if self.packets_seen % EXPIRY_CHECK_PACKETS == 0:
+                self.expire_flows(now)
+        return consumed
+
+    def _process_records_arrays(self, records):
+        """process_records for the NumPy flow table; ended flows are emitted in batches"""
+        flows = self.flows
+        cancel_token = self.cancel_token
+        consumed = 0
+        for packet in records:
+            if cancel_token.cancelled:
+                break
+            consumed += 1
+            key = self.get_flow_key(packet)
+            if not key:
+                continue
+            flows.add_packet(key, packet)
+            self.packets_seen += 1
+            if self.packets_seen % EXPIRY_CHECK_PACKETS == 0:
+                flows.expire(float(packet.time))
+        if self.on_flow is not None and len(flows.finished) >= ARRAYS_EMIT_FLOWS:
+            self._emit_finished()
+        return consumed
+
+    def _emit_finished(self):
+        """Hand the ended flows of the NumPy flow table to on_flow and recycle their slots"""
+        if self.flows.finished:
+            for features in self.flows.take_finished().to_dict('records'):
+                self.on_flow(features)
+                self.flows_emitted += 1
+
+    def expire_flows(self, now):
+        """Emit every flow idle for longer than the idle timeout at capture time `now`"""
+        if self.engine == 'arrays':
+            self.flows.expire(now)
+            return
+        for _, flow in self.flows.pop_expired(now):
+            self._emit_flow(flow)
+
+    def flush_flows(self):
+        """Emit every live flow (end of capture)"""
+        if self.engine == 'arrays':
+            self.flows.flush()
+            if self.on_flow is not None:
+                self._emit_finished()
+            return
+        for _, flow in self.flows.pop_all():
+            self._emit_flow(flow)
+
+    def _emit_flow(self, flow):
+        """Finalize a finished flow and hand its features to on_flow (or keep them)"""
+        features = flow.calculate_features()
+        if self.on_flow is not None:
+            self.on_flow(features)
+        else:
+            self.completed_flows.append(features)
+        self.flows_emitted += 1
+
+    def save_checkpoint(self, pcap_file, offset, packets):
+        """Save the state of process_pcap after `packets` packets, ending at file `offset`.
+
+        The live flow table and the emitted-flow count are pickled to
+        checkpoint_path, replacing the previous checkpoint only once the new
+        one is complete. Finished flows have already gone to on_flow, so a
+        checkpoint costs O(live flows), not O(flows seen).
+        """
+        if self.on_flow is None:
+            raise ValueError("Checkpoints need an on_flow sink for the finished flows")
+        if self.engine == 'arrays':
+            self._emit_finished()  # the table pickles only its live slots
+        if self.on_checkpoint is not None:
+            self.on_checkpoint()
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'pcap_file': os.path.abspath(pcap_file),
+            'engine': self.engine,
+            'offset': offset,
+            'packets': packets,
+            'packets_seen': self.packets_seen,
+            'flows_emitted': self.flows_emitted,
+            'flows': self.flows,
+        }
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def load_checkpoint(self, pcap_file):
+        """Restore the state saved by save_checkpoint for pcap_file.
+        
+        Returns False if there is no checkpoint. process_pcap then continues
+        from the saved file offset; flows_emitted tells how many flows the
+        interrupted run had already handed to on_flow (the rows of its sink to
+        keep, see flow_writer.CsvFlowWriter).
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint format in {self.checkpoint_path}")
+        if state['pcap_file'] != os.path.abspath(pcap_file) or state['engine'] != self.engine:
+            raise ValueError(f"{self.checkpoint_path} is a checkpoint of {state['pcap_file']} "
+                             f"with the {state['engine']} engine")
+        if os.path.getsize(pcap_file) < state['offset']:
+            raise ValueError(f"{pcap_file} is shorter than when {self.checkpoint_path} was written")
+        self.flows = state['flows']
+        self.packets_seen = state['packets_seen']
+        self.flows_emitted = state['flows_emitted']
+        self.resume_point = (state['offset'], state['packets'])
+        return True
+
+    def _process_pcap_sharded(self, pcap_file, progress_callback, telemetry):
+        """Process a pcap file with self.workers flow-sharded worker processes"""
+        start_time = time.time()
+        print(f"Starting PCAP processing with {self.workers} workers: {pcap_file}")
         
-        return batch_flows
+        def shard_progress(bytes_read, bytes_total, packets):
+            if progress_callback:
+                return progress_callback(bytes_read, bytes_total, packets,
+                                         time.time() - start_time, telemetry.memory_mb)
+        
+        worker_kwargs = {
+            'decoder': self.decoder,
+            'scapy_fallback': self.scapy_fallback,
+            'reader': self.reader,
+            'retain_packets': self.retain_packets,
+            'chunk_size': self.chunk_size,
+            'idle_timeout': self.idle_timeout,
+            'active_timeout': self.active_timeout,
+            'engine': self.engine
+        }
+        self._set_flow_frame(process_pcap_sharded(
+            FullFlowExtractor, pcap_file, self.workers, worker_kwargs,
+            self.decoder, self.scapy_fallback, self.reader, shard_progress,
+            cancel_token=self.cancel_token))
+        
+        print(f"PCAP processing completed in {time.time() - start_time:.2f} seconds")
 
-    def process_pcap(self, pcap_file, progress_callback=None):
-        """Process a pcap file and extract flows with full features using chunked processing"""
+    def _process_pcap_columnar(self, pcap_file, progress_callback, telemetry):
+        """Process a pcap file with the vectorized columnar feature engine"""
+        start_time = time.time()
+        print(f"Starting columnar PCAP processing: {pcap_file}")
+        
+        def columnar_progress(bytes_read, bytes_total, packets, elapsed_time):
+            if progress_callback:
+                return progress_callback(bytes_read, bytes_total, packets, elapsed_time,
+                                         telemetry.memory_mb)
+        
+        self._set_flow_frame(extract_flows_columnar(
+            pcap_file, self.decoder, self.scapy_fallback, self.reader,
+            self.idle_timeout, self.active_timeout, self.chunk_size, columnar_progress,
+            self.cancel_token))
+        
+        print(f"PCAP processing completed in {time.time() - start_time:.2f} seconds")
+
+    def _set_flow_frame(self, frame):
+        """Keep a DataFrame of finished flows, or pass its rows to on_flow"""
+        if self.on_flow is not None:
+            for features in frame.to_dict('records'):
+                self.on_flow(features)
+            self.flows_emitted += len(frame)
+        else:
+            self.flow_frame = frame
+
+    def process_pcap(self, pcap_file, progress_callback=None, resume=False):
+        """Process a pcap file and extract flows with full features using chunked processing.
+        
+        progress_callback(bytes_read, bytes_total, packets, elapsed_time, memory_usage)
+        is called after every chunk and may return False to stop (like cancel());
+        progress is measured in file bytes consumed so the capture is decoded
+        exactly once. With a checkpoint_path, a checkpoint
+        is saved after a chunk once checkpoint_interval seconds have passed and
+        removed when the capture is done; resume=True continues from it (see
+        load_checkpoint) instead of the start of the file.
+        """
+        with self._ingest() as telemetry:
+            if self.engine == 'columnar':
+                return self._process_pcap_columnar(pcap_file, progress_callback, telemetry)
+            if self.workers > 1:
+                return self._process_pcap_sharded(pcap_file, progress_callback, telemetry)
+            return self._process_pcap_chunks(pcap_file, progress_callback, resume, telemetry)
+    
+    @contextmanager
+    def _ingest(self):
+        """Memory sampler thread and GC tuning for the duration of a process_pcap run"""
+        with TelemetrySampler(self.telemetry_interval) as telemetry, \
+                (ingest_gc() if self.gc_tuning else nullcontext()):
+            yield telemetry
+    
+    def _process_pcap_chunks(self, pcap_file, progress_callback, resume, telemetry):
+        """Single-process process_pcap: decode and add packets chunk by chunk"""
         try:
             start_time = time.time()
             print(f"Starting PCAP processing: {pcap_file}")
-            
-            # Get total packets for progress tracking
-            total_packets = 0
-            with PcapReader(pcap_file) as pcap_reader:
-                total_packets = sum(1 for _ in pcap_reader)
-            
-            print(f"Total packets to process: {total_packets}")
+            if self.checkpoint_path and self.on_flow is None:
+                raise ValueError("Checkpoints need an on_flow sink for the finished flows")
             
             # Process packets in chunks
-            chunk_size = 100000  # Adjust based on available memory
+            chunk_size = self.chunk_size
             processed_packets = 0
+            start_offset = 0
+            if resume and self.resume_point is None:
+                self.load_checkpoint(pcap_file)
+            if self.resume_point is not None:
+                start_offset, processed_packets = self.resume_point
+                self.resume_point = None
+                print(f"Resuming at byte {start_offset} after {processed_packets} packets")
+            last_checkpoint = time.time()
             
-            with PcapReader(pcap_file) as pcap_reader:
+            cancel_token = self.cancel_token
+            with PacketSource(pcap_file, self.decoder, self.scapy_fallback, self.reader,
+                              start=start_offset, cancel_token=cancel_token) as source:
+                total_bytes = source.size
+                print(f"Total bytes to process: {total_bytes}")
+                records = iter(source)
                 while True:
                     # Read a chunk of packets
-                    packets_chunk = []
-                    try:
-                        for _ in range(chunk_size):
-                            packet = next(pcap_reader)
-                            packets_chunk.append(packet)
-                    except StopIteration:
-                        pass  # End of file
+                    packets_chunk = list(islice(records, chunk_size))
                     
                     if not packets_chunk:
                         break  # No more packets
                     
                     # Process the chunk
-                    chunk_start = time.time()
-                    batch_flows = self._process_packet_batch(packets_chunk)
-                    
-                    # Merge batch flows into main flows
-                    for flow_key, flow in batch_flows.items():
-                        if flow_key in self.flows:
-                            # For existing flows, we need to merge the statistics
-                            # This is a simplified merge - in a real implementation, 
-                            # you'd want to properly merge the flow statistics
-                            self.flows[flow_key].packets.extend(flow.packets)
-                            self.flows[flow_key].timestamps.extend(flow.timestamps)
-                            self.flows[flow_key].packet_sizes.extend(flow.packet_sizes)
-                            # Update other statistics...
-                        else:
-                            # New flow
-                            self.flows[flow_key] = flow
+                    consumed = self.process_records(packets_chunk)
+                    processed_packets += consumed
+                    if consumed < len(packets_chunk):
+                        # Cancelled inside the chunk: the file offset is past packets that
+                        # were never added, so the last checkpoint stays the resume point
+                        break
                     
                     # Update progress
-                    processed_packets += len(packets_chunk)
+                    bytes_read = source.offset
                     if progress_callback:
-                        progress_callback(processed_packets, total_packets, 
-                                        time.time() - start_time, 
-                                        get_memory_usage())
+                        if progress_callback(bytes_read, total_bytes, processed_packets,
+                                             time.time() - start_time,
+                                             telemetry.memory_mb) is False:
+                            cancel_token.cancel()
+                    if cancel_token.cancelled:
+                        # Stopped at a chunk boundary: resume exactly here
+                        if self.checkpoint_path:
+                            self.save_checkpoint(pcap_file, bytes_read, processed_packets)
+                        break
                     
-                    # Print progress
-                    chunk_time = time.time() - chunk_start
-                    print(f"Processed {processed_packets}/{total_packets} packets "
-                          f"({processed_packets/total_packets*100:.1f}%) - "
-                          f"{len(packets_chunk)/chunk_time:.1f} pkt/s - "
-                          f"{get_memory_usage():.1f} MB")
-                    
-                    # Force garbage collection
-                    del packets_chunk
-                    del batch_flows
-                    gc.collect()
+                    if self.checkpoint_path and time.time() - last_checkpoint >= self.checkpoint_interval:
+                        self.save_checkpoint(pcap_file, bytes_read, processed_packets)
+                        last_checkpoint = time.time()
+            
+            # With a flow callback, the flows still live at the end of the capture end too
+            if self.on_flow is not None:
+                self.flush_flows()
+            
+            if cancel_token.cancelled:
+                # The checkpoint stays so the capture can be resumed
+                print(f"PCAP processing stopped after {processed_packets} packets")
+                return
+            
+            # The capture is done; nothing is left to resume
+            if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
             
             # Final progress update
             if progress_callback:
-                progress_callback(total_packets, total_packets, 
+                progress_callback(total_bytes, total_bytes, processed_packets,
                                 time.time() - start_time,
-                                get_memory_usage())
+                                telemetry.memory_mb)
             
             print(f"PCAP processing completed in {time.time() - start_time:.2f} seconds")
-            print(f"Memory usage: {get_memory_usage():.1f} MB")
+            print(f"Peak memory usage: {telemetry.peak_memory_mb:.1f} MB")
             
         except Exception as e:
             print(f"Error processing pcap: {e}")
@@ -613,33 +871,124 @@ class FullFlowExtractor:
             traceback.print_exc()
             raise
     
+    def process_live(self, source, progress_callback=None, tick_interval=TICK_INTERVAL):
+        """Extract flows from a live source (see live_capture) until it ends.
+        
+        Packets are added as they arrive, and every tick_interval seconds the
+        flows idle past idle_timeout are emitted, so on_flow receives a flow
+        about idle_timeout + tick_interval seconds after its last packet at
+        most (at once on RST/FIN). progress_callback(packets, elapsed_time) is
+        called on every tick and may return False to stop, as does cancel()
+        (noticed at the next packet or poll of the source); the flows still
+        live then are flushed to on_flow.
+        """
+        if self.engine == 'columnar' or self.workers > 1:
+            raise ValueError("Live capture needs a single worker and the 'object' or 'arrays' engine")
+        start_time = time.time()
+        packets = 0
+        cancel_token = self.cancel_token
+        for record, now in iter_live(source, tick_interval):
+            if cancel_token.cancelled:
+                break
+            if record is not None:
+                self.process_records((record,))
+                packets += 1
+                continue
+            if now is not None:
+                self.expire_flows(now)
+                if self.engine == 'arrays' and self.on_flow is not None:
+                    self._emit_finished()
+            if progress_callback and progress_callback(packets, time.time() - start_time) is False:
+                break
+        if self.on_flow is not None:
+            self.flush_flows()
+    
     def get_flow_dataframe(self):
         """Convert flows to a pandas DataFrame"""
-        flow_data = []
-        for flow in self.flows.values():
-            flow_data.append(flow.calculate_features())
-        return pd.DataFrame(flow_data)
+        if self.engine == 'arrays':
+            df = self.flows.frame()
+            flow_data = not df.empty
+        else:
+            flow_data = list(self.completed_flows)
+            for flow in self.flows.values():
+                flow_data.append(flow.calculate_features())
+            df = pd.DataFrame(flow_data)
+        if self.flow_frame is not None and not self.flow_frame.empty:
+            df = pd.concat([self.flow_frame, df], ignore_index=True) if flow_data else self.flow_frame
+        return df
 
 # Example usage:
 if __name__ == "__main__":
-    import sys
+    import argparse
+    from flow_writer import open_flow_writer, is_parquet_path
+    from live_capture import open_live_source
     
-    if len(sys.argv) < 2:
-        print("Usage: python full_flow_extractor.py <pcap_file> [output_csv]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Extract flows with the full feature set')
+    parser.add_argument('pcap_file', help='Input pcap/pcapng file (a network interface with --live)')
+    parser.add_argument('output_csv', nargs='?', default='flow_features.csv',
+                        help='Output file: CSV, or Parquet for a .parquet/.pq extension')
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f'Worker processes, flows sharded by 5-tuple hash (this machine has {cpu_count()} cores)')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='Seconds without packets before a flow ends (0 disables)')
+    parser.add_argument('--active-timeout', type=float, default=ACTIVE_TIMEOUT,
+                        help='Maximum flow duration in seconds (0 disables)')
+    parser.add_argument('--engine', choices=ENGINES, default='object',
+                        help='Per-packet flow objects, vectorized NumPy columns (offline, single process), '
+                             'or a NumPy flow table for very many concurrent flows')
+    live = parser.add_mutually_exclusive_group()
+    live.add_argument('--live', action='store_true',
+                      help='Capture from the network interface named by pcap_file until Ctrl+C')
+    live.add_argument('--follow', action='store_true',
+                      help='Keep reading pcap_file while another process appends to it, until Ctrl+C')
+    parser.add_argument('--rotate', metavar='PATTERN',
+                        help='With --follow, continue with newer files matching this glob '
+                             '(rotating tcpdump -C/-G captures)')
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='Save progress to PATH periodically so an interrupted run can be resumed')
+    parser.add_argument('--checkpoint-interval', type=float, default=CHECKPOINT_INTERVAL,
+                        help='Seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the --checkpoint of an interrupted run, appending to its CSV')
+    parser.add_argument('--telemetry-interval', type=float, default=TELEMETRY_INTERVAL,
+                        help='Seconds between memory samples taken in the background (0: start and end only)')
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error('--resume needs --checkpoint')
     
-    pcap_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else 'flow_features.csv'
+    pcap_file = args.pcap_file
+    output_file = args.output_csv
     
     print(f"Processing {pcap_file}...")
-    extractor = FullFlowExtractor()
     
-    def progress_callback(current, total):
-        print(f"\rProcessed {current}/{total} packets ({current/total*100:.1f}%)", end='')
+    def progress_callback(bytes_read, bytes_total, packets, elapsed_time, memory_usage):
+        print(f"\rProcessed {packets} packets ({bytes_read/max(bytes_total, 1)*100:.1f}%)", end='')
+    
+    extractor = FullFlowExtractor(workers=args.workers, idle_timeout=args.idle_timeout,
+                                  active_timeout=args.active_timeout, engine=args.engine,
+                                  checkpoint_path=args.checkpoint,
+                                  checkpoint_interval=args.checkpoint_interval,
+                                  telemetry_interval=args.telemetry_interval)
+    # The rows written after the last checkpoint are written again on resume
+    keep_rows = extractor.flows_emitted if args.resume and extractor.load_checkpoint(pcap_file) else None
     
-    extractor.process_pcap(pcap_file, progress_callback)
-    print("\nExtracting features...")
+    # Flows are written as soon as they end, so output starts before the capture is finished
+    with open_flow_writer(output_file, keep_rows=keep_rows) as writer:
+        extractor.on_flow = writer.write
+        if not is_parquet_path(output_file):
+            extractor.on_checkpoint = writer.flush
+        if args.live or args.follow:
+            def live_progress(packets, elapsed_time):
+                if not is_parquet_path(output_file):
+                    writer.flush()  # Parquet row groups are only readable once the file is closed
+                print(f"\rCaptured {packets} packets, {writer.rows} flows written", end='')
+            
+            with open_live_source(pcap_file, follow=args.follow, rotate=args.rotate) as source:
+                try:
+                    extractor.process_live(source, live_progress)
+                except KeyboardInterrupt:
+                    extractor.flush_flows()
+        else:
+            extractor.process_pcap(pcap_file, progress_callback)
     
-    df = extractor.get_flow_dataframe()
-    df.to_csv(output_file, index=False)
-    print(f"Saved {len(df)} flow records to {output_file}")
+    print(f"\nSaved {writer.rows} flow records to {output_file}")
@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 import subprocess
 import threading
 import time
@@ -41,4 +42,6 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # Needed for flow-extraction worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,234 @@
+"""
+Live packet sources for the flow extractors.
+
+InterfaceSource captures from a network interface; FollowSource reads a
+pcap/pcapng file that another process (tcpdump -w, a replay tool) is still
+appending to, as a local stand-in for a live capture, and can move on to
+the next file of a rotating capture (tcpdump -C/-G). Both yield
+PacketRecords as packets arrive and None whenever poll_interval seconds pass
+without one, so the caller gets control back on a quiet link too.
+
+iter_live turns a source into the stream the extractors' process_live
+methods consume. Every tick_interval seconds of wall time it reports the
+current capture time (the newest packet timestamp advanced by the wall time
+since that packet arrived), so flows that went idle can be expired and
+handed to the sink without waiting for further traffic.
+"""
+import glob
+import os
+import re
+import socket
+import time
+
+from pcap_decoder import (
+    PcapFollowReader, decode_record, record_from_scapy, LINKTYPE_ETHERNET, LINKTYPE_RAW
+)
+
+POLL_INTERVAL = 0.5  # seconds a source waits for packets before yielding None
+TICK_INTERVAL = 1.0  # seconds of wall time between idle-flow expiry checks
+
+ETH_P_ALL = 0x0003
+PACKET_OUTGOING = 4
+ARPHRD_LOOPBACK = 772
+
+# AF_PACKET device types (ARPHRD_*) to pcap link types
+ARPHRD_LINKTYPES = {
+    1: LINKTYPE_ETHERNET,                # ARPHRD_ETHER
+    ARPHRD_LOOPBACK: LINKTYPE_ETHERNET,  # Linux loopback frames carry a zeroed Ethernet header
+    0xFFFE: LINKTYPE_RAW,                # ARPHRD_NONE (tun devices)
+}
+
+
+class InterfaceSource:
+    """PacketRecords captured from a network interface (needs capture privileges).
+
+    Uses an AF_PACKET raw socket on Linux and Scapy's layer-2 listen socket
+    elsewhere. Packets are timestamped as they are received. Iteration ends
+    after close().
+    """
+
+    def __init__(self, interface, poll_interval=POLL_INTERVAL, snaplen=65535):
+        self.interface = interface
+        self.poll_interval = poll_interval
+        self.snaplen = snaplen
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        if hasattr(socket, 'AF_PACKET'):
+            return self._capture_af_packet()
+        return self._capture_scapy()
+
+    def _capture_af_packet(self):
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            sock.bind((self.interface, socket.htons(ETH_P_ALL)))
+            sock.settimeout(self.poll_interval)
+            snaplen = self.snaplen
+            while not self.closed:
+                try:
+                    frame, address = sock.recvfrom(snaplen)
+                except socket.timeout:
+                    yield None
+                    continue
+                _, _, pkttype, hatype = address[:4]
+                linktype = ARPHRD_LINKTYPES.get(hatype)
+                # Loopback delivers every packet twice, once as outgoing
+                if linktype is None or (hatype == ARPHRD_LOOPBACK and pkttype == PACKET_OUTGOING):
+                    continue
+                record = decode_record(frame, linktype, time.time())
+                if record is not None:
+                    yield record
+        finally:
+            sock.close()
+
+    def _capture_scapy(self):
+        from scapy.all import conf
+
+        sock = conf.L2listen(iface=self.interface)
+        try:
+            while not self.closed:
+                if not sock.select([sock], self.poll_interval):
+                    yield None
+                    continue
+                packet = sock.recv()
+                record = record_from_scapy(packet) if packet is not None else None
+                if record is not None:
+                    yield record
+        finally:
+            sock.close()
+
+
+class FollowSource:
+    """PacketRecords of a pcap/pcapng file read while another process appends to it.
+
+    Waits at the last complete record for more data instead of stopping at
+    the end of the file (see pcap_decoder.PcapFollowReader); the file is
+    opened once and never re-read. rotate matches the files of a rotating
+    capture, as a glob pattern or a compiled regex over the paths in the
+    followed file's directory (see numbered_rotation): once the followed file
+    has no new data and a matching file was written after it, the rest of the
+    current file is read and the oldest such file is followed next. Iteration
+    ends after close().
+    """
+
+    def __init__(self, path, poll_interval=POLL_INTERVAL, scapy_fallback=False, rotate=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.scapy_fallback = scapy_fallback
+        self.rotate = rotate
+        self.closed = False
+        self._reader = PcapFollowReader(path, poll_interval)
+
+    @property
+    def offset(self):
+        """Bytes of the current capture file consumed so far"""
+        return self._reader.offset
+
+    @property
+    def size(self):
+        return self._reader.size
+
+    def close(self):
+        self.closed = True
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _rotation_files(self):
+        """Paths matching rotate"""
+        if isinstance(self.rotate, str):
+            return glob.glob(self.rotate)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        paths = (os.path.join(directory, name) for name in os.listdir(directory))
+        return [path for path in paths if self.rotate.fullmatch(path)]
+
+    def _next_file(self):
+        """Oldest file of the rotation written after the current one, or None"""
+        current = os.path.abspath(self.path)
+        try:
+            current_mtime = os.path.getmtime(current)
+        except OSError:
+            current_mtime = 0.0  # rotated out (tcpdump -W) while being read
+        newer = []
+        for path in self._rotation_files():
+            if os.path.abspath(path) == current:
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if mtime >= current_mtime:
+                newer.append((mtime, path))
+        return min(newer)[1] if newer else None
+
+    def __iter__(self):
+        scapy_fallback = self.scapy_fallback
+        while True:
+            following = None  # next file of the rotation once the current one is done
+            for frame in self._reader:
+                if frame is None:
+                    if self.rotate and following is None:
+                        following = self._next_file()
+                        if following is not None:
+                            self._reader.finish()
+                    yield None
+                    continue
+                ts, linktype, data = frame
+                record = decode_record(data, linktype, ts, scapy_fallback)
+                if record is not None:
+                    yield record
+            if following is None or self.closed:
+                return
+            self.path = following
+            self._reader = PcapFollowReader(following, self.poll_interval)
+
+
+def numbered_rotation(path):
+    """rotate pattern for the files tcpdump -C writes after path: path1, path2, ...
+
+    Only numeric suffixes match, so path.bak or path.csv beside the capture
+    are never followed.
+    """
+    return re.compile(re.escape(os.path.abspath(path)) + r'[0-9]+')
+
+
+def open_live_source(target, follow=False, poll_interval=POLL_INTERVAL, rotate=None):
+    """FollowSource for a capture file being written (follow=True), else InterfaceSource"""
+    if follow:
+        return FollowSource(target, poll_interval, rotate=rotate)
+    return InterfaceSource(target, poll_interval)
+
+
+def iter_live(source, tick_interval=TICK_INTERVAL):
+    """Yield (record, None) for each packet of a live source and (None, now) on every tick.
+
+    A tick comes at most every tick_interval seconds of wall time; `now` is
+    the capture time at that moment (None until the first packet).
+    """
+    clock = time.monotonic
+    latest = None  # newest capture timestamp seen
+    arrived = next_tick = clock()
+    for record in source:
+        wall = clock()
+        if record is not None:
+            ts = float(record.time)
+            if latest is None or ts > latest:
+                latest = ts
+                arrived = wall
+            yield record, None
+        if wall >= next_tick:
+            next_tick = wall + tick_interval
+            yield None, None if latest is None else latest + (wall - arrived)
@@ -2,48 +2,69 @@ import os
 import time
 import pandas as pd
 import numpy as np
-from scapy.all import rdpcap, PcapReader
-from scapy.layers.inet import IP, TCP, UDP, ICMP
-from collections import defaultdict, namedtuple
+from collections import defaultdict, namedtuple, OrderedDict
 from datetime import datetime
 from multiprocessing import Pool, cpu_count
 from functools import partial
-import pickle
 import tempfile
+from pcap_decoder import (
+    PacketRecord, PacketSource, to_record, flow_key, format_ip, IPPROTO_TCP, TCP_PSH, TCP_URG
+)
+from flow_sharding import process_pcap_sharded
+from cancellation import CancelToken
+from flow_spill import flows_to_array, write_segment, merge_segments, records_to_frame
+from flow_stats import STATS_WIDTH, stats_array, stats_update, stats_summary
+from flow_table import (
+    FlowTable, IDLE_TIMEOUT, ACTIVE_TIMEOUT, EXPIRY_CHECK_PACKETS
+)
+
+# Estimated memory held by a flow (tracemalloc measurement of OptimizedFlowFeatures
+# plus its flow table entry); per-packet statistics are accumulated, so it does
+# not grow with the flow's packets
+FLOW_BYTES = 1100
+SPILLED_FLOW_BYTES = 370  # SpilledFlow kept for a live flow spilled to disk
+
+# Offsets of the forward and backward inter-arrival time accumulators in
+# OptimizedFlowFeatures.stats
+FWD_IAT, BWD_IAT = 0, STATS_WIDTH
+
+# Spilling frees flow state down to this fraction of max_memory_mb
+SPILL_LOW_WATER = 0.75
+
+# What is kept of a live flow spilled to disk, so its next packets continue it
+SpilledFlow = namedtuple('SpilledFlow', [
+    'flow_id', 'flow_start_time', 'flow_last_seen', 'src', 'dst', 'src_port',
+    'dst_port', 'fin_state', 'last_fwd_time', 'last_bwd_time'
+])
 
 class OptimizedFlowFeatures:
     """Optimized flow feature extraction with reduced memory usage"""
     
     __slots__ = [
-        'src_ip', 'dst_ip', 'src_port', 'dst_port', 'protocol', 'packet_count',
-        'flow_start_time', 'flow_last_seen', 'flow_duration', 'packet_sizes',
-        'inter_arrival_times', 'tcp_flags', 'fwd_packets', 'bwd_packets',
+        'src', 'dst', 'ip_version', 'src_port', 'dst_port', 'protocol', 'packet_count',
+        'flow_start_time', 'flow_last_seen', 'flow_duration', 'last_fwd_time',
+        'last_bwd_time', 'stats', 'tcp_flags', 'fwd_packets', 'bwd_packets',
         'fwd_bytes', 'bwd_bytes', 'fwd_header_bytes', 'bwd_header_bytes',
-        'fwd_iat', 'bwd_iat', 'fwd_psh_flags', 'bwd_psh_flags', 'fwd_urg_flags',
+        'fwd_psh_flags', 'bwd_psh_flags', 'fwd_urg_flags',
         'bwd_urg_flags', 'fwd_urgent_packets', 'bwd_urgent_packets',
-        'fwd_avg_packet_size', 'bwd_avg_packet_size', 'fwd_avg_iat', 'bwd_avg_iat'
+        'fwd_avg_packet_size', 'bwd_avg_packet_size', 'flow_id', 'spilled'
     ]
     
     def __init__(self, packet, direction):
-        """Initialize flow with first packet"""
-        # Basic flow information
-        self.src_ip = packet[IP].src if IP in packet else '0.0.0.0'
-        self.dst_ip = packet[IP].dst if IP in packet else '0.0.0.0'
-        self.protocol = packet[IP].proto if IP in packet else 0
-        self.src_port = 0
-        self.dst_port = 0
+        """Initialize flow with first packet (a PacketRecord or a Scapy packet)"""
+        packet = to_record(packet)
         
-        # Ports based on protocol
-        if TCP in packet:
-            self.src_port = packet[TCP].sport
-            self.dst_port = packet[TCP].dport
-            self.tcp_flags = {packet[TCP].flags}
-        elif UDP in packet:
-            self.src_port = packet[UDP].sport
-            self.dst_port = packet[UDP].dport
-            self.tcp_flags = set()
-        else:
-            self.tcp_flags = set()
+        # Basic flow information (addresses as ints, rendered at export)
+        self.src = packet.src
+        self.dst = packet.dst
+        self.ip_version = packet.ip_version
+        self.protocol = packet.proto
+        self.src_port = packet.src_port
+        self.dst_port = packet.dst_port
+        
+        # TCP flag combinations seen (as bitmasks)
+        flags = packet.tcp_flags
+        self.tcp_flags = {flags} if packet.proto == IPPROTO_TCP else set()
         
         # Initialize flow timing
         timestamp = float(packet.time)
@@ -53,37 +74,40 @@ class OptimizedFlowFeatures:
         
         # Initialize packet tracking
         self.packet_count = 1
-        self.packet_sizes = [len(packet)]
-        self.inter_arrival_times = []
         
         # Initialize direction-specific counters
         self.fwd_packets = 1 if direction == 'forward' else 0
         self.bwd_packets = 1 if direction == 'backward' else 0
         self.fwd_bytes = len(packet) if direction == 'forward' else 0
         self.bwd_bytes = len(packet) if direction == 'backward' else 0
-        self.fwd_header_bytes = len(packet[IP].payload) if IP in packet and direction == 'forward' else 0
-        self.bwd_header_bytes = len(packet[IP].payload) if IP in packet and direction == 'backward' else 0
+        self.fwd_header_bytes = packet.ip_payload_len if direction == 'forward' else 0
+        self.bwd_header_bytes = packet.ip_payload_len if direction == 'backward' else 0
         
-        # Initialize timing stats
-        self.fwd_iat = []
-        self.bwd_iat = []
+        # Initialize timing stats: last packet time per direction (None before
+        # the first) and the inter-arrival time accumulators
+        self.last_fwd_time = timestamp if direction == 'forward' else None
+        self.last_bwd_time = timestamp if direction == 'backward' else None
+        self.stats = stats_array(2)
         
         # Flag tracking
-        self.fwd_psh_flags = 1 if TCP in packet and packet[TCP].flags.PSH and direction == 'forward' else 0
-        self.bwd_psh_flags = 1 if TCP in packet and packet[TCP].flags.PSH and direction == 'backward' else 0
-        self.fwd_urg_flags = 1 if TCP in packet and packet[TCP].flags.URG and direction == 'forward' else 0
-        self.bwd_urg_flags = 1 if TCP in packet and packet[TCP].flags.URG and direction == 'backward' else 0
-        self.fwd_urgent_packets = 1 if TCP in packet and packet[TCP].flags.URG and direction == 'forward' else 0
-        self.bwd_urgent_packets = 1 if TCP in packet and packet[TCP].flags.URG and direction == 'backward' else 0
+        self.fwd_psh_flags = 1 if flags & TCP_PSH and direction == 'forward' else 0
+        self.bwd_psh_flags = 1 if flags & TCP_PSH and direction == 'backward' else 0
+        self.fwd_urg_flags = 1 if flags & TCP_URG and direction == 'forward' else 0
+        self.bwd_urg_flags = 1 if flags & TCP_URG and direction == 'backward' else 0
+        self.fwd_urgent_packets = 1 if flags & TCP_URG and direction == 'forward' else 0
+        self.bwd_urgent_packets = 1 if flags & TCP_URG and direction == 'backward' else 0
         
         # Initialize averages
         self.fwd_avg_packet_size = len(packet) if direction == 'forward' else 0.0
         self.bwd_avg_packet_size = len(packet) if direction == 'backward' else 0.0
-        self.fwd_avg_iat = 0.0
-        self.bwd_avg_iat = 0.0
+        
+        # Set by the extractor; spilled marks a flow continuing a part on disk
+        self.flow_id = 0
+        self.spilled = False
     
     def update(self, packet, direction):
         """Update flow with new packet"""
+        packet = to_record(packet)
         timestamp = float(packet.time)
         packet_size = len(packet)
         
@@ -93,33 +117,33 @@ class OptimizedFlowFeatures:
         
         # Update packet tracking
         self.packet_count += 1
-        self.packet_sizes.append(packet_size)
         
         # Update direction-specific counters
         if direction == 'forward':
             self.fwd_packets += 1
             self.fwd_bytes += packet_size
-            if IP in packet:
-                self.fwd_header_bytes += len(packet[IP].payload)
-            if len(self.fwd_iat) > 0:
-                self.fwd_iat.append(timestamp - self.flow_last_seen)
+            self.fwd_header_bytes += packet.ip_payload_len
+            if self.last_fwd_time is not None:
+                stats_update(self.stats, FWD_IAT, timestamp - self.last_fwd_time)
+            self.last_fwd_time = timestamp
         else:
             self.bwd_packets += 1
             self.bwd_bytes += packet_size
-            if IP in packet:
-                self.bwd_header_bytes += len(packet[IP].payload)
-            if len(self.bwd_iat) > 0:
-                self.bwd_iat.append(timestamp - self.flow_last_seen)
+            self.bwd_header_bytes += packet.ip_payload_len
+            if self.last_bwd_time is not None:
+                stats_update(self.stats, BWD_IAT, timestamp - self.last_bwd_time)
+            self.last_bwd_time = timestamp
         
         # Update TCP flags if applicable
-        if TCP in packet:
-            self.tcp_flags.add(packet[TCP].flags)
-            if packet[TCP].flags.PSH:
+        if packet.proto == IPPROTO_TCP:
+            flags = packet.tcp_flags
+            self.tcp_flags.add(flags)
+            if flags & TCP_PSH:
                 if direction == 'forward':
                     self.fwd_psh_flags += 1
                 else:
                     self.bwd_psh_flags += 1
-            if packet[TCP].flags.URG:
+            if flags & TCP_URG:
                 if direction == 'forward':
                     self.fwd_urg_flags += 1
                     self.fwd_urgent_packets += 1
@@ -127,20 +151,44 @@ class OptimizedFlowFeatures:
                     self.bwd_urg_flags += 1
                     self.bwd_urgent_packets += 1
         
-        # Update inter-arrival times
-        if len(self.packet_sizes) > 1:
-            self.inter_arrival_times.append(timestamp - self.flow_last_seen)
-        
         # Update averages
         if self.fwd_packets > 0:
             self.fwd_avg_packet_size = self.fwd_bytes / self.fwd_packets
         if self.bwd_packets > 0:
             self.bwd_avg_packet_size = self.bwd_bytes / self.bwd_packets
-        
-        if self.fwd_iat:
-            self.fwd_avg_iat = sum(self.fwd_iat) / len(self.fwd_iat)
-        if self.bwd_iat:
-            self.bwd_avg_iat = sum(self.bwd_iat) / len(self.bwd_iat)
+    
+    # Inter-arrival time sums and counts (what flow_spill stores and merges) and means
+    @property
+    def fwd_iat_total(self):
+        return stats_summary(self.stats, FWD_IAT)['sum']
+    
+    @property
+    def fwd_iat_count(self):
+        return self.stats[FWD_IAT]
+    
+    @property
+    def bwd_iat_total(self):
+        return stats_summary(self.stats, BWD_IAT)['sum']
+    
+    @property
+    def bwd_iat_count(self):
+        return self.stats[BWD_IAT]
+    
+    @property
+    def fwd_avg_iat(self):
+        return stats_summary(self.stats, FWD_IAT)['mean']
+    
+    @property
+    def bwd_avg_iat(self):
+        return stats_summary(self.stats, BWD_IAT)['mean']
+    
+    @property
+    def src_ip(self):
+        return format_ip(self.src, self.ip_version)
+    
+    @property
+    def dst_ip(self):
+        return format_ip(self.dst, self.ip_version)
     
     def to_dict(self):
         """Convert flow to dictionary for DataFrame conversion"""
@@ -172,157 +220,320 @@ class OptimizedFlowFeatures:
         }
 
 class OptimizedFlowExtractor:
-    """Optimized flow extractor with memory efficiency and parallel processing"""
+    """Optimized flow extractor with memory efficiency and parallel processing
     
-    def __init__(self, max_memory_mb=1024, chunk_size=10000, max_flows=100000):
-        self.flows = {}
+    Flows end on idle_timeout / active_timeout (seconds of capture time) or a
+    TCP FIN/RST; on_flow(features) receives each finished flow as it ends.
+    Flow state is kept under max_memory_mb, estimated as FLOW_BYTES per flow
+    held (a flow's size does not grow with its packets). Over budget, the
+    finished and idle-expired flows are spilled to disk first; if that is not
+    enough, live flows are spilled too, those idle the longest first. A live
+    flow is spilled as a partial: its next packets start a continuation, and
+    the parts are merged back into one row when the spill segments are read
+    (flow_spill.merge_segments). The small record kept per spilled live flow
+    (SPILLED_FLOW_BYTES) stays in memory until the flow continues or idles
+    out, so a budget too small for those records is exceeded. max_flows caps
+    the finished flows held between spills.
+    cancel() stops a running process_pcap at the next packet, keeping the
+    flows gathered so far.
+    """
+    
+    def __init__(self, max_memory_mb=1024, chunk_size=10000, max_flows=100000,
+                 decoder='raw', scapy_fallback=False, reader='mmap', workers=1,
+                 idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT, on_flow=None,
+                 cancel_token=None):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.flows = FlowTable(idle_timeout, active_timeout)
+        self.finished_flows = {}  # Ended flows waiting to be spilled to disk
+        self.spilled_flows = OrderedDict()  # flow key -> SpilledFlow, in spill order
+        self.next_flow_id = 0
+        self.on_flow = on_flow
+        self.packets_seen = 0
+        self.workers = workers  # > 1: shard flows by 5-tuple hash across processes
+        self.sharded_frame = None
         self.max_memory_mb = max_memory_mb
+        self.memory_budget = max_memory_mb * 1024 * 1024
+        self.flow_bytes = 0  # Estimated memory of live and unspilled finished flows
         self.chunk_size = chunk_size
         self.max_flows = max_flows
         self.temp_dir = tempfile.mkdtemp(prefix='mntj_flows_')
         self.flow_files = []
+        self.decoder = decoder  # 'raw' (pcap_decoder) or 'scapy'
+        self.scapy_fallback = scapy_fallback
+        self.reader = reader  # 'mmap' (zero-copy) or 'stream' (buffered reads)
+        self.cancel_token = cancel_token if cancel_token is not None else CancelToken()
+    
+    def cancel(self):
+        """Ask a running process_pcap to stop at the next packet"""
+        self.cancel_token.cancel()
     
-    def _get_flow_key(self, packet, direction):
-        """Generate a flow key based on 5-tuple and direction"""
-        if IP not in packet:
+    @staticmethod
+    def flow_columns():
+        """Columns of the flow rows, in order"""
+        probe = PacketRecord(0.0, 60, 4, 1, 2, IPPROTO_TCP, 1, 2)
+        return list(OptimizedFlowFeatures(probe, 'forward').to_dict())
+    
+    def _get_flow_key(self, packet):
+        """Bidirectional integer 5-tuple key (same flow in both directions)"""
+        if packet is None:
             return None
-            
-        src_ip = packet[IP].src
-        dst_ip = packet[IP].dst
-        protocol = packet[IP].proto
-        
-        # Determine ports based on protocol
-        src_port = 0
-        dst_port = 0
-        
-        if TCP in packet:
-            src_port = packet[TCP].sport
-            dst_port = packet[TCP].dport
-        elif UDP in packet:
-            src_port = packet[UDP].sport
-            dst_port = packet[UDP].dport
-        
-        # Create consistent flow key regardless of direction
-        if direction == 'forward':
-            return (src_ip, dst_ip, src_port, dst_port, protocol)
-        else:
-            return (dst_ip, src_ip, dst_port, src_port, protocol)
+        return flow_key(packet)
     
-    def _process_packet_chunk(self, packets, progress_callback=None):
-        """Process a chunk of packets"""
-        chunk_flows = {}
-        
-        for i, packet in enumerate(packets):
+    def process_records(self, records):
+        """Add a batch of PacketRecords to the flow table, finishing flows as they end"""
+        flows = self.flows
+        cancel_token = self.cancel_token
+        for packet in records:
+            if cancel_token.cancelled:
+                break
             try:
-                if IP not in packet:
-                    continue
-                    
-                # Determine direction
-                direction = 'forward'  # Default direction
-                
                 # Get flow key
-                flow_key = self._get_flow_key(packet, direction)
-                if not flow_key:
+                key = self._get_flow_key(packet)
+                if not key:
                     continue
+                now = float(packet.time)
                 
-                # Add reverse direction flow key
-                rev_flow_key = self._get_flow_key(packet, 'backward')
+                # A flow past its idle or active timeout ends before this packet
+                flow = flows.get(key)
+                if flow is not None and flows.is_expired(flow, now):
+                    self._finish_flow(flows.pop(key))
+                    flow = None
                 
-                # Check if this is actually a reply (backward) packet
-                if flow_key in self.flows or flow_key in chunk_flows:
-                    # Existing forward flow
-                    flow = self.flows.get(flow_key) or chunk_flows.get(flow_key)
-                    flow.update(packet, 'forward')
-                elif rev_flow_key in self.flows or rev_flow_key in chunk_flows:
-                    # This is a reply packet for an existing flow
-                    flow = self.flows.get(rev_flow_key) or chunk_flows.get(rev_flow_key)
-                    flow.update(packet, 'backward')
-                    flow_key = rev_flow_key  # Use the reverse key for storage
+                if flow is None:
+                    spilled = self.spilled_flows.pop(key, None)
+                    if spilled is not None:
+                        self.flow_bytes -= SPILLED_FLOW_BYTES
+                        if flows.is_expired(spilled, now):
+                            spilled = None
+                    if spilled is None:
+                        # New flow
+                        direction = 'forward'
+                        flow = OptimizedFlowFeatures(packet, direction)
+                        flow.flow_id = self.next_flow_id
+                        self.next_flow_id += 1
+                    else:
+                        flow, direction = self._resume_flow(key, packet, spilled)
+                    flows[key] = flow
+                    self.flow_bytes += FLOW_BYTES
                 else:
-                    # New flow
-                    flow = OptimizedFlowFeatures(packet, direction)
-                    chunk_flows[flow_key] = flow
+                    # Forward is the direction of the flow's first packet
+                    if packet.src == flow.src and packet.src_port == flow.src_port:
+                        direction = 'forward'
+                    else:
+                        direction = 'backward'
+                    flow.update(packet, direction)
+                    flows.touch(key)
+                
+                # RST, or FIN from both sides, terminates the flow
+                if flows.ends_flow(key, packet.tcp_flags, direction):
+                    self._finish_flow(flows.pop(key))
                 
-                # Periodically save flows to disk to manage memory
-                if len(chunk_flows) >= self.max_flows:
-                    self._save_flows_to_disk(chunk_flows)
-                    chunk_flows = {}
+                self.packets_seen += 1
+                if self.packets_seen % EXPIRY_CHECK_PACKETS == 0:
+                    self.expire_flows(now)
                 
-                # Update progress if callback provided
-                if progress_callback and i % 1000 == 0:
-                    progress_callback(i, len(packets))
+                # Bound memory: spill flow state once over the budget
+                if self.flow_bytes > self.memory_budget:
+                    self.reduce_memory(now)
                     
             except Exception as e:
                 print(f"Error processing packet: {e}")
                 continue
+    
+    def _resume_flow(self, key, packet, spilled):
+        """Start the in-memory continuation of a live flow that was spilled to disk"""
+        if packet.src == spilled.src and packet.src_port == spilled.src_port:
+            direction = 'forward'
+        else:
+            direction = 'backward'
+        flow = OptimizedFlowFeatures(packet, direction)
+        # Keep the spilled part's endpoints, start time and FIN state
+        flow.src, flow.dst = spilled.src, spilled.dst
+        flow.src_port, flow.dst_port = spilled.src_port, spilled.dst_port
+        flow.flow_start_time = spilled.flow_start_time
+        flow.flow_duration = flow.flow_last_seen - flow.flow_start_time
+        # Inter-arrival times continue from the spilled part's last packets
+        timestamp = flow.flow_last_seen
+        if direction == 'forward':
+            if spilled.last_fwd_time is not None:
+                stats_update(flow.stats, FWD_IAT, timestamp - spilled.last_fwd_time)
+            flow.last_bwd_time = spilled.last_bwd_time
+        else:
+            if spilled.last_bwd_time is not None:
+                stats_update(flow.stats, BWD_IAT, timestamp - spilled.last_bwd_time)
+            flow.last_fwd_time = spilled.last_fwd_time
+        flow.flow_id = spilled.flow_id
+        flow.spilled = True
+        self.flows.restore_fin_state(key, spilled.fin_state)
+        return flow, direction
+    
+    def expire_flows(self, now):
+        """Finish every flow idle for longer than the idle timeout at capture time `now`"""
+        for _, flow in self.flows.pop_expired(now):
+            self._finish_flow(flow)
         
-        return chunk_flows
+        # Spilled flows idle too long can no longer be continued
+        if self.idle_timeout:
+            spilled_flows = self.spilled_flows
+            deadline = now - self.idle_timeout
+            while spilled_flows and next(iter(spilled_flows.values())).flow_last_seen < deadline:
+                spilled_flows.popitem(last=False)
+                self.flow_bytes -= SPILLED_FLOW_BYTES
     
-    def _save_flows_to_disk(self, flows):
-        """Save flows to disk and clear memory"""
-        if not flows:
+    def flush_flows(self):
+        """Finish every live flow (end of capture)"""
+        for _, flow in self.flows.pop_all():
+            self._finish_flow(flow)
+    
+    def reduce_memory(self, now):
+        """Spill flow state until the estimate is under the low-water mark of the memory budget"""
+        target = self.memory_budget * SPILL_LOW_WATER
+        self.expire_flows(now)
+        self._save_flows_to_disk(self.finished_flows)
+        if self.flow_bytes <= target:
             return
-            
-        # Create a temporary file for this chunk
-        fd, temp_file = tempfile.mkstemp(suffix='.pkl', dir=self.temp_dir)
-        os.close(fd)
         
-        # Convert flows to dict and save
-        with open(temp_file, 'wb') as f:
-            pickle.dump({k: v.to_dict() for k, v in flows.items()}, f)
+        # Still over budget: spill the live flows idle the longest (front of the table)
+        # as partial flows; merge_segments reunites them with their continuations
+        flows = self.flows
+        evicted = {}
+        remaining = self.flow_bytes
+        while flows and remaining > target:
+            key = next(iter(flows))
+            fin_state = flows.fin_state(key)
+            flow = evicted[key] = flows.pop(key)
+            remaining -= FLOW_BYTES - SPILLED_FLOW_BYTES
+            self.spilled_flows[key] = SpilledFlow(
+                flow.flow_id, flow.flow_start_time, flow.flow_last_seen, flow.src,
+                flow.dst, flow.src_port, flow.dst_port, fin_state,
+                flow.last_fwd_time, flow.last_bwd_time)
+        self.flow_bytes += SPILLED_FLOW_BYTES * len(evicted)
+        self._save_flows_to_disk(evicted)
+    
+    def _finish_flow(self, flow):
+        """Hand a finished flow to on_flow, or keep it until enough accumulate to spill.
         
-        self.flow_files.append(temp_file)
+        A flow with earlier parts on disk is always spilled so the parts can be merged.
+        """
+        if self.on_flow is not None and not flow.spilled:
+            self.flow_bytes -= FLOW_BYTES
+            self.on_flow(flow.to_dict())
+            return
+        self.finished_flows[len(self.finished_flows)] = flow
+        if len(self.finished_flows) >= self.max_flows:
+            self._save_flows_to_disk(self.finished_flows)
+    
+    def _save_flows_to_disk(self, flows):
+        """Append flows to disk as a binary spill segment and clear them from memory"""
+        if not flows:
+            return
+        self.flow_bytes -= FLOW_BYTES * len(flows)
+        records = flows_to_array(flows.values())
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self.flow_files.append(write_segment(self.temp_dir, len(self.flow_files), records))
         flows.clear()
     
+    def iter_flow_frames(self):
+        """Yield the spilled flows as DataFrames, partial flows merged, in flow start order.
+        
+        Segments are merged block by block (flow_spill.merge_segments), so they
+        are never all loaded at once.
+        """
+        try:
+            for records in merge_segments(self.flow_files):
+                yield records_to_frame(records)
+        except Exception as e:
+            print(f"Error loading flows from {self.temp_dir}: {e}")
+    
     def process_pcap(self, pcap_file, progress_callback=None):
-        """Process PCAP file in chunks for memory efficiency"""
-        print(f"Processing {pcap_file} in chunks...")
+        """Process PCAP file in chunks for memory efficiency.
         
+        progress_callback(bytes_read, bytes_total, packets) is called after every chunk
+        and may return False to stop, like cancel().
+        """
         # Reset state
-        self.flows = {}
+        self.flows = FlowTable(self.idle_timeout, self.active_timeout)
+        self.finished_flows = {}
         self.flow_files = []
+        self.spilled_flows = OrderedDict()
+        self.next_flow_id = 0
+        self.sharded_frame = None
+        self.flow_bytes = 0
+        
+        if self.workers > 1:
+            print(f"Processing {pcap_file} with {self.workers} workers...")
+            worker_kwargs = {
+                'max_memory_mb': self.max_memory_mb,
+                'chunk_size': self.chunk_size,
+                'max_flows': self.max_flows,
+                'decoder': self.decoder,
+                'scapy_fallback': self.scapy_fallback,
+                'reader': self.reader,
+                'idle_timeout': self.idle_timeout,
+                'active_timeout': self.active_timeout
+            }
+            self.sharded_frame = process_pcap_sharded(
+                OptimizedFlowExtractor, pcap_file, self.workers, worker_kwargs,
+                self.decoder, self.scapy_fallback, self.reader, progress_callback,
+                cancel_token=self.cancel_token)
+            if self.on_flow is not None:
+                for features in self.sharded_frame.to_dict('records'):
+                    self.on_flow(features)
+                self.sharded_frame = None
+            print("Finished processing PCAP file")
+            return
+        
+        print(f"Processing {pcap_file} in chunks...")
         
         try:
-            # First pass: count total packets for progress
-            print("Counting packets...")
-            total_packets = 0
-            with PcapReader(pcap_file) as pcap_reader:
-                for _ in pcap_reader:
-                    total_packets += 1
-            
-            print(f"Found {total_packets} packets")
-            
             # Process in chunks
             processed_packets = 0
             chunk = []
+            cancel_token = self.cancel_token
             
-            with PcapReader(pcap_file) as pcap_reader:
-                for packet in pcap_reader:
+            with PacketSource(pcap_file, self.decoder, self.scapy_fallback,
+                              self.reader, cancel_token=cancel_token) as source:
+                total_bytes = source.size
+                for packet in source:
                     chunk.append(packet)
                     
                     if len(chunk) >= self.chunk_size:
-                        chunk_flows = self._process_packet_chunk(chunk, progress_callback)
-                        self.flows.update(chunk_flows)
+                        self.process_records(chunk)
                         processed_packets += len(chunk)
                         chunk = []
                         
                         # Update progress
                         if progress_callback:
-                            progress_callback(processed_packets, total_packets)
+                            if progress_callback(source.offset, total_bytes,
+                                                 processed_packets) is False:
+                                cancel_token.cancel()
             
             # Process remaining packets in the last chunk
-            if chunk:
-                chunk_flows = self._process_packet_chunk(chunk, progress_callback)
-                self.flows.update(chunk_flows)
+            if chunk and not cancel_token.cancelled:
+                self.process_records(chunk)
                 processed_packets += len(chunk)
-                
-                if progress_callback:
-                    progress_callback(processed_packets, total_packets)
+            
+            if progress_callback and not cancel_token.cancelled:
+                progress_callback(total_bytes, total_bytes, processed_packets)
+            
+            # Flows still live at the end of the capture end here
+            if self.on_flow is not None:
+                self.flush_flows()
+                # Live flows spilled under memory pressure, merged with their continuations
+                self._save_flows_to_disk(self.finished_flows)
+                for frame in self.iter_flow_frames():
+                    for features in frame.to_dict('records'):
+                        self.on_flow(features)
+                self._cleanup_temp_files()
             
             # Save any remaining flows to disk
             if self.flows:
                 self._save_flows_to_disk(self.flows)
-                self.flows = {}
+            if self.finished_flows:
+                self._save_flows_to_disk(self.finished_flows)
+            self.flow_bytes -= SPILLED_FLOW_BYTES * len(self.spilled_flows)
+            self.spilled_flows.clear()
             
             print("Finished processing PCAP file")
             
@@ -332,29 +543,25 @@ class OptimizedFlowExtractor:
     
     def get_flow_dataframe(self):
         """Combine flows from memory and disk into a single DataFrame"""
-        all_flows = []
+        frames = []
         
-        # Add in-memory flows
-        for flow in self.flows.values():
-            all_flows.append(flow.to_dict())
+        # Flows extracted by worker processes
+        if self.sharded_frame is not None and not self.sharded_frame.empty:
+            frames.append(self.sharded_frame)
         
-        # Add flows from disk
-        for flow_file in self.flow_files:
-            try:
-                with open(flow_file, 'rb') as f:
-                    flows = pickle.load(f)
-                    all_flows.extend(flows.values())
-            except Exception as e:
-                print(f"Error loading flows from {flow_file}: {e}")
+        # Spill in-memory flows too, so continuations merge with their earlier parts
+        self._save_flows_to_disk(self.finished_flows)
+        self._save_flows_to_disk(self.flows)
+        frames.extend(frame for frame in self.iter_flow_frames() if not frame.empty)
         
         # Clean up temporary files
         self._cleanup_temp_files()
         
-        # Create and return DataFrame
-        if not all_flows:
+        if not frames:
             return pd.DataFrame()
-            
-        return pd.DataFrame(all_flows)
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
     
     def _cleanup_temp_files(self):
         """Clean up temporary files"""
@@ -379,21 +586,25 @@ class OptimizedFlowExtractor:
 
 # Example usage
 if __name__ == "__main__":
-    import sys
+    import argparse
     
-    if len(sys.argv) < 2:
-        print("Usage: python optimized_flow_extractor.py <pcap_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Memory-efficient flow extraction')
+    parser.add_argument('pcap_file', help='Input pcap/pcapng file')
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f'Worker processes, flows sharded by 5-tuple hash (this machine has {cpu_count()} cores)')
+    parser.add_argument('--max-memory-mb', type=int, default=1024,
+                        help='Memory budget for flow state before spilling to disk (default: 1024)')
+    args = parser.parse_args()
     
-    pcap_file = sys.argv[1]
+    pcap_file = args.pcap_file
     
-    def progress_callback(current, total):
-        if total > 0:
-            progress = (current / total) * 100
-            print(f"\rProgress: {progress:.2f}% ({current}/{total} packets)", end="")
+    def progress_callback(bytes_read, bytes_total, packets):
+        if bytes_total > 0:
+            progress = (bytes_read / bytes_total) * 100
+            print(f"\rProgress: {progress:.2f}% ({packets} packets)", end="")
     
     print(f"Processing {pcap_file}...")
-    extractor = OptimizedFlowExtractor()
+    extractor = OptimizedFlowExtractor(max_memory_mb=args.max_memory_mb, workers=args.workers)
     extractor.process_pcap(pcap_file, progress_callback)
     
     print("\nExtracting features...")
@@ -9,13 +9,14 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 import pyqtgraph as pg
 from optimized_flow_extractor import OptimizedFlowExtractor
+from cancellation import CancelToken
 
 # Configure pyqtgraph
 pg.setConfigOption('background', 'w')
 pg.setConfigOption('foreground', 'k')
 
 class FlowExtractorThread(QThread):
-    progress_updated = pyqtSignal(int, int)  # current, total
+    progress_updated = pyqtSignal('qint64', 'qint64', 'qint64')  # bytes_read, bytes_total, packets
     status_updated = pyqtSignal(str)
     finished = pyqtSignal(pd.DataFrame)
     error_occurred = pyqtSignal(str)
@@ -24,16 +25,17 @@ class FlowExtractorThread(QThread):
         super().__init__()
         self.pcap_file = pcap_file
         self._is_running = True
+        self.cancel_token = CancelToken()
     
     def run(self):
         try:
             self.status_updated.emit("Initializing...")
-            extractor = OptimizedFlowExtractor()
+            extractor = OptimizedFlowExtractor(cancel_token=self.cancel_token)
             
-            def progress_callback(current, total):
+            def progress_callback(bytes_read, bytes_total, packets):
                 if not self._is_running:
                     return False
-                self.progress_updated.emit(current, total)
+                self.progress_updated.emit(bytes_read, bytes_total, packets)
                 return True
             
             self.status_updated.emit("Processing PCAP file...")
@@ -49,6 +51,7 @@ class FlowExtractorThread(QThread):
     
     def stop(self):
         self._is_running = False
+        self.cancel_token.cancel()  # the extractor returns at its next packet
 
 class OptimizedMNITJFlowMeter(QMainWindow):
     def __init__(self):
@@ -156,9 +159,9 @@ class OptimizedMNITJFlowMeter(QMainWindow):
             self.start_btn.setEnabled(True)
             self.stop_btn.setEnabled(False)
     
-    def update_progress(self, current, total):
-        if total > 0:
-            progress = int((current / total) * 100)
+    def update_progress(self, bytes_read, bytes_total, packets):
+        if bytes_total > 0:
+            progress = int((bytes_read / bytes_total) * 100)
             self.progress.setValue(progress)
     
     def update_status(self, message):
@@ -0,0 +1,765 @@
+"""
+Raw-bytes pcap/pcapng decoding.
+
+Reads capture records with ``struct`` and parses the Ethernet/VLAN, IPv4/IPv6
+and TCP/UDP/ICMP headers directly into lightweight ``PacketRecord`` objects,
+without building Scapy packets. Scapy is only imported for the opt-in
+fallback used on encapsulations this module does not understand, and for the
+``decoder='scapy'`` compatibility path.
+"""
+
+import mmap
+import os
+import socket
+import struct
+import time
+
+# Link-layer header types (https://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+# EtherTypes
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+NON_IP_ETHERTYPES = (ETH_P_ARP, 0x8035, 0x8809, 0x888E, 0x88CC)
+
+# IP protocol numbers
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+IPV6_EXTENSION_HEADERS = (0, 43, 44, 51, 60)
+
+# TCP flag bits, same values as Scapy's TCP.flags
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+TCP_URG = 0x20
+TCP_ECE = 0x40
+TCP_CWR = 0x80
+
+# Capture file magic numbers
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+_U16 = struct.Struct('!H')
+_IPV4 = struct.Struct('!BBHHHBBHII')
+_IPV6 = struct.Struct('!IHBB')
+_TCP = struct.Struct('!HHIIHH')
+_PORTS = struct.Struct('!HH')
+
+
+class UnsupportedFrame(ValueError):
+    """Raised for link types or encapsulations the raw decoder cannot parse"""
+
+
+class PacketRecord:
+    """Header fields of one decoded IP packet"""
+
+    __slots__ = [
+        'time', 'length', 'ip_version', 'src', 'dst', 'proto', 'src_port',
+        'dst_port', 'ttl', 'ip_payload_len', 'payload_len', 'tcp_flags', 'window'
+    ]
+
+    def __init__(self, time, length, ip_version, src, dst, proto, src_port=0,
+                 dst_port=0, ttl=0, ip_payload_len=0, payload_len=0, tcp_flags=0,
+                 window=0):
+        self.time = time                      # capture timestamp (float seconds)
+        self.length = length                  # captured frame length, like len(scapy_packet)
+        self.ip_version = ip_version          # 4 or 6
+        self.src = src                        # source address as an int
+        self.dst = dst                        # destination address as an int
+        self.proto = proto                    # IP protocol number
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.ttl = ttl                        # TTL / hop limit
+        self.ip_payload_len = ip_payload_len  # bytes after the IP header(s)
+        self.payload_len = payload_len        # bytes after the transport header
+        self.tcp_flags = tcp_flags            # TCP flag bitmask (TCP_* constants)
+        self.window = window                  # TCP window
+
+    def __len__(self):
+        return self.length
+
+    def __reduce__(self):
+        # Positional tuple pickles far smaller/faster than the default slot state dict
+        return (PacketRecord, (self.time, self.length, self.ip_version, self.src, self.dst,
+                               self.proto, self.src_port, self.dst_port, self.ttl,
+                               self.ip_payload_len, self.payload_len, self.tcp_flags,
+                               self.window))
+
+    def __repr__(self):
+        return (f"PacketRecord({self.time:.6f}, {self.src_ip}:{self.src_port} -> "
+                f"{self.dst_ip}:{self.dst_port}, proto={self.proto}, len={self.length})")
+
+    @property
+    def src_ip(self):
+        return format_ip(self.src, self.ip_version)
+
+    @property
+    def dst_ip(self):
+        return format_ip(self.dst, self.ip_version)
+
+
+def format_ip(address, ip_version):
+    """Render an integer address as a dotted-quad or IPv6 string"""
+    if ip_version == 6:
+        return socket.inet_ntop(socket.AF_INET6, address.to_bytes(16, 'big'))
+    return socket.inet_ntoa(address.to_bytes(4, 'big'))
+
+
+def parse_ip(address):
+    """Convert an IPv4/IPv6 address string to (int, ip_version)"""
+    if ':' in address:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big'), 6
+    return int.from_bytes(socket.inet_aton(address), 'big'), 4
+
+
+def flow_key(record):
+    """Bidirectional flow key of integers: (addr_a, addr_b, port_a, port_b, proto).
+
+    The lower (address, port) endpoint comes first, so both directions of a
+    conversation map to the same key. Addresses are rendered as strings only
+    when flows are exported.
+    """
+    src, dst = record.src, record.dst
+    src_port, dst_port = record.src_port, record.dst_port
+    if (dst, dst_port) < (src, src_port):
+        return (dst, src, dst_port, src_port, record.proto)
+    return (src, dst, src_port, dst_port, record.proto)
+
+
+def _decode_transport(frame, ts, caplen, ip_version, src, dst, proto, ttl, offset, end,
+                      first_fragment=True):
+    """Parse the transport header at offset; end is where the IP payload stops"""
+    ip_payload_len = max(end - offset, 0)
+    src_port = dst_port = tcp_flags = window = 0
+    payload_len = ip_payload_len
+    if not first_fragment:
+        # Later fragments carry no transport header
+        return PacketRecord(ts, caplen, ip_version, src, dst, proto, ttl=ttl,
+                            ip_payload_len=ip_payload_len, payload_len=ip_payload_len)
+    if proto == IPPROTO_TCP and ip_payload_len >= 20:
+        src_port, dst_port, _, _, offset_flags, window = _TCP.unpack_from(frame, offset)
+        tcp_flags = offset_flags & 0xFF
+        payload_len = max(ip_payload_len - (offset_flags >> 12) * 4, 0)
+    elif proto == IPPROTO_UDP and ip_payload_len >= 8:
+        src_port, dst_port = _PORTS.unpack_from(frame, offset)
+        payload_len = ip_payload_len - 8
+    elif proto == IPPROTO_ICMP or proto == IPPROTO_ICMPV6:
+        payload_len = max(ip_payload_len - 8, 0)
+    return PacketRecord(ts, caplen, ip_version, src, dst, proto, src_port, dst_port,
+                        ttl, ip_payload_len, payload_len, tcp_flags, window)
+
+
+def _decode_ipv4(frame, offset, ts, caplen):
+    ver_ihl, _, total_len, _, frag, ttl, proto, _, src, dst = _IPV4.unpack_from(frame, offset)
+    end = min(offset + total_len, caplen) if total_len else caplen  # 0 with TSO
+    return _decode_transport(frame, ts, caplen, 4, src, dst, proto, ttl,
+                             offset + (ver_ihl & 0x0F) * 4, end, not frag & 0x1FFF)
+
+
+def _decode_ipv6(frame, offset, ts, caplen):
+    _, payload_len, next_header, hop_limit = _IPV6.unpack_from(frame, offset)
+    src = int.from_bytes(frame[offset + 8:offset + 24], 'big')
+    dst = int.from_bytes(frame[offset + 24:offset + 40], 'big')
+    end = min(offset + 40 + payload_len, caplen) if payload_len else caplen
+    transport = offset + 40
+    first_fragment = True
+    while next_header in IPV6_EXTENSION_HEADERS and transport + 8 <= end:
+        header, header_len = frame[transport], frame[transport + 1]
+        if next_header == 44:  # Fragment header
+            first_fragment = not _U16.unpack_from(frame, transport + 2)[0] >> 3
+            transport += 8
+        elif next_header == 51:  # Authentication header counts 4-byte units
+            transport += (header_len + 2) * 4
+        else:
+            transport += (header_len + 1) * 8
+        next_header = header
+    return _decode_transport(frame, ts, caplen, 6, src, dst, next_header, hop_limit,
+                             transport, end, first_fragment)
+
+
+def decode_frame(frame, linktype, ts):
+    """Decode one captured frame into a PacketRecord.
+
+    Returns None for frames that do not carry IPv4/IPv6 and raises
+    UnsupportedFrame for link types or encapsulations this decoder cannot
+    parse. Truncated headers raise struct.error.
+    """
+    caplen = len(frame)
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype = _U16.unpack_from(frame, 12)[0]
+        offset = 14
+        while ethertype in VLAN_ETHERTYPES:
+            ethertype = _U16.unpack_from(frame, offset + 2)[0]
+            offset += 4
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        offset = 0
+        ethertype = ETH_P_IPV6 if frame[0] >> 4 == 6 else ETH_P_IP
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype = _U16.unpack_from(frame, 14)[0]
+        offset = 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        ethertype = _U16.unpack_from(frame, 0)[0]
+        offset = 20
+    elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        # The 4-byte address family differs between OSes; sniff the IP version instead
+        offset = 4
+        ethertype = ETH_P_IPV6 if frame[4] >> 4 == 6 else ETH_P_IP
+    else:
+        raise UnsupportedFrame(f"Unsupported link type {linktype}")
+
+    if ethertype == ETH_P_IP:
+        return _decode_ipv4(frame, offset, ts, caplen)
+    if ethertype == ETH_P_IPV6:
+        return _decode_ipv6(frame, offset, ts, caplen)
+    if ethertype < 0x0600 or ethertype in NON_IP_ETHERTYPES:
+        # 802.3 length field (LLC/STP) or a known non-IP protocol
+        return None
+    raise UnsupportedFrame(f"Unsupported EtherType 0x{ethertype:04x}")
+
+
+def record_from_scapy(packet):
+    """Build a PacketRecord from a dissected Scapy packet (None if it has no IP layer)"""
+    from scapy.layers.inet import IP, TCP, UDP, ICMP
+    from scapy.layers.inet6 import IPv6
+
+    if IP in packet:
+        ip = packet[IP]
+        ip_version, ttl = 4, ip.ttl
+    elif IPv6 in packet:
+        ip = packet[IPv6]
+        ip_version, ttl = 6, ip.hlim
+    else:
+        return None
+
+    src, _ = parse_ip(ip.src)
+    dst, _ = parse_ip(ip.dst)
+    proto = ip.proto if ip_version == 4 else ip.nh
+    ip_payload_len = len(ip.payload)
+    src_port = dst_port = tcp_flags = window = 0
+    payload_len = ip_payload_len
+    if TCP in packet:
+        tcp = packet[TCP]
+        proto = IPPROTO_TCP
+        src_port, dst_port, window = tcp.sport, tcp.dport, tcp.window
+        tcp_flags = int(tcp.flags) & 0xFF
+        payload_len = len(tcp.payload)
+    elif UDP in packet:
+        udp = packet[UDP]
+        proto = IPPROTO_UDP
+        src_port, dst_port = udp.sport, udp.dport
+        payload_len = len(udp.payload)
+    elif ICMP in packet:
+        payload_len = len(packet[ICMP].payload)
+    return PacketRecord(float(packet.time), len(packet), ip_version, src, dst, proto,
+                        src_port, dst_port, ttl, ip_payload_len, payload_len,
+                        tcp_flags, window)
+
+
+def to_record(packet):
+    """Return packet as a PacketRecord, dissecting Scapy packets if needed"""
+    if isinstance(packet, PacketRecord):
+        return packet
+    return record_from_scapy(packet)
+
+
+def _decode_with_scapy(frame, linktype, ts):
+    """Fallback for exotic encapsulations: let Scapy dissect the frame"""
+    from scapy.all import conf  # loads the layers that register conf.l2types
+
+    layer = conf.l2types.get(linktype)
+    if layer is None:
+        return None
+    packet = layer(bytes(frame))
+    packet.time = ts
+    return record_from_scapy(packet)
+
+
+def decode_record(frame, linktype, ts, scapy_fallback=False):
+    """decode_frame for a single frame: None instead of an exception for frames it cannot parse"""
+    try:
+        return decode_frame(frame, linktype, ts)
+    except UnsupportedFrame:
+        return _decode_with_scapy(frame, linktype, ts) if scapy_fallback else None
+    except (struct.error, IndexError):
+        return None  # truncated headers
+
+
+class PcapStreamReader:
+    """Iterate over the frames of a pcap or pcapng file using buffered reads.
+
+    Yields (timestamp, linktype, frame) tuples. ``offset`` is the file
+    position just after the last complete record returned. start resumes at
+    a record boundary reported by ``offset`` earlier: pcap files seek there
+    directly, pcapng files still read the blocks before it for their
+    interface descriptions but yield no frames from them.
+    """
+
+    def __init__(self, path, buffer_size=1 << 20, start=0):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.offset = 0
+        self.start = start
+        self._file = open(path, 'rb', buffering=buffer_size)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        head = self._file.read(4)
+        if len(head) < 4:
+            return iter(())
+        if struct.unpack('<I', head)[0] == PCAPNG_SHB:
+            return self._iter_pcapng(head)
+        return self._iter_pcap(head)
+
+    def _iter_pcap(self, head):
+        magic = struct.unpack('<I', head)[0]
+        if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            endian = '<'
+        elif struct.unpack('>I', head)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            endian = '>'
+            magic = struct.unpack('>I', head)[0]
+        else:
+            raise ValueError(f"{self.path} is not a pcap or pcapng file")
+        divisor = 1e9 if magic == PCAP_MAGIC_NSEC else 1e6
+
+        header = self._file.read(20)
+        if len(header) < 20:
+            return
+        linktype = struct.unpack(endian + 'HHiIII', header)[5] & 0xFFFF
+        self.offset = 24
+        if self.start > 24:
+            self._file.seek(self.start)
+            self.offset = self.start
+
+        record_header = struct.Struct(endian + 'IIII')
+        read = self._file.read
+        while True:
+            raw = read(16)
+            if len(raw) < 16:
+                return
+            ts_sec, ts_frac, caplen, _ = record_header.unpack(raw)
+            frame = read(caplen)
+            if len(frame) < caplen:
+                return
+            self.offset += 16 + caplen
+            yield ts_sec + ts_frac / divisor, linktype, frame
+
+    def _iter_pcapng(self, head):
+        read = self._file.read
+        endian = '<'
+        interfaces = []  # (linktype, ts_divisor) per interface id
+        raw_type = head
+        while True:
+            raw_len = read(4)
+            if len(raw_len) < 4:
+                return
+            if struct.unpack('<I', raw_type)[0] == PCAPNG_SHB:
+                # Section Header Block: its byte-order magic sets the endianness
+                bom = read(4)
+                if len(bom) < 4:
+                    return
+                endian = '<' if struct.unpack('<I', bom)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                block_len = struct.unpack(endian + 'I', raw_len)[0]
+                body = read(block_len - 12)
+                if len(body) < block_len - 12:
+                    return
+                interfaces = []
+                frame = None
+            else:
+                block_len = struct.unpack(endian + 'I', raw_len)[0]
+                if block_len < 12:
+                    raise ValueError(f"Corrupt pcapng block at offset {self.offset} in {self.path}")
+                body = read(block_len - 8)
+                if len(body) < block_len - 8:
+                    return
+                block_type = struct.unpack(endian + 'I', raw_type)[0]
+                frame = None
+                if self.offset >= self.start or block_type == 1:
+                    frame = self._pcapng_block(block_type, body, endian, interfaces)
+            self.offset += block_len
+            if frame is not None:
+                yield frame
+            raw_type = read(4)
+            if len(raw_type) < 4:
+                return
+
+    @staticmethod
+    def _pcapng_block(block_type, body, endian, interfaces):
+        """Handle one pcapng block body; returns a frame tuple for packet blocks"""
+        if block_type == 1:  # Interface Description Block
+            linktype = struct.unpack_from(endian + 'H', body, 0)[0]
+            interfaces.append((linktype, _pcapng_ts_divisor(body[8:], endian)))
+        elif block_type == 6:  # Enhanced Packet Block
+            iface, ts_high, ts_low, caplen, _ = struct.unpack_from(endian + 'IIIII', body, 0)
+            linktype, divisor = interfaces[iface]
+            return ((ts_high << 32 | ts_low) / divisor, linktype, body[20:20 + caplen])
+        elif block_type == 3:  # Simple Packet Block
+            linktype, _ = interfaces[0]
+            orig_len = struct.unpack_from(endian + 'I', body, 0)[0]
+            return (0.0, linktype, body[4:4 + orig_len])
+        elif block_type == 2:  # Packet Block (obsolete)
+            iface, _, ts_high, ts_low, caplen, _ = struct.unpack_from(endian + 'HHIIII', body, 0)
+            linktype, divisor = interfaces[iface]
+            return ((ts_high << 32 | ts_low) / divisor, linktype, body[20:20 + caplen])
+        return None
+
+
+class PcapMmapReader:
+    """Iterate over the frames of a pcap or pcapng file through a memory map.
+
+    Record headers are parsed in place and each frame is yielded as a
+    memoryview slice of the mapping, so no packet bytes are copied. Same
+    (timestamp, linktype, frame) tuples, ``offset`` and start as
+    PcapStreamReader.
+    """
+
+    def __init__(self, path, start=0):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.offset = 0
+        self.start = start
+        self._file = open(path, 'rb')
+        self._mmap = None
+        self._view = None
+        if self.size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+
+    def close(self):
+        if self._view is not None:
+            try:
+                self._view.release()
+                self._mmap.close()
+            except BufferError:
+                pass  # frames still referenced; the mapping is freed with them
+            self._view = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        if self.size < 4:
+            return iter(())
+        if struct.unpack_from('<I', self._view, 0)[0] == PCAPNG_SHB:
+            return self._iter_pcapng()
+        return self._iter_pcap()
+
+    def _iter_pcap(self):
+        view = self._view
+        size = self.size
+        magic = struct.unpack_from('<I', view, 0)[0]
+        if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            endian = '<'
+        elif struct.unpack_from('>I', view, 0)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            endian = '>'
+            magic = struct.unpack_from('>I', view, 0)[0]
+        else:
+            raise ValueError(f"{self.path} is not a pcap or pcapng file")
+        divisor = 1e9 if magic == PCAP_MAGIC_NSEC else 1e6
+        if size < 24:
+            return
+        linktype = struct.unpack_from(endian + 'HHiIII', view, 4)[5] & 0xFFFF
+
+        unpack_header = struct.Struct(endian + 'IIII').unpack_from
+        pos = max(24, self.start)
+        self.offset = pos
+        while pos + 16 <= size:
+            ts_sec, ts_frac, caplen, _ = unpack_header(view, pos)
+            end = pos + 16 + caplen
+            if end > size:
+                return
+            frame = view[pos + 16:end]
+            pos = self.offset = end
+            yield ts_sec + ts_frac / divisor, linktype, frame
+
+    def _iter_pcapng(self):
+        view = self._view
+        size = self.size
+        endian = '<'
+        interfaces = []  # (linktype, ts_divisor) per interface id
+        pos = 0
+        while pos + 12 <= size:
+            if struct.unpack_from('<I', view, pos)[0] == PCAPNG_SHB:
+                bom = struct.unpack_from('<I', view, pos + 8)[0]
+                endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                interfaces = []
+                block_type = PCAPNG_SHB
+            else:
+                block_type = struct.unpack_from(endian + 'I', view, pos)[0]
+            block_len = struct.unpack_from(endian + 'I', view, pos + 4)[0]
+            if block_len < 12:
+                raise ValueError(f"Corrupt pcapng block at offset {pos} in {self.path}")
+            end = pos + block_len
+            if end > size:
+                return
+            frame = None
+            if block_type != PCAPNG_SHB and (pos >= self.start or block_type == 1):
+                frame = PcapStreamReader._pcapng_block(block_type, view[pos + 8:end], endian,
+                                                       interfaces)
+            pos = self.offset = end
+            if frame is not None:
+                yield frame
+
+
+def _pcapng_ts_divisor(options, endian):
+    """Read the if_tsresol option of an Interface Description Block"""
+    pos = 0
+    while pos + 4 <= len(options):
+        code, length = struct.unpack_from(endian + 'HH', options, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            resolution = options[pos + 4]
+            if resolution & 0x80:
+                return float(2 ** (resolution & 0x7F))
+            return float(10 ** resolution)
+        pos += 4 + (length + 3) // 4 * 4
+    return 1e6
+
+
+class PcapFollowReader:
+    """Iterate over the frames of a pcap or pcapng file that is still being written.
+
+    Like PcapStreamReader, except that a partial record at the end of the
+    file does not end the capture: the reader rewinds to ``offset`` (just
+    after the last complete record), sleeps poll_interval seconds, yields
+    None and reads on from there. Iteration ends after close(), or at the
+    end of the data once finish() has been called.
+    """
+
+    def __init__(self, path, poll_interval=0.5, buffer_size=1 << 20):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.offset = 0
+        self.closed = False
+        self.finishing = False
+        self._iterating = False
+        self._file = open(path, 'rb', buffering=buffer_size)
+
+    @property
+    def size(self):
+        """Current size of the capture file"""
+        return os.path.getsize(self.path)
+
+    def close(self):
+        """Stop following; a running iteration ends at its next record or poll"""
+        self.closed = True
+        if not self._iterating:
+            self._file.close()
+
+    def finish(self):
+        """Stop at the end of the data written so far instead of waiting for more"""
+        self.finishing = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read(self, size):
+        """`size` bytes, or None after rewinding to offset if the file does not hold them yet"""
+        data = self._file.read(size)
+        if len(data) < size:
+            self._file.seek(self.offset)
+            return None
+        return data
+
+    def _wait(self):
+        """Sleep for poll_interval; False once the reader has been closed or finished"""
+        if self.finishing:
+            return False
+        time.sleep(self.poll_interval)
+        return not self.closed
+
+    def __iter__(self):
+        self._iterating = True
+        try:
+            head = self._read(4)
+            while head is None:
+                if not self._wait():
+                    return
+                yield None
+                head = self._read(4)
+            self._file.seek(0)
+            if struct.unpack('<I', head)[0] == PCAPNG_SHB:
+                yield from self._follow_pcapng()
+            else:
+                yield from self._follow_pcap(head)
+        finally:
+            self._file.close()
+
+    def _follow_pcap(self, head):
+        magic = struct.unpack('<I', head)[0]
+        if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            endian = '<'
+        elif struct.unpack('>I', head)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            endian = '>'
+            magic = struct.unpack('>I', head)[0]
+        else:
+            raise ValueError(f"{self.path} is not a pcap or pcapng file")
+        divisor = 1e9 if magic == PCAP_MAGIC_NSEC else 1e6
+
+        header = self._read(24)
+        while header is None:
+            if not self._wait():
+                return
+            yield None
+            header = self._read(24)
+        linktype = struct.unpack(endian + 'HHiIII', header[4:])[5] & 0xFFFF
+        self.offset = 24
+
+        record_header = struct.Struct(endian + 'IIII')
+        read = self._file.read
+        while not self.closed:
+            raw = read(16)
+            if len(raw) == 16:
+                ts_sec, ts_frac, caplen, _ = record_header.unpack(raw)
+                frame = read(caplen)
+                if len(frame) == caplen:
+                    self.offset += 16 + caplen
+                    yield ts_sec + ts_frac / divisor, linktype, frame
+                    continue
+            # Partial record: wait for the writer to finish it
+            self._file.seek(self.offset)
+            if not self._wait():
+                return
+            yield None
+
+    def _follow_pcapng(self):
+        read = self._file.read
+        endian = '<'
+        interfaces = []  # (linktype, ts_divisor) per interface id
+        while not self.closed:
+            head = read(12)
+            if len(head) == 12:
+                if struct.unpack('<I', head[:4])[0] == PCAPNG_SHB:
+                    bom = struct.unpack('<I', head[8:])[0]
+                    endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                block_type, block_len = struct.unpack(endian + 'II', head[:8])
+                if block_len < 12:
+                    raise ValueError(f"Corrupt pcapng block at offset {self.offset} in {self.path}")
+                rest = read(block_len - 12)
+                if len(rest) == block_len - 12:
+                    self.offset += block_len
+                    if block_type == PCAPNG_SHB:
+                        interfaces = []
+                        continue
+                    frame = PcapStreamReader._pcapng_block(block_type, head[8:] + rest,
+                                                           endian, interfaces)
+                    if frame is not None:
+                        yield frame
+                    continue
+            # Partial block: wait for the writer to finish it
+            self._file.seek(self.offset)
+            if not self._wait():
+                return
+            yield None
+
+
+READERS = {
+    'stream': PcapStreamReader,
+    'mmap': PcapMmapReader,
+}
+
+
+class PacketSource:
+    """Iterable of PacketRecords for the IP packets of a capture file.
+
+    decoder='raw' (default) parses headers with the struct-based decoder;
+    decoder='scapy' dissects every packet with Scapy's PcapReader. With the
+    raw decoder, scapy_fallback=True hands frames the raw decoder cannot parse
+    (unknown link types or EtherTypes such as MPLS or PPPoE) to Scapy instead
+    of dropping them, and reader selects buffered reads ('stream') or a
+    zero-copy memory map ('mmap'). start resumes the raw decoder at a file
+    offset previously reported by ``offset``. Iteration stops before the next
+    frame once cancel_token (see cancellation.CancelToken) is cancelled.
+    """
+
+    def __init__(self, path, decoder='raw', scapy_fallback=False, reader='mmap', start=0,
+                 cancel_token=None):
+        if decoder not in ('raw', 'scapy'):
+            raise ValueError(f"Unknown decoder: {decoder}")
+        if reader not in READERS:
+            raise ValueError(f"Unknown reader: {reader}")
+        if start and decoder == 'scapy':
+            raise ValueError("Resuming at a file offset needs the raw decoder")
+        self.path = path
+        self.decoder = decoder
+        self.scapy_fallback = scapy_fallback
+        self.cancel_token = cancel_token
+        self.size = os.path.getsize(path)
+        if decoder == 'scapy':
+            # scapy.all registers the link layers; bare scapy.utils reads every frame as Raw
+            from scapy.all import PcapReader
+            self._reader = PcapReader(path)
+        else:
+            self._reader = READERS[reader](path, start=start)
+
+    @property
+    def offset(self):
+        """Bytes of the capture file consumed so far"""
+        if self.decoder == 'scapy':
+            return self._reader.f.tell()
+        return self._reader.offset
+
+    def close(self):
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        cancel_token = self.cancel_token
+        if self.decoder == 'scapy':
+            for packet in self._reader:
+                if cancel_token is not None and cancel_token.cancelled:
+                    return
+                record = record_from_scapy(packet)
+                if record is not None:
+                    yield record
+            return
+
+        scapy_fallback = self.scapy_fallback
+        for ts, linktype, frame in self._reader:
+            if cancel_token is not None and cancel_token.cancelled:
+                return
+            try:
+                record = decode_frame(frame, linktype, ts)
+            except UnsupportedFrame:
+                if not scapy_fallback:
+                    continue
+                record = _decode_with_scapy(frame, linktype, ts)
+            except (struct.error, IndexError):
+                continue  # truncated headers
+            if record is not None:
+                yield record
@@ -2,16 +2,57 @@ import sys
 import os
 import csv
 import math
+import time
 import logging
 from datetime import datetime
-import scapy.all as scapy
-from scapy.sendrecv import AsyncSniffer
-from scapy.sessions import DefaultSession
-from mnitjflowmeter.flow_session import generate_session_class
+from itertools import repeat
+import numpy as np
+from gui_flow_extractor_full import FullFlowExtractor
 
 # Constants
 EXPIRED_UPDATE = 40  # seconds
 
+# Flow rows buffered before the CSV sink formats and writes them, and the
+# longest a buffered row may wait before being written (seconds)
+CSV_BATCH_ROWS = 1000
+CSV_FLUSH_INTERVAL = 1.0
+
+# CSV header to match command-line output
+HEADER = [
+    'src_ip', 'dst_ip', 'src_port', 'dst_port', 'protocol', 'timestamp',
+    'flow_duration', 'flow_byts_s', 'flow_pkts_s', 'fwd_pkts_s', 'bwd_pkts_s',
+    'tot_fwd_pkts', 'tot_bwd_pkts', 'totlen_fwd_pkts', 'totlen_bwd_pkts',
+    'fwd_pkt_len_max', 'fwd_pkt_len_min', 'fwd_pkt_len_mean', 'fwd_pkt_len_std',
+    'bwd_pkt_len_max', 'bwd_pkt_len_min', 'bwd_pkt_len_mean', 'bwd_pkt_len_std',
+    'pkt_len_max', 'pkt_len_min', 'pkt_len_mean', 'pkt_len_std', 'pkt_len_var',
+    'fwd_header_len', 'bwd_header_len', 'fwd_seg_size_min', 'fwd_act_data_pkts',
+    'flow_iat_mean', 'flow_iat_max', 'flow_iat_min', 'flow_iat_std',
+    'fwd_iat_tot', 'fwd_iat_max', 'fwd_iat_min', 'fwd_iat_mean', 'fwd_iat_std',
+    'bwd_iat_tot', 'bwd_iat_max', 'bwd_iat_min', 'bwd_iat_mean', 'bwd_iat_std',
+    'fwd_psh_flags', 'bwd_psh_flags', 'fwd_urg_flags', 'bwd_urg_flags',
+    'fin_flag_cnt', 'syn_flag_cnt', 'rst_flag_cnt', 'psh_flag_cnt', 'ack_flag_cnt',
+    'urg_flag_cnt', 'ece_flag_cnt', 'down_up_ratio', 'pkt_size_avg',
+    'init_fwd_win_byts', 'init_bwd_win_byts', 'active_max', 'active_min',
+    'active_mean', 'active_std', 'idle_max', 'idle_min', 'idle_mean', 'idle_std',
+    'fwd_byts_b_avg', 'fwd_pkts_b_avg', 'bwd_byts_b_avg', 'bwd_pkts_b_avg',
+    'fwd_blk_rate_avg', 'bwd_blk_rate_avg', 'fwd_seg_size_avg', 'bwd_seg_size_avg',
+    'cwr_flag_count', 'subflow_fwd_pkts', 'subflow_bwd_pkts', 'subflow_fwd_byts', 'subflow_bwd_byts'
+]
+
+# FullFlowExtractor feature names of the header fields it calls differently;
+# header fields it does not compute (header lengths, per-direction PSH/URG
+# counts, segment sizes) are written as 0
+FEATURE_NAMES = {
+    'ece_flag_cnt': 'ece_flag_count',
+    'fwd_byts_b_avg': 'fwd_avg_bytes_per_bulk', 'fwd_pkts_b_avg': 'fwd_avg_packets_per_bulk',
+    'fwd_blk_rate_avg': 'fwd_avg_bulk_rate',
+    'bwd_byts_b_avg': 'bwd_avg_bytes_per_bulk', 'bwd_pkts_b_avg': 'bwd_avg_packets_per_bulk',
+    'bwd_blk_rate_avg': 'bwd_avg_bulk_rate',
+}
+
+# Only TCP and UDP flows are written, as with the old "ip and (tcp or udp)" filter
+FLOW_PROTOCOLS = (6, 17)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -45,6 +86,94 @@ def format_flow_data(flow_data):
     
     return flow_data
 
+_MISSING = object()  # placeholder for header fields a flow does not have
+
+def _format_timestamp(value):
+    """Timestamp cell as format_flow_data renders it"""
+    if value is _MISSING or not isinstance(value, (int, float)):
+        return value
+    try:
+        return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError):
+        return ''
+
+def _format_value(value):
+    """Cell as format_flow_data renders it (missing fields become 0)"""
+    if value is _MISSING or value is None:
+        return 0
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 0
+        if value == 0 or (abs(value) > 1e-4 and abs(value) < 1e6):
+            return round(value, 6)
+        return f"{value:.6e}"
+    return value
+
+def _format_column(column):
+    """Format one column of buffered cells; int/str columns pass through untouched"""
+    types = set(map(type, column))
+    if types <= {int, str, bool}:
+        return column
+    if types == {float}:
+        values = np.array(column)
+        magnitude = np.abs(values)
+        if ((values == 0) | ((magnitude > 1e-4) & (magnitude < 1e6))).all():
+            # Every value is rounded: one C-level pass (np.round differs from round() in the last digit)
+            return list(map(round, column, repeat(6)))
+    return list(map(_format_value, column))
+
+class BatchedCsvSink:
+    """Buffered CSV writer for flow rows.
+    
+    Rows are buffered and, once batch_rows rows are waiting or flush_interval
+    seconds have passed, formatted column by column and written with a single
+    writerows call. The output is identical to writing every row through
+    format_flow_data and csv.DictWriter. fields maps header columns to the
+    flow keys they are read from when the names differ.
+    """
+    
+    def __init__(self, f, header=HEADER, batch_rows=CSV_BATCH_ROWS, flush_interval=CSV_FLUSH_INTERVAL,
+                 fields=None):
+        self.file = f
+        self.header = header
+        self.keys = [(fields or {}).get(name, name) for name in header]
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        self.writer.writerow(header)
+        self.rows = 0
+        self._buffer = []
+        self._timestamp_column = header.index('timestamp') if 'timestamp' in header else None
+        self._start_time = self._last_flush = time.monotonic()
+    
+    def write(self, flow_data):
+        """Buffer one flow's data, flushing on the size or time threshold"""
+        self._buffer.append(list(map(flow_data.get, self.keys, repeat(_MISSING))))
+        if (len(self._buffer) >= self.batch_rows or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+    
+    def flush(self):
+        """Format and write the buffered rows"""
+        if self._buffer:
+            columns = [list(column) for column in zip(*self._buffer)]
+            if self._timestamp_column is not None:
+                i = self._timestamp_column
+                columns[i] = list(map(_format_timestamp, columns[i]))
+            columns = [_format_column(column) for column in columns]
+            self.writer.writerows(zip(*columns))
+            self.rows += len(self._buffer)
+            self._buffer = []
+        self.file.flush()
+        self._last_flush = time.monotonic()
+    
+    @property
+    def rows_per_second(self):
+        return self.rows / max(time.monotonic() - self._start_time, 1e-9)
+    
+    def close(self):
+        self.flush()
+
 def process_pcap(pcap_file, output_file):
     """Process a pcap file and generate flow statistics."""
     logger.info(f"Processing {pcap_file}...")
@@ -55,74 +184,29 @@ def process_pcap(pcap_file, output_file):
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir, exist_ok=True)
         
-        # Define the CSV header to match command-line output
-        header = [
-            'src_ip', 'dst_ip', 'src_port', 'dst_port', 'protocol', 'timestamp',
-            'flow_duration', 'flow_byts_s', 'flow_pkts_s', 'fwd_pkts_s', 'bwd_pkts_s',
-            'tot_fwd_pkts', 'tot_bwd_pkts', 'totlen_fwd_pkts', 'totlen_bwd_pkts',
-            'fwd_pkt_len_max', 'fwd_pkt_len_min', 'fwd_pkt_len_mean', 'fwd_pkt_len_std',
-            'bwd_pkt_len_max', 'bwd_pkt_len_min', 'bwd_pkt_len_mean', 'bwd_pkt_len_std',
-            'pkt_len_max', 'pkt_len_min', 'pkt_len_mean', 'pkt_len_std', 'pkt_len_var',
-            'fwd_header_len', 'bwd_header_len', 'fwd_seg_size_min', 'fwd_act_data_pkts',
-            'flow_iat_mean', 'flow_iat_max', 'flow_iat_min', 'flow_iat_std',
-            'fwd_iat_tot', 'fwd_iat_max', 'fwd_iat_min', 'fwd_iat_mean', 'fwd_iat_std',
-            'bwd_iat_tot', 'bwd_iat_max', 'bwd_iat_min', 'bwd_iat_mean', 'bwd_iat_std',
-            'fwd_psh_flags', 'bwd_psh_flags', 'fwd_urg_flags', 'bwd_urg_flags',
-            'fin_flag_cnt', 'syn_flag_cnt', 'rst_flag_cnt', 'psh_flag_cnt', 'ack_flag_cnt',
-            'urg_flag_cnt', 'ece_flag_cnt', 'down_up_ratio', 'pkt_size_avg',
-            'init_fwd_win_byts', 'init_bwd_win_byts', 'active_max', 'active_min',
-            'active_mean', 'active_std', 'idle_max', 'idle_min', 'idle_mean', 'idle_std',
-            'fwd_byts_b_avg', 'fwd_pkts_b_avg', 'bwd_byts_b_avg', 'bwd_pkts_b_avg',
-            'fwd_blk_rate_avg', 'bwd_blk_rate_avg', 'fwd_seg_size_avg', 'bwd_seg_size_avg',
-            'cwr_flag_count', 'subflow_fwd_pkts', 'subflow_bwd_pkts', 'subflow_fwd_byts', 'subflow_bwd_byts'
-        ]
-        
         # Open the output file for writing
         with open(output_file, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=header, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
-            writer.writeheader()
+            sink = BatchedCsvSink(f, fields=FEATURE_NAMES)
             
-            # Generate a flow session class with a custom handler
             def flow_handler(flow_data):
-                # Format the flow data to match command-line output
-                formatted_data = format_flow_data(flow_data)
-                
-                # Ensure all fields are present in the output
-                row = {}
-                for field in header:
-                    row[field] = formatted_data.get(field, 0)
-                
-                # Write the row
-                writer.writerow(row)
-                f.flush()
+                # Buffered; formatted to match command-line output when the batch is written
+                if flow_data['protocol'] in FLOW_PROTOCOLS:
+                    sink.write(flow_data)
             
-            # Generate the flow session class with our handler
-            FlowSession = generate_session_class("flow", None, None)
+            # Finished flows, and those still live at the end of the capture, go to flow_handler
+            extractor = FullFlowExtractor(on_flow=flow_handler)
             
-            # Create an async sniffer to process the pcap file
-            sniffer = AsyncSniffer(
-                offline=pcap_file,
-                filter="ip and (tcp or udp)",
-                prn=None,
-                session=FlowSession,
-                store=False
-            )
-            
-            # Start the sniffer
             logger.info("Starting packet processing...")
-            sniffer.start()
-            
             try:
-                # Wait for the sniffer to finish
-                sniffer.join()
+                extractor.process_pcap(pcap_file)
             except KeyboardInterrupt:
                 logger.warning("Process interrupted by user")
-                sniffer.stop()
             except Exception as e:
                 logger.error(f"Error during packet processing: {str(e)}")
                 return False
             finally:
-                sniffer.join()
+                sink.close()
+                logger.info(f"Wrote {sink.rows} flows ({sink.rows_per_second:.0f} rows/s)")
         
         # Verify output file was created and has content
         if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
@@ -27,6 +27,8 @@ from datetime import datetime, timedelta
 
 # Import the flow extractor
 from gui_flow_extractor_full import FullFlowExtractor
+from live_capture import FollowSource
+from flow_writer import read_flows, PARQUET_EXTENSIONS
 
 import threading
 import webbrowser
@@ -132,7 +134,7 @@ def create_layout():
                                                 id='upload-pcap',
                                                 children=html.Div([
                                                     'Drag and Drop or ', 
-                                                    html.A('Select PCAP File')
+                                                    html.A('Select PCAP or Flow File')
                                                 ]),
                                                 style={
                                                     'width': '100%',
@@ -413,7 +415,13 @@ def create_layout():
 app.layout = create_layout()
 
 # Helper function to process PCAP file in a separate thread
-def process_pcap_file(pcap_path):
+def process_pcap_file(pcap_path, follow=False, rotate=None):
+    """Extract the flows of pcap_path into flow_data.
+    
+    With follow=True the file is read as it is written (and, with a rotate glob,
+    the files a rotating capture moves on to) until should_stop is set, and
+    the flows that ended are appended to flow_data every second.
+    """
     global flow_data, should_stop, pcap_file
     
     print(f"[DEBUG] Starting PCAP processing for: {pcap_path}")
@@ -423,19 +431,54 @@ def process_pcap_file(pcap_path):
         print(f"[ERROR] PCAP file not found: {pcap_path}")
         return
         
-    if os.path.getsize(pcap_path) == 0:
+    if os.path.getsize(pcap_path) == 0 and not follow:
         print(f"[ERROR] PCAP file is empty: {pcap_path}")
         return
     
     try:
+        # Flow files exported earlier (Parquet or CSV) load without re-processing
+        if get_file_extension(pcap_path) in PARQUET_EXTENSIONS + ('.csv',):
+            with flow_data_lock:
+                flow_data = read_flows(pcap_path)
+            print(f"[DEBUG] Loaded {len(flow_data)} flow records from {pcap_path}")
+            return
+        
         print("[DEBUG] Initializing FullFlowExtractor...")
         extractor = FullFlowExtractor()
         print(f"[DEBUG] Starting analysis of {pcap_path}...")
         
+        if follow:
+            # Flows are appended to flow_data as they end, on every tick, so the dashboard
+            # keeps pace with the capture and each refresh costs only the new flows
+            new_flows = []
+            extractor.on_flow = new_flows.append
+            
+            def publish_new_flows():
+                global flow_data
+                if not new_flows:
+                    return
+                frame = pd.DataFrame(new_flows)
+                new_flows.clear()
+                with flow_data_lock:
+                    flow_data = frame if flow_data.empty else pd.concat([flow_data, frame],
+                                                                        ignore_index=True)
+            
+            def live_progress(packets, elapsed_time):
+                publish_new_flows()
+                return not should_stop
+            
+            with flow_data_lock:
+                flow_data = pd.DataFrame()
+            with FollowSource(pcap_path, rotate=rotate) as source:
+                extractor.process_live(source, live_progress)
+            publish_new_flows()  # the flows still live at the stop
+            print(f"[DEBUG] Followed capture ended with {len(flow_data)} flow records")
+            return
+        
         # Process the PCAP file with progress updates
-        def progress_callback(current, total):
-            if current % 100 == 0:  # Print progress every 100 packets
-                print(f"[DEBUG] Processed {current}/{total} packets")
+        def progress_callback(bytes_read, bytes_total, packets, elapsed_time, memory_usage):
+            print(f"[DEBUG] Processed {packets} packets ({bytes_read}/{bytes_total} bytes)")
+            return not should_stop
         
         # Process the PCAP file
         extractor.process_pcap(pcap_path, progress_callback=progress_callback)
@@ -925,7 +968,16 @@ if __name__ == '__main__':
     
     parser = argparse.ArgumentParser(description='Run the MNITJFlowMeter Real-time Analysis Dashboard')
     parser.add_argument('--port', type=int, default=8050, help='Port to run the server on')
+    parser.add_argument('--follow', metavar='PCAP',
+                        help='Follow a capture file that is still being written while the dashboard runs')
+    parser.add_argument('--rotate', metavar='PATTERN',
+                        help='With --follow, continue with newer files matching this glob '
+                             '(rotating tcpdump -C/-G captures)')
     args = parser.parse_args()
     
+    if args.follow:
+        threading.Thread(target=process_pcap_file, args=(args.follow,),
+                         kwargs={'follow': True, 'rotate': args.rotate}, daemon=True).start()
+    
     print(f"Starting server on port {args.port}")
     app.run(debug=True, host='localhost', port=args.port)
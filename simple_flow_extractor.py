@@ -7,6 +7,9 @@ from scapy.layers.inet import IP, TCP, UDP
 from scapy.layers.l2 import Ether
 import logging
 from datetime import datetime
+from flow_stats import retain_packet
+from flow_table import FlowTable, EXPIRY_CHECK_PACKETS
+from cancellation import CancelToken
 
 # Configure logging
 logging.basicConfig(
@@ -20,8 +23,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class SimpleFlow:
-    def __init__(self, packet, direction):
+    def __init__(self, packet, direction, retain_packets=0):
         """Initialize a new flow with the first packet."""
+        self.retain_packets = retain_packets  # Summaries of the first N packets (0 = keep none)
         self.packets = []
         self.start_time = packet.time
         self.end_time = packet.time
@@ -47,7 +51,7 @@ class SimpleFlow:
     
     def add_packet(self, packet, direction):
         """Add a packet to the flow."""
-        self.packets.append((packet, direction))
+        retain_packet(self.packets, self.retain_packets, packet, direction)
         self.end_time = packet.time
         self.packet_count += 1
         self.byte_count += len(packet)
@@ -77,11 +81,21 @@ class SimpleFlow:
         }
 
 class SimpleFlowExtractor:
-    def __init__(self, output_file):
+    def __init__(self, output_file, retain_packets=0, cancel_token=None):
         """Initialize the flow extractor."""
         self.output_file = output_file
-        self.flows = {}
         self.flow_timeout = 60  # seconds
+        # Live flows; a flow idle for flow_timeout seconds ends and a new one starts
+        self.flows = FlowTable(idle_timeout=self.flow_timeout, active_timeout=None,
+                               start_attr='start_time', last_seen_attr='end_time',
+                               bidirectional=False)
+        self.completed_flows = []
+        self.retain_packets = retain_packets  # Packet summaries kept per flow
+        self.cancel_token = cancel_token if cancel_token is not None else CancelToken()
+    
+    def cancel(self):
+        """Stop a running process_pcap at the next packet; the flows so far are written"""
+        self.cancel_token.cancel()
     
     def get_flow_key(self, packet, direction):
         """Generate a flow key based on packet 5-tuple and direction."""
@@ -109,7 +123,11 @@ class SimpleFlowExtractor:
         logger.info(f"Read {len(packets)} packets from {pcap_file}")
         
         # Process each packet
+        cancel_token = self.cancel_token
         for i, packet in enumerate(packets):
+            if cancel_token.cancelled:
+                logger.info(f"Stopped after {i} packets")
+                break
             try:
                 if IP not in packet:
                     continue
@@ -122,9 +140,13 @@ class SimpleFlowExtractor:
                 if not flow_key:
                     continue
                 
+                # End flows that have timed out before this packet
+                self._expire_flow(flow_key, packet.time)
+                
                 # Check if this packet belongs to an existing flow
                 if flow_key in self.flows:
                     flow = self.flows[flow_key]
+                    self.flows.touch(flow_key)
                 else:
                     # Check for reverse flow
                     reverse_key = (
@@ -135,16 +157,22 @@ class SimpleFlowExtractor:
                         'reverse' if direction == 'forward' else 'forward'
                     )
                     
+                    self._expire_flow(reverse_key, packet.time)
                     if reverse_key in self.flows:
                         flow = self.flows[reverse_key]
+                        self.flows.touch(reverse_key)
                     else:
                         # Create a new flow
-                        flow = SimpleFlow(packet, direction)
+                        flow = SimpleFlow(packet, direction, self.retain_packets)
                         self.flows[flow_key] = flow
                 
                 # Add packet to flow
                 flow.add_packet(packet, direction)
                 
+                # Move idle flows to the completed flows
+                if (i + 1) % EXPIRY_CHECK_PACKETS == 0:
+                    self.completed_flows.extend(flow for _, flow in self.flows.pop_expired(packet.time))
+                
                 # Log progress
                 if (i + 1) % 100 == 0:
                     logger.debug(f"Processed {i+1} packets")
@@ -152,14 +180,25 @@ class SimpleFlowExtractor:
             except Exception as e:
                 logger.error(f"Error processing packet {i+1}: {str(e)}")
         
-        logger.info(f"Processing completed. Found {len(self.flows)} flows.")
+        logger.info(f"Processing completed. Found {len(self.get_flows())} flows.")
         
         # Write flows to CSV
         self.write_flows_to_csv()
     
+    def _expire_flow(self, flow_key, now):
+        """Move the flow under flow_key to the completed flows if it has timed out"""
+        flow = self.flows.get(flow_key)
+        if flow is not None and self.flows.is_expired(flow, now):
+            self.completed_flows.append(self.flows.pop(flow_key))
+    
+    def get_flows(self):
+        """All flows, completed and live"""
+        return self.completed_flows + list(self.flows.values())
+    
     def write_flows_to_csv(self):
         """Write flow statistics to a CSV file."""
-        if not self.flows:
+        flows = self.get_flows()
+        if not flows:
             logger.warning("No flows to write")
             return
         
@@ -172,7 +211,7 @@ class SimpleFlowExtractor:
         try:
             with open(self.output_file, 'w', newline='') as f:
                 writer = None
-                for flow in self.flows.values():
+                for flow in flows:
                     data = flow.get_data()
                     if writer is None:
                         writer = csv.DictWriter(f, fieldnames=data.keys())
@@ -189,32 +228,33 @@ class SimpleFlowExtractor:
     
     def print_summary(self):
         """Print a summary of the extracted flows."""
-        if not self.flows:
+        flows = self.get_flows()
+        if not flows:
             print("No flows to summarize")
             return
         
-        total_packets = sum(flow.packet_count for flow in self.flows.values())
-        total_bytes = sum(flow.byte_count for flow in self.flows.values())
+        total_packets = sum(flow.packet_count for flow in flows)
+        total_bytes = sum(flow.byte_count for flow in flows)
         avg_packet_size = total_bytes / total_packets if total_packets > 0 else 0
         
         print("\nFlow Statistics Summary:")
-        print(f"- Total flows: {len(self.flows)}")
+        print(f"- Total flows: {len(flows)}")
         print(f"- Total packets: {total_packets}")
         print(f"- Total bytes: {total_bytes}")
         print(f"- Average packet size: {avg_packet_size:.2f} bytes")
         
         # Print protocol distribution
         protocols = defaultdict(int)
-        for flow in self.flows.values():
+        for flow in flows:
             protocols[flow.protocol] += 1
         
         print("\nProtocol distribution:")
         for proto, count in protocols.items():
-            print(f"- {proto}: {count} flows ({(count / len(self.flows)) * 100:.1f}%)")
+            print(f"- {proto}: {count} flows ({(count / len(flows)) * 100:.1f}%)")
         
         # Print top talkers
         print("\nTop talkers by packet count:")
-        sorted_flows = sorted(self.flows.values(), key=lambda x: x.packet_count, reverse=True)
+        sorted_flows = sorted(flows, key=lambda x: x.packet_count, reverse=True)
         for flow in sorted_flows[:5]:
             print(f"- {flow.src_ip}:{flow.src_port} -> {flow.dst_ip}:{flow.dst_port} "
                   f"({flow.protocol}): {flow.packet_count} packets, {flow.byte_count} bytes")
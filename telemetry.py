@@ -0,0 +1,106 @@
+"""
+Low-overhead telemetry and garbage collector tuning for capture ingest.
+
+TelemetrySampler measures the process's memory on its own daemon thread every
+interval seconds; packet loops and progress callbacks read the cached sample
+instead of making a psutil system call per chunk.
+
+ingest_gc keeps the cyclic garbage collector out of the way while a capture
+is ingested. The flow table holds a great many long-lived objects, and with
+the default thresholds the collector keeps rescanning all of them as new
+flows are allocated. gc.freeze() moves the objects that already exist out of
+its reach and the raised thresholds make collections rare; both are undone
+when the ingest ends.
+"""
+import gc
+import threading
+from contextlib import contextmanager
+
+import psutil
+
+TELEMETRY_INTERVAL = 1.0  # seconds between memory samples
+
+# gc.set_threshold() values used during ingest (defaults are 700, 10, 10)
+INGEST_GC_THRESHOLDS = (100000, 50, 100)
+
+_gc_lock = threading.Lock()
+_gc_depth = 0  # nested or concurrent ingests; the outermost one restores the settings
+_gc_saved = None
+
+
+def get_memory_usage():
+    """Get current process memory usage in MB"""
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class TelemetrySampler:
+    """Samples the process's memory every interval seconds on a background thread.
+
+    memory_mb and peak_memory_mb hold the latest and the highest sample;
+    on_sample(memory_mb) is called from the sampler thread after each one.
+    A falsy interval samples only on start() and stop().
+    """
+
+    def __init__(self, interval=TELEMETRY_INTERVAL, on_sample=None):
+        self.interval = interval
+        self.on_sample = on_sample
+        self.memory_mb = 0.0
+        self.peak_memory_mb = 0.0
+        self._process = psutil.Process()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Take a memory sample now and return it (MB)"""
+        memory_mb = self._process.memory_info().rss / (1024 * 1024)
+        self.memory_mb = memory_mb
+        if memory_mb > self.peak_memory_mb:
+            self.peak_memory_mb = memory_mb
+        if self.on_sample is not None:
+            self.on_sample(memory_mb)
+        return memory_mb
+
+    def start(self):
+        self.sample()
+        if self.interval:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+@contextmanager
+def ingest_gc(thresholds=INGEST_GC_THRESHOLDS):
+    """Freeze the existing objects and raise the GC thresholds for the duration of an ingest"""
+    global _gc_depth, _gc_saved
+    with _gc_lock:
+        if _gc_depth == 0:
+            _gc_saved = gc.get_threshold()
+            gc.freeze()
+            gc.set_threshold(*thresholds)
+        _gc_depth += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_depth -= 1
+            if _gc_depth == 0:
+                gc.set_threshold(*_gc_saved)
+                gc.unfreeze()
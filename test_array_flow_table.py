@@ -0,0 +1,18 @@
+"""The NumPy structure-of-arrays engine extracts the same flows as the object engine."""
+import pandas as pd
+import pytest
+
+from conftest import extract_flows, sort_flows
+
+
+@pytest.mark.parametrize('chunk_size', [100000, 5])
+def test_array_flows_match_object_engine(pcap_file, reference_flows, chunk_size):
+    flows = sort_flows(extract_flows(pcap_file, engine='arrays', chunk_size=chunk_size))
+    # The arrays engine keeps ports and counters in narrower integer columns
+    pd.testing.assert_frame_equal(flows, reference_flows, check_dtype=False)
+
+
+def test_arrays_on_flow_rows_match_dataframe(pcap_file, reference_flows):
+    rows = []
+    extract_flows(pcap_file, engine='arrays', on_flow=rows.append)
+    pd.testing.assert_frame_equal(sort_flows(pd.DataFrame(rows)), reference_flows, check_dtype=False)
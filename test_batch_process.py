@@ -0,0 +1,83 @@
+"""Tests for batch_process: per-file and combined CSV output."""
+import contextlib
+import csv
+import io
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from batch_process import EXTRACTORS, _extractor_class, process_batch, process_capture
+from conftest import ETH_HEADER, write_pcap
+
+
+@pytest.fixture
+def capture_dir(tmp_path, pcap_file, pcapng_file):
+    """The synthetic capture in both formats plus captures without any flows"""
+    directory = tmp_path / 'captures'
+    directory.mkdir()
+    shutil.copy(pcap_file, directory / 'a.pcap')
+    shutil.copy(pcapng_file, directory / 'b.pcapng')
+    write_pcap(directory / 'empty.pcap', [])
+    arp = ETH_HEADER + b'\x08\x06' + b'\x00' * 28
+    write_pcap(directory / 'arp.pcap', [(1700000000000000, arp)])
+    return directory
+
+
+def run_batch(*args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return process_batch(*args, jobs=2, **kwargs)
+
+
+@pytest.mark.parametrize('extractor', sorted(EXTRACTORS))
+def test_combined_csv(capture_dir, tmp_path, extractor):
+    combined = tmp_path / 'all_flows.csv'
+    results = run_batch([str(capture_dir)], combined_file=str(combined), extractor=extractor)
+    assert not any(r['error'] for r in results)
+    flows = {os.path.basename(r['file']): r['flows'] for r in results}
+    assert flows['empty.pcap'] == flows['arp.pcap'] == 0
+    assert flows['a.pcap'] == flows['b.pcapng'] > 0
+
+    columns = _extractor_class(extractor)().flow_columns()
+    with open(combined, newline='') as f:
+        assert next(csv.reader(f)) == ['pcap_file'] + columns
+    frame = pd.read_csv(combined)
+    assert frame['pcap_file'].value_counts().to_dict() == {'a.pcap': flows['a.pcap'],
+                                                           'b.pcapng': flows['b.pcapng']}
+    # Both formats hold the same traffic, so their rows match column for column
+    pcap_rows = frame[frame['pcap_file'] == 'a.pcap'].drop(columns='pcap_file')
+    pcapng_rows = frame[frame['pcap_file'] == 'b.pcapng'].drop(columns='pcap_file')
+    pd.testing.assert_frame_equal(pcap_rows.reset_index(drop=True),
+                                  pcapng_rows.reset_index(drop=True))
+
+
+def test_combined_csv_with_only_empty_captures(capture_dir, tmp_path):
+    combined = tmp_path / 'all_flows.csv'
+    run_batch([str(capture_dir / 'empty.pcap'), str(capture_dir / 'arp.pcap')],
+              combined_file=str(combined))
+    with open(combined, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [['pcap_file'] + _extractor_class('full')().flow_columns()]
+
+
+def test_per_file_outputs(capture_dir, tmp_path):
+    output_dir = tmp_path / 'flows'
+    results = run_batch([str(capture_dir / '*.pcap*')], output_dir=str(output_dir))
+    assert sorted(path.name for path in output_dir.iterdir()) == [
+        'a_flows.csv', 'arp_flows.csv', 'b_flows.csv', 'empty_flows.csv']
+    for r in results:
+        if r['flows']:
+            assert len(pd.read_csv(r['output'])) == r['flows']
+
+
+def test_flows_are_streamed_to_the_output(pcap_file, tmp_path, monkeypatch):
+    def no_frame(self):
+        raise AssertionError("process_capture built the flow DataFrame")
+
+    monkeypatch.setattr(_extractor_class('full'), 'get_flow_dataframe', no_frame)
+    output = tmp_path / 'flows.csv'
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = process_capture((pcap_file, str(output), 'full', {}))
+    assert stats['error'] is None
+    assert stats['flows'] == len(pd.read_csv(output)) == 61
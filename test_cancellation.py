@@ -0,0 +1,49 @@
+"""Cooperative cancellation of the packet sources and flow extractors."""
+import contextlib
+import io
+
+import pytest
+
+from cancellation import CancelToken
+from gui_flow_extractor_full import FullFlowExtractor
+from optimized_flow_extractor import OptimizedFlowExtractor
+from pcap_decoder import PacketSource
+
+CHUNK_SIZE = 20
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def test_cancel_token_stops_packet_source(pcap_file):
+    token = CancelToken()
+    records = []
+    with PacketSource(pcap_file, cancel_token=token) as source:
+        for record in source:
+            records.append(record)
+            if len(records) == 10:
+                token.cancel()
+    assert len(records) == 10
+    token.reset()
+    assert not token.cancelled
+
+
+@pytest.mark.parametrize('extractor_cls', [FullFlowExtractor, OptimizedFlowExtractor])
+def test_cancel_keeps_flows_gathered_so_far(pcap_file, frames, extractor_cls):
+    token = CancelToken()
+    token.cancel()
+    extractor = extractor_cls(cancel_token=token)
+    quiet(extractor.process_pcap, pcap_file)
+    assert extractor.get_flow_dataframe().empty
+
+    token.reset()
+    stops = iter([True, False])  # stop at the second progress report
+    extractor = extractor_cls(chunk_size=CHUNK_SIZE, cancel_token=token)
+    quiet(extractor.process_pcap, pcap_file, lambda *_: next(stops, True))
+    assert token.cancelled
+    frame = extractor.get_flow_dataframe()
+    packets = ((frame['tot_fwd_pkts'] + frame['tot_bwd_pkts']).sum()
+               if extractor_cls is FullFlowExtractor else frame['total_packets'].sum())
+    assert packets == 2 * CHUNK_SIZE < len(frames)
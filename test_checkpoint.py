@@ -0,0 +1,121 @@
+"""Checkpoint/resume of the flow extractors."""
+import contextlib
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from flow_writer import CsvFlowWriter, read_flows
+from gui_flow_extractor_full import FullFlowExtractor
+from pcap_decoder import PcapMmapReader, PcapStreamReader
+
+IDLE_TIMEOUT = 10
+CHUNK_SIZE = 20
+
+
+class Crash(Exception):
+    """Stands in for the process being killed"""
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def normalise(frame):
+    return frame.sort_values(['flow_id', 'timestamp']).reset_index(drop=True)
+
+
+def as_csv(frame):
+    """frame with the dtypes it has after a CSV round trip"""
+    return pd.read_csv(io.StringIO(frame.to_csv(index=False)))
+
+
+@pytest.fixture(scope='module')
+def reference(pcap_file):
+    extractor = FullFlowExtractor(idle_timeout=IDLE_TIMEOUT)
+    quiet(extractor.process_pcap, pcap_file)
+    return normalise(as_csv(extractor.get_flow_dataframe()))
+
+
+def checkpointed(checkpoint, engine, **kwargs):
+    return FullFlowExtractor(idle_timeout=IDLE_TIMEOUT, engine=engine, chunk_size=CHUNK_SIZE,
+                             checkpoint_path=str(checkpoint), checkpoint_interval=0, **kwargs)
+
+
+def resume(pcap_file, checkpoint, output, engine):
+    """Continue an interrupted run from its checkpoint, appending to its CSV"""
+    extractor = checkpointed(checkpoint, engine)
+    assert extractor.load_checkpoint(pcap_file)
+    with CsvFlowWriter(str(output), keep_rows=extractor.flows_emitted) as writer:
+        extractor.on_flow = writer.write
+        quiet(extractor.process_pcap, pcap_file)
+    assert not os.path.exists(checkpoint)  # removed once the capture is done
+    return normalise(read_flows(str(output)))
+
+
+@pytest.mark.parametrize('reader', [PcapMmapReader, PcapStreamReader])
+@pytest.mark.parametrize('capture', ['pcap_file', 'pcapng_file'])
+def test_readers_resume_at_offset(request, frames, reader, capture):
+    path = request.getfixturevalue(capture)
+    with reader(path) as source:
+        frames_read = iter(source)
+        for _ in range(100):
+            next(frames_read)
+        offset = source.offset
+    with reader(path, start=offset) as source:
+        rest = [bytes(frame) for _, _, frame in source]
+    assert rest == [frame for _, frame in frames[100:]]
+
+
+@pytest.mark.parametrize('engine', ['object', 'arrays'])
+def test_resume_after_crash(pcap_file, reference, tmp_path, engine):
+    checkpoint, output = tmp_path / 'run.ckpt', tmp_path / 'flows.csv'
+    extractor = checkpointed(checkpoint, engine)
+    calls = 0
+
+    def progress(*_):
+        nonlocal calls
+        calls += 1
+        if calls == 6:
+            raise Crash()
+
+    with CsvFlowWriter(str(output)) as writer:
+        extractor.on_flow = writer.write
+        extractor.on_checkpoint = writer.flush
+        with pytest.raises(Crash), contextlib.redirect_stderr(io.StringIO()):
+            quiet(extractor.process_pcap, pcap_file, progress)
+        writer.write(dict.fromkeys(FullFlowExtractor.flow_columns(), 'after the checkpoint'))
+    assert os.path.exists(checkpoint)
+
+    pd.testing.assert_frame_equal(resume(pcap_file, checkpoint, output, engine), reference)
+
+
+@pytest.mark.parametrize('engine', ['object', 'arrays'])
+@pytest.mark.parametrize('cancel_after_flows', [4, 30])
+def test_resume_after_cancel_inside_a_chunk(pcap_file, reference, tmp_path, engine,
+                                            cancel_after_flows):
+    checkpoint, output = tmp_path / 'run.ckpt', tmp_path / 'flows.csv'
+    extractor = checkpointed(checkpoint, engine)
+    with CsvFlowWriter(str(output)) as writer:
+        def on_flow(features):
+            writer.write(features)
+            if writer.rows == cancel_after_flows:
+                extractor.cancel()
+
+        extractor.on_flow = on_flow
+        extractor.on_checkpoint = writer.flush
+        quiet(extractor.process_pcap, pcap_file)
+    assert extractor.cancel_token.cancelled
+    assert os.path.exists(checkpoint)
+
+    pd.testing.assert_frame_equal(resume(pcap_file, checkpoint, output, engine), reference)
+
+
+def test_checkpoint_needs_on_flow(pcap_file, tmp_path):
+    extractor = checkpointed(tmp_path / 'run.ckpt', 'object')
+    with pytest.raises(ValueError), contextlib.redirect_stderr(io.StringIO()):
+        quiet(extractor.process_pcap, pcap_file)
+    with pytest.raises(ValueError):
+        FullFlowExtractor(checkpoint_path=str(tmp_path / 'run.ckpt'), engine='columnar')
@@ -0,0 +1,17 @@
+"""The vectorized columnar engine extracts the same flows as the object engine."""
+import pandas as pd
+import pytest
+
+from conftest import extract_flows, sort_flows
+
+
+@pytest.mark.parametrize('chunk_size', [100000, 13])
+def test_columnar_flows_match_object_engine(pcap_file, reference_flows, chunk_size):
+    flows = sort_flows(extract_flows(pcap_file, engine='columnar', chunk_size=chunk_size))
+    pd.testing.assert_frame_equal(flows, reference_flows, check_dtype=False)
+
+
+def test_columnar_on_flow_rows_match_dataframe(pcap_file, reference_flows):
+    rows = []
+    extract_flows(pcap_file, engine='columnar', on_flow=rows.append)
+    pd.testing.assert_frame_equal(sort_flows(pd.DataFrame(rows)), reference_flows, check_dtype=False)
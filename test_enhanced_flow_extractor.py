@@ -0,0 +1,90 @@
+"""Tests for EnhancedFlowExtractor: flow modes and per-packet rows."""
+import contextlib
+import io
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from enhanced_flow_extractor import EnhancedFlowExtractor, EnhancedFlowFeatures, PacketDirection
+from gui_flow_extractor_full import FullFlowExtractor
+from pcap_decoder import PacketRecord
+
+
+def extract(extractor, pcap_file):
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor.process_pcap(pcap_file)
+    return extractor.get_flow_dataframe()
+
+
+def test_bidirectional_flows_match_full_extractor(pcap_file):
+    order = ['src_ip', 'src_port', 'dst_ip', 'dst_port', 'protocol']
+    enhanced = extract(EnhancedFlowExtractor(), pcap_file)
+    full = extract(FullFlowExtractor(), pcap_file)
+    assert len(enhanced) == len(full) == 61
+    enhanced = enhanced.sort_values(order + ['start_time']).reset_index(drop=True)
+    full = full.sort_values(order + ['timestamp']).reset_index(drop=True)
+    np.testing.assert_array_equal(enhanced['fwd_pkts_tot'], full['tot_fwd_pkts'])
+    np.testing.assert_array_equal(enhanced['bwd_pkts_tot'], full['tot_bwd_pkts'])
+    np.testing.assert_array_equal(enhanced['fwd_byts_tot'], full['totlen_fwd_pkts'])
+    np.testing.assert_array_equal(enhanced['bwd_byts_tot'], full['totlen_bwd_pkts'])
+
+
+def test_packet_mode_makes_a_flow_per_packet(pcap_file, frames):
+    flows = extract(EnhancedFlowExtractor(flow_mode='packet'), pcap_file)
+    assert len(flows) == len(frames)
+    assert (flows['fwd_pkts_tot'] + flows['bwd_pkts_tot'] == 1).all()
+
+
+def test_packet_rows_are_opt_in(pcap_file, frames):
+    extractor = EnhancedFlowExtractor()
+    extract(extractor, pcap_file)
+    assert extractor.packets == []
+    assert extractor.get_packet_dataframe().empty
+
+    extractor = EnhancedFlowExtractor(keep_packets=True)
+    extract(extractor, pcap_file)
+    packets = extractor.get_packet_dataframe()
+    assert len(packets) == len(frames)
+    assert set(packets['direction']) == {'forward', 'backward'}
+
+
+def test_flow_features_match_full_extractor(pcap_file):
+    extractor = EnhancedFlowExtractor()
+    extract(extractor, pcap_file)
+    full = FullFlowExtractor()
+    extract(full, pcap_file)
+
+    def key(features):
+        return (features['src_ip'], features['src_port'], features['dst_ip'],
+                features['dst_port'], features['protocol'])
+
+    expected = {key(flow.calculate_features()): flow.calculate_features()
+                for flow in full.flows.values()}
+    assert len(extractor.flows) == len(expected)
+    for flow in extractor.flows.values():
+        features = flow.get_flow_features()
+        other = expected[key(features)]
+        for name in ['totlen_fwd_pkts', 'totlen_bwd_pkts', 'fwd_pkt_len_max', 'fwd_pkt_len_min',
+                     'fwd_pkt_len_mean', 'fwd_pkt_len_std', 'bwd_pkt_len_mean', 'bwd_pkt_len_std',
+                     'pkt_len_max', 'pkt_len_min', 'pkt_len_mean', 'pkt_len_std']:
+            assert features[name] == pytest.approx(other[name]), name
+
+
+def test_flow_memory_does_not_grow_with_packets():
+    def packet(i):
+        return PacketRecord(1.0 + i * 0.01, 100 + i % 50, 4, 1, 2, 17, 1000, 53, payload_len=50)
+
+    flow = EnhancedFlowFeatures(packet(0), PacketDirection.FORWARD)
+    for i in range(1, 10):
+        flow.add_packet(packet(i), PacketDirection.FORWARD)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(10, 5000):
+            flow.add_packet(packet(i), PacketDirection.REVERSE if i % 2 else PacketDirection.FORWARD)
+        grown = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert grown < 1024
+    assert flow.get_flow_features()['tot_pkts'] == 5000
@@ -0,0 +1,36 @@
+"""FlowTable's last-seen order: expiry pops only the flows past their timeout."""
+from types import SimpleNamespace
+
+from flow_table import FlowTable
+
+
+def make_flow(start, last_seen=None):
+    return SimpleNamespace(flow_start_time=start,
+                           flow_last_seen=start if last_seen is None else last_seen)
+
+
+def test_pop_expired_returns_idle_flows_oldest_first():
+    table = FlowTable(idle_timeout=10, active_timeout=0)
+    for key, last_seen in [('a', 0.0), ('b', 5.0), ('c', 12.0)]:
+        table[key] = make_flow(0.0, last_seen)
+    expired = table.pop_expired(now=16.0)
+    assert [key for key, _ in expired] == ['a', 'b']
+    assert list(table) == ['c']
+
+
+def test_touch_keeps_a_flow_alive():
+    table = FlowTable(idle_timeout=10, active_timeout=0)
+    table['a'] = make_flow(0.0)
+    table['b'] = make_flow(1.0)
+    table['a'].flow_last_seen = 9.0
+    table.touch('a')
+    assert [key for key, _ in table.pop_expired(now=15.0)] == ['b']
+    assert list(table) == ['a']
+
+
+def test_pop_expired_stops_at_the_first_live_flow():
+    table = FlowTable(idle_timeout=10, active_timeout=0)
+    for i in range(1000):
+        table[i] = make_flow(float(i))
+    assert [key for key, _ in table.pop_expired(now=13.0)] == [0, 1, 2]
+    assert len(table) == 997 and next(iter(table)) == 3
@@ -0,0 +1,61 @@
+"""FlowFeatures.merge and flows that span chunk boundaries."""
+from collections import defaultdict
+
+import pandas as pd
+import pytest
+
+from conftest import extract_flows, sort_flows
+from gui_flow_extractor_full import FlowFeatures
+from pcap_decoder import PacketSource, flow_key
+
+
+def _build(packets, first):
+    """FlowFeatures of packets, directions taken relative to the flow's first packet"""
+    directions = ['forward' if (packet.src, packet.src_port) == (first.src, first.src_port)
+                  else 'backward' for packet in packets]
+    flow = FlowFeatures(packets[0], directions[0])
+    for packet, direction in zip(packets[1:], directions[1:]):
+        flow.add_packet(packet, direction)
+    return flow
+
+
+@pytest.fixture(scope='module')
+def packets(pcap_file):
+    """Records of the longest TCP conversation in the capture"""
+    flows = defaultdict(list)
+    with PacketSource(pcap_file) as source:
+        for record in source:
+            flows[flow_key(record)].append(record)
+    return max(flows.values(), key=len)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7])
+def test_chunked_flows_match_whole_capture(pcap_file, reference_flows, chunk_size):
+    flows = sort_flows(extract_flows(pcap_file, chunk_size=chunk_size))
+    pd.testing.assert_frame_equal(flows, reference_flows)
+
+
+def test_flow_features_merge_matches_whole_flow(packets):
+    whole = _build(packets, packets[0]).calculate_features()
+
+    for split in range(1, len(packets)):
+        for swap in (False, True):
+            head, tail = _build(packets[:split], packets[0]), _build(packets[split:], packets[0])
+            merged = tail.merge(head) if swap else head.merge(tail)
+            assert merged.calculate_features() == pytest.approx(whole, rel=1e-9, abs=1e-9)
+
+
+def test_flow_features_merge_reorients_a_tail_from_the_other_side(packets):
+    first = packets[0]
+    whole = _build(packets, first).calculate_features()
+
+    # Tails built on their own, so their forward direction is the flow's backward
+    splits = [split for split in range(1, len(packets))
+              if (packets[split].src, packets[split].src_port) != (first.src, first.src_port)]
+    assert splits
+    for split in splits:
+        for swap in (False, True):
+            head, tail = _build(packets[:split], first), _build(packets[split:], packets[split])
+            assert tail.src == first.dst
+            merged = tail.merge(head) if swap else head.merge(tail)
+            assert merged.calculate_features() == pytest.approx(whole, rel=1e-9, abs=1e-9)
@@ -0,0 +1,25 @@
+"""Flow-hash sharding across worker processes."""
+import pandas as pd
+import pytest
+
+from conftest import extract_flows, sort_flows
+from flow_sharding import flow_shard
+from pcap_decoder import PacketSource, flow_key
+
+
+def test_both_directions_of_a_flow_share_a_shard(pcap_file):
+    shards = {}
+    with PacketSource(pcap_file) as source:
+        for record in source:
+            assert shards.setdefault(flow_key(record), flow_shard(record, 3)) == flow_shard(record, 3)
+    assert len(set(shards.values())) > 1
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'workers': 3},
+    {'workers': 2, 'engine': 'arrays'},
+], ids=lambda kwargs: ','.join(f'{k}={v}' for k, v in kwargs.items()))
+def test_sharded_flows_match_one_process(pcap_file, reference_flows, kwargs):
+    # The arrays engine keeps ports and counters in narrower integer columns
+    pd.testing.assert_frame_equal(sort_flows(extract_flows(pcap_file, **kwargs)), reference_flows,
+                                  check_dtype=False)
@@ -0,0 +1,39 @@
+"""Tests for flow_spill segments and OptimizedFlowExtractor's spilling of finished flows."""
+import contextlib
+import io
+import os
+
+import pandas as pd
+
+from conftest import optimized_flow_parts
+from flow_spill import flows_to_array, read_segment, records_to_frame, write_segment
+from optimized_flow_extractor import OptimizedFlowExtractor
+
+IDLE_TIMEOUT = 10
+
+
+def extract(pcap_file, **kwargs):
+    extractor = OptimizedFlowExtractor(idle_timeout=IDLE_TIMEOUT, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor.process_pcap(pcap_file)
+    return extractor, extractor.get_flow_dataframe()
+
+
+def normalise(frame):
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def test_segment_round_trip(pcap_file, tmp_path):
+    flows = optimized_flow_parts(pcap_file, pieces=1)
+    path = write_segment(str(tmp_path), 0, flows_to_array(flows))
+    assert os.path.basename(path) == 'flows_000000.npy'
+    expected = pd.DataFrame([flow.to_dict() for flow in flows])
+    pd.testing.assert_frame_equal(records_to_frame(read_segment(path)), expected, check_dtype=False)
+
+
+def test_spilling_does_not_change_flows(pcap_file):
+    _, expected = extract(pcap_file)
+    extractor, frame = extract(pcap_file, max_flows=3)
+    assert len(frame) == 62
+    assert not extractor.flow_files  # segments are removed once read back
+    pd.testing.assert_frame_equal(normalise(frame), normalise(expected))
@@ -0,0 +1,91 @@
+"""Tests for flow_table: idle/active expiry, FIN/RST termination and on_flow."""
+from types import SimpleNamespace
+
+import pandas as pd
+
+from conftest import extract_flows, sort_flows
+from flow_table import FlowTable
+from gui_flow_extractor_full import FullFlowExtractor
+from pcap_decoder import PacketSource, IPPROTO_TCP, TCP_ACK, TCP_FIN, TCP_RST
+
+
+def make_flow(start, last_seen=None):
+    return SimpleNamespace(flow_start_time=start,
+                           flow_last_seen=start if last_seen is None else last_seen)
+
+
+def test_is_expired_idle_and_active():
+    table = FlowTable(idle_timeout=10, active_timeout=100)
+    assert not table.is_expired(make_flow(0.0, 5.0), now=15.0)
+    assert table.is_expired(make_flow(0.0, 5.0), now=15.5)  # idle
+    assert table.is_expired(make_flow(0.0, 99.0), now=100.5)  # active
+    disabled = FlowTable(idle_timeout=0, active_timeout=None)
+    assert not disabled.is_expired(make_flow(0.0), now=1e9)
+    assert disabled.pop_expired(now=1e9) == []
+
+
+def test_fin_needs_both_directions():
+    table = FlowTable()
+    table['a'] = make_flow(0.0)
+    assert not table.ends_flow('a', TCP_ACK, 'forward')
+    assert not table.ends_flow('a', TCP_FIN | TCP_ACK, 'forward')
+    assert not table.ends_flow('a', TCP_FIN | TCP_ACK, 'forward')  # a retransmitted FIN
+    assert table.fin_state('a') == {'forward'}
+    assert table.ends_flow('a', TCP_FIN | TCP_ACK, 'backward')
+
+
+def test_rst_and_unidirectional_fin_end_at_once():
+    table = FlowTable()
+    table['a'] = make_flow(0.0)
+    assert table.ends_flow('a', TCP_RST, 'backward')
+    unidirectional = FlowTable(bidirectional=False)
+    unidirectional['a'] = make_flow(0.0)
+    assert unidirectional.ends_flow('a', TCP_FIN, 'forward')
+
+
+def test_fin_state_is_dropped_with_the_flow_and_restored():
+    table = FlowTable()
+    table['a'] = make_flow(0.0)
+    table.ends_flow('a', TCP_FIN, 'forward')
+    state = table.fin_state('a')
+    table.pop('a')
+    assert table.fin_state('a') == frozenset()
+    table['a'] = make_flow(1.0)
+    table.restore_fin_state('a', state)
+    assert table.ends_flow('a', TCP_FIN, 'backward')
+
+
+def test_extractor_ends_flows_on_fin_rst_and_idle_gap(pcap_file):
+    extractor = FullFlowExtractor(idle_timeout=10)
+    with PacketSource(pcap_file) as source:
+        extractor.process_records(list(source))
+    finished = extractor.completed_flows
+    live = [flow.calculate_features() for flow in extractor.flows.values()]
+
+    # Every TCP conversation is closed by FIN/FIN or a RST; nothing else is
+    tcp = [flow for flow in finished if flow['protocol'] == IPPROTO_TCP]
+    assert len(tcp) == 25
+    assert sum(flow['rst_flag_cnt'] > 0 for flow in tcp) == 5
+    assert len(finished) == 25 + 1
+    # The last ACK after a FIN/FIN close starts a flow of its own, as in CICFlowMeter
+    trailing = [flow for flow in live if flow['protocol'] == IPPROTO_TCP]
+    assert len(trailing) == 20
+    assert all((flow['tot_fwd_pkts'], flow['ack_flag_cnt'], flow['fin_flag_cnt']) == (1, 1, 0)
+               for flow in trailing)
+
+    # The conversation that pauses past the idle timeout is two flows
+    gap = [flow for flow in finished + live if flow['dst_port'] == 7001]
+    assert [flow['tot_fwd_pkts'] for flow in gap] == [3, 3]
+    assert gap[0] in finished and gap[1] in live
+
+
+def test_reference_flows(reference_flows, frames):
+    assert len(reference_flows) == 62
+    assert list(reference_flows.columns) == FullFlowExtractor.flow_columns()
+    assert (reference_flows['tot_fwd_pkts'] + reference_flows['tot_bwd_pkts']).sum() == len(frames)
+
+
+def test_on_flow_rows_match_dataframe(pcap_file, reference_flows):
+    rows = []
+    extract_flows(pcap_file, on_flow=rows.append)
+    pd.testing.assert_frame_equal(sort_flows(pd.DataFrame(rows)), reference_flows)
@@ -0,0 +1,54 @@
+"""Tail-follow mode: reading captures that are still being written or rotated."""
+import os
+
+from conftest import write_pcap
+from live_capture import FollowSource, numbered_rotation
+from pcap_decoder import PcapFollowReader
+
+
+def test_follow_reader_waits_for_partial_records(tmp_path, frames):
+    complete = tmp_path / 'complete.pcap'
+    write_pcap(complete, frames)
+    data = complete.read_bytes()
+    growing = tmp_path / 'growing.pcap'
+    cut = len(data) // 2  # almost certainly inside a record
+    growing.write_bytes(data[:cut])
+
+    reader = PcapFollowReader(str(growing), poll_interval=0)
+    read = []
+    for frame in reader:
+        if frame is None:
+            if reader.finishing:
+                continue
+            # The writer catches up; the partial record is read again whole
+            assert reader.offset <= cut
+            with open(growing, 'ab') as f:
+                f.write(data[cut:])
+            reader.finish()
+            continue
+        read.append(bytes(frame[2]))
+    assert read == [frame for _, frame in frames]
+    assert reader.offset == len(data)
+
+
+def test_follow_source_continues_with_numbered_rotation(tmp_path, frames):
+    path = tmp_path / 'capture.pcap'
+    half = len(frames) // 2
+    write_pcap(path, frames[:half])
+    write_pcap(tmp_path / 'capture.pcap.bak', frames[:10])  # not part of the rotation
+    write_pcap(tmp_path / 'capture.pcap1', frames[half:])
+    for i, name in enumerate(['capture.pcap', 'capture.pcap1', 'capture.pcap.bak']):
+        os.utime(tmp_path / name, (1000 + i, 1000 + i))
+
+    records = []
+    polls = 0
+    with FollowSource(str(path), poll_interval=0, rotate=numbered_rotation(str(path))) as source:
+        for record in source:
+            if record is not None:
+                records.append(record)
+                continue
+            polls += 1
+            if len(records) >= len(frames) or polls > 100:
+                break
+    assert [record.time for record in records] == [stamp / 1e6 for stamp, _ in frames]
+    assert source.path == str(tmp_path / 'capture.pcap1')
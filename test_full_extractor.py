@@ -23,10 +23,9 @@ def main():
     extractor = FullFlowExtractor()
     
     # Progress callback function
-    def progress_callback(current, total):
-        elapsed = time.time() - start_time
-        rate = current / elapsed if elapsed > 0 else 0
-        print(f"\r[+] Processed {current:,} packets ({current/total*100:.1f}%) - "
+    def progress_callback(bytes_read, bytes_total, packets, elapsed, memory_usage):
+        rate = packets / elapsed if elapsed > 0 else 0
+        print(f"\r[+] Processed {packets:,} packets ({bytes_read/max(bytes_total, 1)*100:.1f}%) - "
               f"{rate:,.1f} pkt/s - {elapsed:.1f}s elapsed", end='')
     
     try:
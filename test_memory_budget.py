@@ -0,0 +1,55 @@
+"""OptimizedFlowExtractor under a memory budget: live flows are spilled and continued."""
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from gui_flow_extractor_full import FullFlowExtractor
+from optimized_flow_extractor import OptimizedFlowExtractor
+
+IDLE_TIMEOUT = 10
+MAX_MEMORY_MB = 0.03  # room for about 28 flows, so live flows must be spilled
+
+
+def extract(pcap_file, extractor_cls=OptimizedFlowExtractor, **kwargs):
+    extractor = extractor_cls(idle_timeout=IDLE_TIMEOUT, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor.process_pcap(pcap_file)
+    return extractor, extractor.get_flow_dataframe()
+
+
+def normalise(frame):
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def test_budget_spills_live_flows_without_changing_them(pcap_file):
+    _, expected = extract(pcap_file)
+    extractor = OptimizedFlowExtractor(idle_timeout=IDLE_TIMEOUT, max_memory_mb=MAX_MEMORY_MB,
+                                       chunk_size=20)
+    peak_bytes = peak_spilled = 0
+
+    def progress(*_):
+        nonlocal peak_bytes, peak_spilled
+        peak_bytes = max(peak_bytes, extractor.flow_bytes)
+        peak_spilled = max(peak_spilled, len(extractor.spilled_flows))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor.process_pcap(pcap_file, progress)
+    frame = extractor.get_flow_dataframe()
+    assert 0 < peak_bytes <= extractor.memory_budget
+    assert peak_spilled > 0
+    assert len(frame) == 62
+    assert not extractor.flow_files  # segments are removed once read back
+    pd.testing.assert_frame_equal(normalise(frame), normalise(expected))
+
+
+def test_average_iat_matches_full_extractor(pcap_file):
+    _, optimized = extract(pcap_file, max_memory_mb=MAX_MEMORY_MB)
+    _, full = extract(pcap_file, FullFlowExtractor)
+    order = ['src_ip', 'src_port', 'dst_ip', 'dst_port', 'protocol', 'flow_duration']
+    optimized = optimized.sort_values(order).reset_index(drop=True)
+    full = full.sort_values(order).reset_index(drop=True)
+    assert (optimized['fwd_avg_iat'] > 0).any()
+    np.testing.assert_allclose(optimized['fwd_avg_iat'], full['fwd_iat_mean'], atol=1e-9)
+    np.testing.assert_allclose(optimized['bwd_avg_iat'], full['bwd_iat_mean'], atol=1e-9)
@@ -0,0 +1,35 @@
+"""Packet retention: flows keep summaries of their first packets only when asked."""
+import pandas as pd
+
+from conftest import extract_flows, sort_flows
+from flow_stats import PacketSummary
+from gui_flow_extractor_full import FullFlowExtractor
+from pcap_decoder import PacketSource
+
+RETAIN_PACKETS = 4
+
+
+def live_flows(pcap_file, **kwargs):
+    extractor = FullFlowExtractor(**kwargs)
+    with PacketSource(pcap_file) as source:
+        extractor.process_records(list(source))
+    return list(extractor.flows.values())
+
+
+def test_flows_keep_no_packets_by_default(pcap_file):
+    assert all(flow.packets == [] for flow in live_flows(pcap_file))
+
+
+def test_flows_keep_summaries_of_their_first_packets(pcap_file):
+    flows = live_flows(pcap_file, retain_packets=RETAIN_PACKETS)
+    for flow in flows:
+        assert 0 < len(flow.packets) <= RETAIN_PACKETS
+        assert all(isinstance(summary, PacketSummary) for summary in flow.packets)
+        assert flow.packets[0].time == flow.flow_start_time
+        assert flow.packets[0].direction == 'forward'
+    assert any(len(flow.packets) == RETAIN_PACKETS for flow in flows)
+
+
+def test_retained_packets_do_not_change_flows(pcap_file, reference_flows):
+    flows = sort_flows(extract_flows(pcap_file, retain_packets=RETAIN_PACKETS))
+    pd.testing.assert_frame_equal(flows, reference_flows)
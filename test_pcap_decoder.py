@@ -0,0 +1,86 @@
+"""Tests for pcap_decoder: frame decoding and PacketSource."""
+import io
+import os
+import struct
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from conftest import ETH_HEADER, ipv4_packet, ipv6_packet, tcp_segment, udp_datagram
+from gui_flow_extractor_full import FullFlowExtractor
+from pcap_decoder import (
+    PacketSource, UnsupportedFrame, decode_frame, IPPROTO_TCP, IPPROTO_UDP, TCP_ACK, TCP_PSH
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LINKTYPE_ETHERNET = 1
+
+
+def extract(pcap_file, **kwargs):
+    extractor = FullFlowExtractor(**kwargs)
+    extractor.process_pcap(pcap_file)
+    return extractor.get_flow_dataframe()
+
+
+def test_scapy_decoder_in_fresh_process(pcap_file, tmp_path):
+    # A fresh interpreter: nothing else has imported scapy.all and registered the link layers
+    output = tmp_path / 'scapy.csv'
+    script = (
+        "import sys\n"
+        "from gui_flow_extractor_full import FullFlowExtractor\n"
+        "extractor = FullFlowExtractor(decoder='scapy')\n"
+        "extractor.process_pcap(sys.argv[1])\n"
+        "extractor.get_flow_dataframe().to_csv(sys.argv[2], index=False)\n"
+    )
+    subprocess.run([sys.executable, '-c', script, pcap_file, str(output)],
+                   cwd=HERE, check=True, capture_output=True)
+    scapy_frame = pd.read_csv(output)
+
+    raw_frame = extract(pcap_file)
+    assert len(raw_frame) > 0
+    raw_frame = pd.read_csv(io.StringIO(raw_frame.to_csv(index=False)))  # same dtypes as the CSV
+    # Scapy keeps timestamps as decimals, the raw decoder as floats
+    pd.testing.assert_frame_equal(scapy_frame, raw_frame, check_exact=False, atol=1e-5)
+
+
+def test_decode_ipv4_tcp():
+    payload = tcp_segment(40000, 443, 'PA', b'x' * 100, 8192)
+    frame = ETH_HEADER + b'\x08\x00' + ipv4_packet((192, 168, 1, 2), (10, 0, 0, 1), 6, payload)
+    record = decode_frame(frame, LINKTYPE_ETHERNET, 12.5)
+    assert (record.time, record.length, record.ip_version) == (12.5, len(frame), 4)
+    assert (record.src_ip, record.dst_ip) == ('192.168.1.2', '10.0.0.1')
+    assert (record.proto, record.src_port, record.dst_port) == (IPPROTO_TCP, 40000, 443)
+    assert record.tcp_flags == TCP_PSH | TCP_ACK
+    assert (record.window, record.ttl) == (8192, 64)
+    assert (record.ip_payload_len, record.payload_len) == (120, 100)
+
+
+def test_decode_vlan_ipv6_udp():
+    src = bytes([0x20, 0x01, 0x0d, 0xb8] + [0] * 11 + [1])
+    dst = bytes([0x20, 0x01, 0x0d, 0xb8] + [0] * 11 + [2])
+    frame = (ETH_HEADER + struct.pack('!HH', 0x8100, 10) + b'\x86\xdd'
+             + ipv6_packet(src, dst, 17, udp_datagram(5000, 53, b'q' * 30)))
+    record = decode_frame(frame, LINKTYPE_ETHERNET, 1.0)
+    assert record.ip_version == 6
+    assert (record.src_ip, record.dst_ip) == ('2001:db8::1', '2001:db8::2')
+    assert (record.proto, record.src_port, record.dst_port) == (IPPROTO_UDP, 5000, 53)
+    assert record.payload_len == 30
+
+
+def test_decode_non_ip_frames():
+    arp = ETH_HEADER + b'\x08\x06' + b'\x00' * 28
+    assert decode_frame(arp, LINKTYPE_ETHERNET, 0.0) is None
+    mpls = ETH_HEADER + b'\x88\x47' + b'\x00' * 28
+    with pytest.raises(UnsupportedFrame):
+        decode_frame(mpls, LINKTYPE_ETHERNET, 0.0)
+    with pytest.raises(UnsupportedFrame):
+        decode_frame(arp, 147, 0.0)  # a user-defined link type
+
+
+def test_packet_source_decodes_every_ip_frame(pcap_file, frames):
+    with PacketSource(pcap_file) as source:
+        records = list(source)
+    assert len(records) == len(frames)
+    assert [record.time for record in records] == [stamp / 1e6 for stamp, _ in frames]
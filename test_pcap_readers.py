@@ -0,0 +1,34 @@
+"""Tests for the capture readers: memory-mapped and buffered, pcap and pcapng."""
+import os
+
+import pandas as pd
+import pytest
+
+from gui_flow_extractor_full import FullFlowExtractor
+from pcap_decoder import PcapMmapReader, PcapStreamReader
+
+LINKTYPE_ETHERNET = 1
+READERS = [PcapMmapReader, PcapStreamReader]
+
+
+def extract(pcap_file, **kwargs):
+    extractor = FullFlowExtractor(**kwargs)
+    extractor.process_pcap(pcap_file)
+    return extractor.get_flow_dataframe()
+
+
+@pytest.mark.parametrize('reader', READERS)
+@pytest.mark.parametrize('capture', ['pcap_file', 'pcapng_file'])
+def test_readers_yield_every_frame(request, frames, reader, capture):
+    path = request.getfixturevalue(capture)
+    with reader(path) as source:
+        read = [(ts, linktype, bytes(frame)) for ts, linktype, frame in source]
+        assert source.offset == os.path.getsize(path)
+    assert read == [(stamp / 1e6, LINKTYPE_ETHERNET, frame) for stamp, frame in frames]
+
+
+@pytest.mark.parametrize('reader', ['mmap', 'stream'])
+def test_raw_decoder_readers_and_formats_agree(pcap_file, pcapng_file, reader):
+    expected = extract(pcap_file)
+    pd.testing.assert_frame_equal(extract(pcap_file, reader=reader), expected)
+    pd.testing.assert_frame_equal(extract(pcapng_file, reader=reader), expected)
@@ -0,0 +1,33 @@
+"""process_pcap.py end to end: a capture in, the command-line CSV out."""
+import contextlib
+import importlib
+import io
+
+import pandas as pd
+import pytest
+
+from gui_flow_extractor_full import FullFlowExtractor
+
+
+@pytest.fixture
+def process_pcap(tmp_path, monkeypatch):
+    # The module opens its log file in the working directory when imported
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('process_pcap')
+
+
+def test_process_pcap_writes_every_tcp_udp_flow(process_pcap, pcap_file, tmp_path):
+    output = tmp_path / 'out' / 'flows.csv'
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert process_pcap.process_pcap(pcap_file, str(output))
+        extractor = FullFlowExtractor()
+        extractor.process_pcap(pcap_file)
+    expected = extractor.get_flow_dataframe()
+    expected = expected[expected['protocol'].isin([6, 17])]
+
+    frame = pd.read_csv(output)
+    assert list(frame.columns) == process_pcap.HEADER
+    assert len(frame) == len(expected) > 0
+    assert frame['tot_fwd_pkts'].sum() == expected['tot_fwd_pkts'].sum()
+    assert frame['totlen_bwd_pkts'].sum() == expected['totlen_bwd_pkts'].sum()
+    assert frame['ece_flag_cnt'].sum() == expected['ece_flag_count'].sum()
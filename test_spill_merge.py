@@ -0,0 +1,38 @@
+"""Reuniting the parts of flows spilled across several segments."""
+from collections import defaultdict
+
+import numpy as np
+
+from conftest import optimized_flow_parts
+from flow_spill import flows_to_array, merge_partials, merge_segments, write_segment
+
+IDENTITY = {'flow_id', 'src_hi', 'src_lo', 'dst_hi', 'dst_lo', 'ip_version', 'protocol',
+            'src_port', 'dst_port', 'start', 'last'}
+
+
+def test_merge_partials_leaves_whole_flows_alone(pcap_file):
+    records = flows_to_array(optimized_flow_parts(pcap_file, pieces=1))
+    np.testing.assert_array_equal(merge_partials(records), records)
+
+
+def test_merge_segments_reunites_partial_flows(pcap_file, tmp_path):
+    parts = optimized_flow_parts(pcap_file, pieces=3)
+    # Each part of a flow goes to a different segment, as when a live flow is spilled
+    segments = defaultdict(list)
+    seen = defaultdict(int)
+    for flow in parts:
+        segments[seen[flow.flow_id]].append(flow)
+        seen[flow.flow_id] += 1
+    paths = [write_segment(str(tmp_path), i, flows_to_array(flows))
+             for i, flows in sorted(segments.items())]
+
+    merged = np.concatenate(list(merge_segments(paths, block_rows=4)))
+    assert list(merged['flow_id']) == sorted(seen)
+
+    records = flows_to_array(parts)
+    for row in merged:
+        own = records[records['flow_id'] == row['flow_id']]
+        assert row['start'] == own['start'].min()
+        assert row['last'] == own['last'].max()
+        for name in set(records.dtype.names) - IDENTITY:
+            assert row[name] == own[name].sum(), name